@@ -0,0 +1,823 @@
+import hashlib
+import re
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from metrics import parse_metric_series, parse_metric_value
+
+# ==============================================================================
+# ANALYTICS STAGES
+# ==============================================================================
+# The Analytics & Processing page is split into pure stages. Each one takes
+# plain data in and returns new objects, so StageCache can memoize it across
+# Streamlit reruns. Callers must treat stage results as read-only.
+
+VIDEO_COUNT_CANDIDATES = ['video count', 'videos_count', 'videos']
+VIDEO_ID_CANDIDATES = ['video id', 'item id']
+VIEW_CANDIDATES = ['video views', 'vv', 'views', 'view count']
+GMV_CANDIDATES = ['Gross merchandise value (Video) ($)', 'gross merchandise value (video) ($)', 'gmv', 'gross merchandise value', 'gross mer', 'revenue', 'sales', 'gpm', 'merchandise value']
+CREATOR_CANDIDATES = ['creator name', 'creator', 'username', 'user']
+LIKES_CANDIDATES = ['likes', 'like']
+COMMENTS_CANDIDATES = ['comments', 'comment']
+SHARES_CANDIDATES = ['shares', 'share']
+ORDERS_CANDIDATES = ['orders', 'order', 'items sold']
+NAME_CANDIDATES = ['name', 'creator', 'user', 'handle', 'username']
+
+# Creator tiers for the Key Metrics cards, as lower bounds: each tier runs up to
+# the next bound (1-2, 3-9, 10+ videos; $10K-$99K, $100K-$999K, $1M+ GMV)
+VIDEO_TIER_BOUNDS = [1, 3, 10]
+GMV_TIER_BOUNDS = [10000, 100000, 1000000]
+
+# Parsed metric columns added by prepare_metrics, keyed by column role
+PARSED_COLUMNS = {
+    'views': 'parsed_views',
+    'gmv': 'parsed_gmv',
+    'likes': 'parsed_likes',
+    'comments': 'parsed_comments',
+    'shares': 'parsed_shares',
+    'orders': 'parsed_orders',
+}
+
+
+def find_column(columns, candidates):
+    """Find a column by case-insensitive exact match first, then by partial match."""
+    lowered = [(c, str(c).lower()) for c in columns]
+    wanted = [x.lower() for x in candidates]
+    for c, name in lowered:
+        if name in wanted:
+            return c
+    for c, name in lowered:
+        if any(x in name for x in wanted):
+            return c
+    return None
+
+
+def detect_columns(columns):
+    """
+    Stage 1: map column roles (video id, views, GMV, creator, ...) to column names.
+    Returns: dict of role -> column name (or None), plus the analysis 'mode'.
+    """
+    roles = {
+        'video_count': find_column(columns, VIDEO_COUNT_CANDIDATES),
+        'video_id': find_column(columns, VIDEO_ID_CANDIDATES),
+        'views': find_column(columns, VIEW_CANDIDATES) or find_column(columns, ['view']),
+        'gmv': find_column(columns, GMV_CANDIDATES),
+        'creator': find_column(columns, CREATOR_CANDIDATES),
+        'likes': find_column(columns, LIKES_CANDIDATES),
+        'comments': find_column(columns, COMMENTS_CANDIDATES),
+        'shares': find_column(columns, SHARES_CANDIDATES),
+        'orders': find_column(columns, ORDERS_CANDIDATES),
+        'name': find_column(columns, NAME_CANDIDATES),
+    }
+    roles['mode'] = analysis_mode(roles)
+    return roles
+
+
+def analysis_mode(roles):
+    """The analysis mode the assigned column roles allow."""
+    if roles['video_id'] and roles['creator']:
+        return "Granular (Video Level)"
+    if roles['video_count']:
+        return "Aggregated (Creator Level)"
+    return "Simple (Row Count)"
+
+
+def prepare_metrics(df, roles, parse=None):
+    """
+    Stage 2: parse the metric columns the dashboard needs.
+    Returns: DataFrame of parsed_* columns with df's index.
+    """
+    if parse is None:
+        parse = lambda frame, col: parse_metric_series(frame[col])
+
+    parsed = pd.DataFrame(index=df.index)
+    for role, name in PARSED_COLUMNS.items():
+        if roles[role]:
+            parsed[name] = parse(df, roles[role])
+
+    if roles['mode'] == "Aggregated (Creator Level)":
+        parsed['parsed_videos'] = pd.to_numeric(df[roles['video_count']], errors='coerce').fillna(0)
+    return parsed
+
+
+def aggregate_creators(df, roles):
+    """
+    Stage 3: totals and per-creator video counts and GMV, in one grouped pass.
+    df must already carry the parsed_* columns from prepare_metrics.
+    Returns: dict with 'creator_stats' (Granular mode), the totals, and 'tier_videos' /
+    'tier_gmv' (one value per creator, or None) for count_creator_tiers.
+    """
+    return CreatorAggregates(roles).add(df).summary()
+
+
+_TIER_BOUND = re.compile(r'\s*\$?\s*(?:\d+\.?\d*|\.\d+)\s*[KMBkmb]?\s*')
+
+
+def parse_tier_bounds(text):
+    """Tier lower bounds typed as '1, 3, 10' (K/M suffixes allowed). Raises ValueError if unusable."""
+    parts = [part for part in str(text).split(',') if part.strip()]
+    if not parts or not all(_TIER_BOUND.fullmatch(part) for part in parts):
+        raise ValueError(f"Tier bounds must be numbers separated by commas, not '{text}'")
+    return sorted({parse_metric_value(part) for part in parts})
+
+
+def tier_labels(bounds, money=False):
+    """'1-2', '3-9', '10+' for whole-number tiers; '$10K-$99K', '$1M+' for money."""
+    def fmt(value, floor=False):
+        if money:
+            for scale, suffix in [(1e9, 'B'), (1e6, 'M'), (1e3, 'K')]:
+                if value >= scale:
+                    # A tier's top ($99,999) is shown rounded down ($99K)
+                    return f"${value // scale:,.0f}{suffix}" if floor else f"${value / scale:,g}{suffix}"
+            return f"${value:,.0f}" if floor else f"${value:,g}"
+        return f"{value:,.0f}" if float(value).is_integer() else f"{value:,g}"
+
+    labels = []
+    for low, high in zip(bounds, list(bounds[1:]) + [None]):
+        if high is None:
+            labels.append(f"{fmt(low)}+")
+        elif float(low).is_integer() and float(high).is_integer() and high - low >= 1:
+            labels.append(f"{fmt(low)}-{fmt(high - 1, floor=True)}" if high - low > 1 else fmt(low))
+        else:
+            labels.append(f"{fmt(low)} to <{fmt(high)}")
+    return labels
+
+
+def count_tiers(values, bounds):
+    """How many values fall in each tier [bounds[i], bounds[i + 1]), the last one open-ended; NaN in none."""
+    values = np.asarray(values, dtype='float64')
+    tiers = np.searchsorted(np.asarray(bounds, dtype='float64'), values, side='right') - 1
+    counted = (tiers >= 0) & ~np.isnan(values)
+    return np.bincount(tiers[counted], minlength=len(bounds)).tolist()
+
+
+def count_creator_tiers(summary, video_bounds=VIDEO_TIER_BOUNDS, gmv_bounds=GMV_TIER_BOUNDS):
+    """
+    Stage 3b: creators per video-count tier and per GMV tier, one histogram each.
+    Returns: {'videos': [(label, count)], 'gmv': [(label, count)]}
+    """
+    tiers = {}
+    for name, values, bounds, money in [('videos', summary['tier_videos'], video_bounds, False),
+                                        ('gmv', summary['tier_gmv'], gmv_bounds, True)]:
+        counts = count_tiers(values, bounds) if values is not None else [0] * len(bounds)
+        tiers[name] = list(zip(tier_labels(bounds, money), counts))
+    return tiers
+
+
+def segment_creators(creator_stats):
+    """
+    Stage 4: split creators into Star Performers / High Revenue / High Reach / Emerging
+    around the median GMV and views. Returns None if either metric is missing.
+    """
+    if creator_stats is None:
+        return None
+    creator_perf = creator_stats.reset_index()
+    if 'total_gmv' not in creator_perf.columns or 'parsed_views' not in creator_perf.columns:
+        return None
+
+    high_gmv = creator_perf['total_gmv'] >= creator_perf['total_gmv'].median()
+    high_views = creator_perf['parsed_views'] >= creator_perf['parsed_views'].median()
+    creator_perf['segment'] = np.select(
+        [high_gmv & high_views, high_gmv, high_views],
+        ['Star Performers', 'High Revenue', 'High Reach'],
+        default='Emerging',
+    )
+    return creator_perf
+
+
+def _safe_ratio(numerator, denominator, scale=1):
+    """numerator / denominator with NaN and +/-inf replaced by 0."""
+    ratio = (numerator / denominator * scale).fillna(0)
+    return ratio.replace([float('inf'), -float('inf')], 0)
+
+
+def build_chart_data(df, roles, creator_stats):
+    """
+    Stage 5: the data behind the Top Creators and Engagement charts.
+    Returns: dict with a 'top_creators' spec (or None) and the ratio columns.
+    """
+    mode = roles['mode']
+    data = {'top_creators': None}
+
+    if mode == "Granular (Video Level)":
+        top_creators = creator_stats.reset_index()
+        y_metric, title_metric, scale = 'video_count', 'Video Count', 'Reds'
+        if 'total_gmv' in top_creators.columns and top_creators['total_gmv'].sum() > 0:
+            y_metric, title_metric, scale = 'total_gmv', 'GMV', 'Greens'
+        data['top_creators'] = {
+            'data': top_creators.nlargest(10, y_metric),
+            'x': roles['creator'], 'y': y_metric, 'title_metric': title_metric, 'scale': scale,
+        }
+
+    elif mode == "Aggregated (Creator Level)" or (mode == "Simple (Row Count)" and roles['creator']):
+        y_metric, title_metric, scale = None, '', 'Reds'
+        if 'parsed_gmv' in df.columns and df['parsed_gmv'].sum() > 0:
+            y_metric, title_metric, scale = 'parsed_gmv', 'GMV', 'Greens'
+        elif 'parsed_videos' in df.columns:
+            y_metric, title_metric = 'parsed_videos', 'Video Count'
+        if y_metric and roles['name']:
+            data['top_creators'] = {
+                'data': df.nlargest(10, y_metric),
+                'x': roles['name'], 'y': y_metric, 'title_metric': title_metric, 'scale': scale,
+            }
+        data['top_creators_metric'] = y_metric
+
+    if roles['likes'] and roles['views']:
+        data['engagement_rate'] = _safe_ratio(df['parsed_likes'], df['parsed_views'], 100)
+    if roles['gmv'] and roles['views']:
+        data['gmv_per_view'] = _safe_ratio(df['parsed_gmv'], df['parsed_views'])
+    elif roles['gmv'] and roles['orders']:
+        data['gmv_per_order'] = _safe_ratio(df['parsed_gmv'], df['parsed_orders'])
+    return data
+
+
+# ==============================================================================
+# CREATOR AGGREGATES
+# ==============================================================================
+# Stacking another week's export onto the dataset used to recompute every
+# per-creator sum, distinct video count and total over all rows. Apart from the
+# distinct counts these are all sums, so CreatorAggregates keeps them and adds
+# new rows in. Distinct videos are kept as sorted arrays of 64-bit hashes (of
+# each video ID, and of each creator + video ID pair), so a video that was
+# already counted is not counted again. Adding rows then costs time in the new
+# rows, plus copying the stored arrays once.
+#
+# IDs are hashed in one type per kind of column (_key_type): integers as
+# int64 or uint64, floats as float64, mixed object columns by value and Python
+# type, so 7 and '7' stay two IDs as they are for nunique. Hashes of different
+# key types can't be compared: an integer ID and the float64 it turned into
+# may differ, as 19-digit IDs lose digits as floats. When an append changes
+# the type of an ID column (a file with missing IDs), accepts() is False and
+# the aggregates are worked out again from all rows. Two distinct IDs sharing
+# a 64-bit hash is possible but vanishingly unlikely.
+
+def _key_type(dtype):
+    """The type a key column is hashed in; only hashes of the same key type can be compared."""
+    if isinstance(dtype, pd.CategoricalDtype):
+        return _key_type(dtype.categories.dtype)
+    if pd.api.types.is_signed_integer_dtype(dtype):
+        return 'int64'
+    if pd.api.types.is_unsigned_integer_dtype(dtype):
+        return 'uint64'
+    if pd.api.types.is_float_dtype(dtype):
+        return 'float64'
+    return str(dtype)
+
+
+def _key_hashes(values):
+    """64-bit hashes of the non-null values of a key column, in its _key_type."""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        # Hash only the categories these rows use, not all of them
+        used, codes = np.unique(values.cat.codes.to_numpy(), return_inverse=True)
+        return _key_hashes(pd.Series(values.cat.categories[used]))[codes]
+    key_type = _key_type(values.dtype)
+    if key_type in ('int64', 'uint64', 'float64'):
+        values = values.astype(key_type)
+    elif values.dtype == object:
+        # hash_pandas_object hashes objects by their text, which would make 7 and '7' one ID
+        codes, uniques = pd.factorize(values)
+        types = pd.Series([type(value).__name__ for value in uniques], dtype=object)
+        text = pd.util.hash_pandas_object(pd.Series(uniques, dtype=object), index=False).to_numpy()
+        return _pair_hashes(text, pd.util.hash_pandas_object(types, index=False).to_numpy())[codes]
+    return pd.util.hash_pandas_object(values, index=False).to_numpy()
+
+
+def _pair_hashes(first, second):
+    """One 64-bit hash per row from two arrays of hashes."""
+    return (first * np.uint64(0x9E3779B97F4A7C15)) ^ (second + np.uint64(0x632BE59BD9B4E019) + (first >> np.uint64(7)))
+
+
+def _add_distinct(known, hashes):
+    """
+    Which hashes are new: not in the sorted array known, nor earlier in hashes.
+    Returns:
+        (boolean array marking the first occurrence of each new hash, known with the new hashes added)
+    """
+    uniques, first = np.unique(hashes, return_index=True)
+    pos = np.searchsorted(known, uniques)
+    seen = np.zeros(len(uniques), dtype=bool)
+    if len(known):
+        seen = known[np.minimum(pos, len(known) - 1)] == uniques
+    is_new = np.zeros(len(hashes), dtype=bool)
+    is_new[first[~seen]] = True
+    return is_new, np.insert(known, pos[~seen], uniques[~seen])
+
+
+def _add_grouped(total, new):
+    """Per-creator sums total + new, creators in either (None total means none yet)."""
+    if total is None:
+        return new
+    combined = total.add(new, fill_value=0)
+    if 'video_count' in combined.columns:
+        combined['video_count'] = combined['video_count'].astype('int64')
+    if 'videos' in combined.columns:
+        combined['videos'] = combined['videos'].astype('int64')
+    return combined
+
+
+class CreatorAggregates:
+    """
+    Running creator stats and totals for one column layout (roles from detect_columns).
+    add() takes rows carrying the parsed_* columns from prepare_metrics, and summary()
+    gives what aggregate_creators would give for every row added so far.
+    """
+
+    def __init__(self, roles):
+        self.roles = roles
+        self.rows = 0
+        self.sums = {'parsed_gmv': 0.0, 'parsed_likes': 0.0, 'parsed_orders': 0.0, 'parsed_videos': 0.0}
+        self.per_creator = None
+        self.video_hashes = np.empty(0, dtype='uint64')
+        self.pair_hashes = np.empty(0, dtype='uint64')
+        self.tier_chunks = []
+        self.key_types = None
+
+    def _key_types(self, df):
+        if self.roles['mode'] != "Granular (Video Level)":
+            return None
+        return _key_type(df[self.roles['video_id']].dtype), _key_type(df[self.roles['creator']].dtype)
+
+    def accepts(self, df):
+        """Whether add(df) can tell which of its videos were counted already (same ID column types)."""
+        return self.key_types is None or self._key_types(df) == self.key_types
+
+    def add(self, df):
+        """Add rows to the running stats. Returns self. ValueError if not accepts(df)."""
+        roles = self.roles
+        creator_col = roles['creator']
+        mode = roles['mode']
+        if not self.accepts(df):
+            raise ValueError("The ID columns changed type; aggregate all rows again")
+        self.key_types = self._key_types(df)
+
+        self.rows += len(df)
+        for col in self.sums:
+            if col in df.columns:
+                self.sums[col] += float(df[col].sum())
+
+        if mode == "Granular (Video Level)":
+            video_col = roles['video_id']
+            has_video = df[video_col].notna().to_numpy()
+            has_creator = df[creator_col].notna().to_numpy()
+            video_hashes = _key_hashes(df[video_col][has_video])
+            _, self.video_hashes = _add_distinct(self.video_hashes, video_hashes)
+
+            # A row counts towards its creator's videos if it is the first with that creator and video ID
+            pairs = has_video & has_creator
+            creator_hashes = _key_hashes(df[creator_col][pairs])
+            first, self.pair_hashes = _add_distinct(self.pair_hashes, _pair_hashes(creator_hashes, video_hashes[pairs[has_video]]))
+            video_count = np.zeros(len(df), dtype='int64')
+            video_count[pairs] = first
+
+            columns = {'video_count': video_count}
+            if roles['gmv']: columns['total_gmv'] = df['parsed_gmv'].to_numpy()
+            if roles['views']: columns['parsed_views'] = df['parsed_views'].to_numpy()
+            if roles['likes']: columns['parsed_likes'] = df['parsed_likes'].to_numpy()
+            if roles['orders']: columns['parsed_orders'] = df['parsed_orders'].to_numpy()
+            grouped = pd.DataFrame(columns, index=df.index).groupby(df[creator_col], observed=True).sum()
+            self.per_creator = _add_grouped(self.per_creator, grouped)
+
+        elif mode == "Aggregated (Creator Level)":
+            # Rows are creators already
+            self.tier_chunks.append((df['parsed_videos'], df['parsed_gmv'] if roles['gmv'] else None))
+
+        elif creator_col:
+            # Each row is one video: rows per creator, plus their GMV from the same grouping
+            grouped = df.groupby(creator_col, observed=True)
+            if roles['gmv']:
+                per_creator = grouped.agg(videos=('parsed_gmv', 'size'), gmv=('parsed_gmv', 'sum'))
+            else:
+                per_creator = grouped.size().to_frame('videos')
+            self.per_creator = _add_grouped(self.per_creator, per_creator)
+        return self
+
+    def summary(self):
+        """The aggregate_creators result for every row added so far."""
+        roles = self.roles
+        mode = roles['mode']
+        result = {
+            'creator_stats': None,
+            'total_videos': 0,
+            'total_likes': 0,
+            'total_orders': 0,
+            'total_gmv': self.sums['parsed_gmv'] if roles['gmv'] else 0,
+            'tier_videos': None,
+            'tier_gmv': None,
+        }
+        if roles['likes']: result['total_likes'] = int(self.sums['parsed_likes'])
+
+        if mode == "Granular (Video Level)":
+            if roles['orders']: result['total_orders'] = int(self.sums['parsed_orders'])
+            result['creator_stats'] = self.per_creator
+            result['total_videos'] = len(self.video_hashes)
+            result['tier_videos'] = self.per_creator['video_count']
+            if roles['gmv']:
+                result['tier_gmv'] = self.per_creator['total_gmv']
+
+        elif mode == "Aggregated (Creator Level)":
+            result['total_videos'] = int(self.sums['parsed_videos'])
+            if self.tier_chunks:
+                result['tier_videos'] = pd.concat([videos for videos, _ in self.tier_chunks])
+                if roles['gmv']:
+                    result['tier_gmv'] = pd.concat([gmv for _, gmv in self.tier_chunks])
+
+        else:
+            result['total_likes'] = 0
+            result['total_videos'] = self.rows
+            if self.per_creator is not None:
+                result['tier_videos'] = self.per_creator['videos']
+                if roles['gmv']:
+                    result['tier_gmv'] = self.per_creator['gmv']
+        return result
+
+
+# ==============================================================================
+# MONTH INDEX
+# ==============================================================================
+# "Filter by Month" used to run pd.to_datetime over the whole date column on
+# every rerun, then format every row as 'YYYY-MM' twice (once for the picker,
+# once for the mask). Exports repeat the same few hundred dates over many rows,
+# so MonthIndex parses each distinct value once, in a format detected from a
+# sample (pandas would guess it from the first value only, so '01/02/2024'
+# followed by '13/02/2024' read day-first dates as month-first and lost the
+# rest). It keeps one small month code per row and the rows of each month.
+# Listing months and filtering by them are then lookups on those codes.
+# MonthIndexCache keeps the indexes of the loaded dataset between reruns.
+
+DATE_FORMATS = [
+    '%Y-%m-%d', '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M', '%Y/%m/%d',
+    '%m/%d/%Y', '%m/%d/%Y %H:%M', '%m/%d/%Y %H:%M:%S', '%d/%m/%Y', '%d/%m/%Y %H:%M', '%d/%m/%Y %H:%M:%S',
+    '%d-%m-%Y', '%d.%m.%Y', '%m/%d/%y', '%d/%m/%y', '%b %d, %Y', '%d %b %Y', '%B %d, %Y', '%Y%m%d',
+]
+DATE_FORMAT_SAMPLE = 1000
+
+
+def detect_date_format(values):
+    """
+    The format in DATE_FORMATS that parses the most of a sample of distinct date strings,
+    or None if none of them parses any (pandas then infers one).
+    """
+    sample = pd.Series(values[:DATE_FORMAT_SAMPLE], dtype=object)
+    best, best_count = None, 0
+    for fmt in DATE_FORMATS:
+        count = pd.to_datetime(sample, format=fmt, errors='coerce').notna().sum()
+        if count > best_count:
+            best, best_count = fmt, count
+            if count == len(sample):
+                break
+    return best
+
+
+class MonthIndex:
+    """Month ('YYYY-MM') of every row of one date column, parsed once."""
+
+    def __init__(self, values):
+        codes, uniques = pd.factorize(values)
+        uniques = pd.Series(np.asarray(uniques, dtype=object))
+        self.format = None
+        if len(uniques) and uniques.map(type).eq(str).all():
+            self.format = detect_date_format(uniques.str.strip())
+            dates = pd.to_datetime(uniques.str.strip() if self.format else uniques, format=self.format, errors='coerce')
+        else:
+            dates = pd.to_datetime(uniques, errors='coerce')
+
+        # Month of each distinct value, then of each row (-1 where it isn't a date)
+        unique_months = pd.Series(dates).dt.strftime('%Y-%m')
+        month_codes, months = pd.factorize(unique_months, sort=True)
+        self.months = np.asarray(months, dtype=object)
+        unique_codes = np.append(month_codes, -1)
+        self.codes = unique_codes[codes].astype('int32')
+        self.counts = np.bincount(self.codes[self.codes >= 0], minlength=len(self.months))
+        self._order = None
+
+    def _ids(self, months):
+        return np.flatnonzero(np.isin(self.months, list(months)))
+
+    def options(self, positions=None):
+        """Months that occur among the rows at positions (all rows by default), sorted."""
+        if positions is None or len(positions) == len(self.codes):
+            present = self.counts > 0
+        else:
+            codes = self.codes[positions]
+            present = np.bincount(codes[codes >= 0], minlength=len(self.months)) > 0
+        return self.months[present].tolist()
+
+    def rows(self, months):
+        """Positions of all rows in any of months, in row order."""
+        if self._order is None:
+            # Month-to-rows index: row positions grouped by month code
+            self._order = np.argsort(self.codes, kind='stable')
+            self._starts = np.searchsorted(self.codes[self._order], np.arange(len(self.months) + 1))
+        parts = [self._order[self._starts[i]:self._starts[i + 1]] for i in self._ids(months)]
+        return np.sort(np.concatenate(parts)) if parts else np.array([], dtype='int64')
+
+    def mask(self, months, positions):
+        """True for the rows at positions whose month is one of months."""
+        wanted = np.zeros(len(self.months) + 1, dtype=bool)
+        wanted[self._ids(months)] = True
+        return wanted[self.codes[positions]]
+
+
+class MonthIndexCache:
+    """
+    Month indexes of one loaded dataset's date columns, built the first time each column is filtered.
+    Like ParsedMetricCache, it is valid for as long as that DataFrame object is the active dataset.
+    """
+
+    def __init__(self, df):
+        self.df = df
+        self.indexes = {}
+
+    def matches(self, df):
+        return self.df is df
+
+    def get(self, col):
+        if col not in self.indexes:
+            self.indexes[col] = MonthIndex(self.df[col])
+        return self.indexes[col]
+
+
+# ==============================================================================
+# PROCESSING PLAN
+# ==============================================================================
+# The processing controls above the dashboard (column selection, dedup, month
+# filter, sort, then the GMV, video count and text search filters) used to run
+# eagerly, each building a new DataFrame with every selected column, with the
+# sort running before the filters that threw most rows away.
+#
+# ProcessingPlan only records the stages while the widgets are read, then runs
+# them once, on an array of row positions into the loaded data:
+# - filters run in page order (dedup keeps the first row of each value and the
+#   video ID filter counts the rows that are left, so they can't be reordered);
+# - the sort runs after the last filter, on the rows that survived;
+# - each stage reads only the column(s) it needs, and the selected columns are
+#   gathered once at the end.
+# Rows with equal sort keys keep their order (the old sort left them unordered).
+
+
+class ProcessingPlan:
+    """
+    Lazy row processing for the Analytics page.
+    Stage methods record a stage and return its number (for rows_in / rows_out);
+    execute() runs whatever hasn't run yet and returns the processed DataFrame.
+    parse(frame, col) gives parsed metric values of frame[col], indexed like frame,
+    and month_index(frame, col) the MonthIndex of a date column.
+    """
+
+    def __init__(self, source, columns, parse=None, month_index=None):
+        self.source = source
+        self.columns = list(columns)
+        self.parse = parse or (lambda frame, col: parse_metric_series(frame[col]))
+        self.month_index = month_index or (lambda frame, col: MonthIndex(frame[col]))
+        self.filters = []
+        self.sort_stage = None
+        self.written = []
+        self.runs = {}
+        self._positions = np.arange(len(source))
+        self._applied = 0
+        self._result = None
+        self.gather_seconds = 0.0
+
+    def _column(self, col, positions):
+        return self.source[col].iloc[positions]
+
+    def _record(self, label, columns, func):
+        stage = (len(self.written), label, columns, func)
+        self.written.append(label)
+        self._result = None
+        return stage
+
+    def _add_filter(self, label, columns, func):
+        stage = self._record(label, columns, func)
+        self.filters.append(stage)
+        return stage[0]
+
+    # --- Stages -------------------------------------------------------------
+
+    def dedup(self, col):
+        def run(positions):
+            return positions[~self._column(col, positions).duplicated().to_numpy()]
+        return self._add_filter(f"Remove duplicates by '{col}'", [col], run)
+
+    def month_options(self, col):
+        """Months present in col among the rows left by the stages so far, for the month picker."""
+        return self.month_index(self.source, col).options(self._run_filters())
+
+    def month_filter(self, col, months):
+        def run(positions):
+            index = self.month_index(self.source, col)
+            if len(positions) == len(self.source):
+                # Nothing filtered out yet: read the month's rows straight from the index
+                return index.rows(months)
+            return positions[index.mask(months, positions)]
+        return self._add_filter(f"Month of '{col}' in {', '.join(months)}", [col], run)
+
+    def metric_range(self, col, low, high):
+        def run(positions):
+            values = self.parse(self.source, col).iloc[positions]
+            return positions[((values >= low) & (values <= high)).to_numpy()]
+        return self._add_filter(f"'{col}' between {low:,} and {high:,}", [col], run)
+
+    def number_range(self, col, low, high):
+        def run(positions):
+            values = pd.to_numeric(self._column(col, positions), errors='coerce').fillna(0)
+            return positions[((values >= low) & (values <= high)).to_numpy()]
+        return self._add_filter(f"'{col}' between {low:,} and {high:,}", [col], run)
+
+    def distinct_count_range(self, group_col, col, low, high):
+        """Keep the rows of groups with between low and high distinct values of col (among the rows left)."""
+        def run(positions):
+            rows = self.source[[group_col, col]].iloc[positions]
+            counts = rows.groupby(group_col, observed=True)[col].nunique()
+            valid = counts[(counts >= low) & (counts <= high)].index
+            return positions[rows[group_col].isin(valid).to_numpy()]
+        return self._add_filter(f"Distinct '{col}' per '{group_col}' between {low:,} and {high:,}", [group_col, col], run)
+
+    def search(self, col, term):
+        def run(positions):
+            found = self._column(col, positions).astype(str).str.contains(term, case=False, na=False)
+            return positions[found.to_numpy()]
+        return self._add_filter(f"'{col}' contains '{term}'", [col], run)
+
+    def sort(self, col, ascending=True):
+        def run(positions):
+            # Numeric order of parsed metrics ('1.2M'), or plain order if the column can't be parsed
+            try:
+                keys = self.parse(self.source, col).iloc[positions]
+            except Exception:
+                keys = self._column(col, positions)
+            order = keys.reset_index(drop=True).sort_values(ascending=ascending, kind='stable').index
+            return positions[order.to_numpy()]
+        self.sort_stage = self._record(f"Sort by '{col}' {'ascending' if ascending else 'descending'}", [col], run)
+        return self.sort_stage[0]
+
+    # --- Execution ----------------------------------------------------------
+
+    def _run_stage(self, stage, positions):
+        number, _, _, func = stage
+        started = time.perf_counter()
+        result = func(positions)
+        self.runs[number] = (len(positions), len(result), time.perf_counter() - started)
+        return result
+
+    def stages(self):
+        """Recorded stages in the order they run: filters, then the sort."""
+        return self.filters + ([self.sort_stage] if self.sort_stage else [])
+
+    def _run_filters(self):
+        """Row positions after every filter recorded so far (each filter runs once)."""
+        for stage in self.filters[self._applied:]:
+            self._positions = self._run_stage(stage, self._positions)
+            self._applied += 1
+        return self._positions
+
+    def execute(self):
+        if self._result is None:
+            positions = self._run_filters()
+            if self.sort_stage:
+                positions = self._run_stage(self.sort_stage, positions)
+            started = time.perf_counter()
+            self._result = self.source.iloc[positions, self.source.columns.get_indexer_for(self.columns)]
+            self.gather_seconds = time.perf_counter() - started
+        return self._result
+
+    def rows_in(self, stage):
+        return self.runs[stage][0]
+
+    def rows_out(self, stage):
+        return self.runs[stage][1]
+
+    def report(self):
+        """The plan as run: one row per step, in execution order, with row counts and timings."""
+        result = self.execute()
+        read = list(dict.fromkeys(col for _, _, columns, _ in self.stages() for col in columns))
+        rows = [{'step': 'Scan', 'columns read': ', '.join(map(str, read)) or '-',
+                 'rows in': len(self.source), 'rows out': len(self.source), 'ms': 0.0}]
+        for number, label, columns, _ in self.stages():
+            if self.sort_stage and self.sort_stage[0] < number:
+                label += ' (moved ahead of sort)'
+            rows_in, rows_out, seconds = self.runs[number]
+            rows.append({'step': label, 'columns read': ', '.join(map(str, columns)),
+                         'rows in': rows_in, 'rows out': rows_out, 'ms': round(seconds * 1000, 1)})
+        rows.append({'step': f'Gather {len(self.columns)} selected column(s)', 'columns read': 'selected',
+                     'rows in': len(result), 'rows out': len(result), 'ms': round(self.gather_seconds * 1000, 1)})
+        return pd.DataFrame(rows, columns=['step', 'columns read', 'rows in', 'rows out', 'ms'])
+
+
+# ==============================================================================
+# FINGERPRINTS & STAGE CACHE
+# ==============================================================================
+
+def frame_fingerprint(df):
+    """Content hash of a DataFrame: values, index, column names and dtypes."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr([(str(c), str(t)) for c, t in df.dtypes.items()]).encode())
+    try:
+        row_hashes = pd.util.hash_pandas_object(df, index=True)
+    except TypeError:
+        # Unhashable cells (lists, dicts) - fall back to their text form
+        row_hashes = pd.util.hash_pandas_object(df.astype(str), index=True)
+    digest.update(row_hashes.to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def derived_fingerprint(source_fingerprint, df):
+    """
+    Fingerprint of a frame made only by selecting, reordering or dropping rows and
+    columns of a source frame: the source's fingerprint plus the surviving labels.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(source_fingerprint.encode())
+    digest.update(repr([str(c) for c in df.columns]).encode())
+    digest.update(pd.util.hash_array(df.index.to_numpy()).tobytes())
+    return digest.hexdigest()
+
+
+def appended_fingerprint(base_fingerprint, df, new):
+    """
+    Fingerprint of df, made by adding rows (True in the boolean array new) to the frame
+    base_fingerprint was taken of: that fingerprint plus the added rows and their positions.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(base_fingerprint.encode())
+    digest.update(frame_fingerprint(df[new]).encode())
+    digest.update(np.flatnonzero(new).tobytes())
+    return digest.hexdigest()
+
+
+class StageCache:
+    """
+    Memoizes analytics stages across Streamlit reruns.
+    Each stage is keyed on a data fingerprint plus only the parameters it depends on,
+    and hits/misses are counted per stage so the page can show what reran.
+    """
+
+    def __init__(self, max_entries=4):
+        self.max_entries = max_entries
+        self.entries = {}
+        self.stats = {}
+        self.last_run = {}
+        self.source = None
+        self.source_fingerprint = None
+
+    def begin_rerun(self):
+        """Forget which stages ran in the previous rerun."""
+        self.last_run = {}
+
+    def fingerprint(self, source_df, df, appended=None):
+        """
+        Fingerprint of df, a row/column selection of source_df. The source is hashed once per object.
+        appended marks (boolean array) the rows of source_df added to the previous source; when
+        given, only those rows are hashed.
+        """
+        if self.source is not source_df:
+            if appended is not None and self.source is not None:
+                self.source_fingerprint = appended_fingerprint(self.source_fingerprint, source_df, appended)
+            else:
+                self.source_fingerprint = frame_fingerprint(source_df)
+            self.source = source_df
+        return derived_fingerprint(self.source_fingerprint, df)
+
+    def forget_source(self):
+        """Hash the next source afresh (its cells were changed in place)."""
+        self.source = None
+        self.source_fingerprint = None
+
+    def clear(self):
+        """Drop every stored result and the source (another dataset is active); the counts stay."""
+        self.entries = {}
+        self.forget_source()
+
+    def run(self, stage, key, func, *args):
+        """Return func(*args), reusing the stored result if this stage already ran for key."""
+        entries = self.entries.setdefault(stage, OrderedDict())
+        stats = self.stats.setdefault(stage, {'hits': 0, 'misses': 0})
+
+        if key in entries:
+            entries.move_to_end(key)
+            stats['hits'] += 1
+            self.last_run[stage] = 'hit'
+            return entries[key]
+
+        result = func(*args)
+        entries[key] = result
+        if len(entries) > self.max_entries:
+            entries.popitem(last=False)
+        stats['misses'] += 1
+        self.last_run[stage] = 'miss'
+        return result
+
+    def report(self):
+        """Per-stage cache status for the last rerun and since the session started."""
+        rows = []
+        for stage, stats in self.stats.items():
+            rows.append({
+                'stage': stage,
+                'this rerun': self.last_run.get(stage, 'not run'),
+                'hits': stats['hits'],
+                'misses': stats['misses'],
+            })
+        return pd.DataFrame(rows, columns=['stage', 'this rerun', 'hits', 'misses'])
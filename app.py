@@ -1,10 +1,25 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
-import re
 import io
-import base64
+import os
+
+from analytics import (GMV_TIER_BOUNDS, VIDEO_TIER_BOUNDS, CreatorAggregates, MonthIndex, MonthIndexCache,
+                       ProcessingPlan, StageCache, aggregate_creators, build_chart_data, count_creator_tiers,
+                       parse_tier_bounds, prepare_metrics, segment_creators)
+from batches import BatchExport, build_zip, count_batches, stream_split_csv
+from column_roles import ROLE_LABELS, RoleRegistry, layout_key, restrict_roles
+from contacted_store import ContactedStore
+from editing import (DEFAULT_PAGE_SIZE, PAGE_SIZES, DropColumns, EditJournal, EditorChange, FilterRows,
+                     RenameColumns, editor_page, page_bounds, page_count)
+from extraction import DEBUG_LOG_MAX_LINES, ExtractionSession, parse_creator_cards
+from ingest import (HEADER_SCAN_ROWS, LARGE_CSV_BYTES, UPLOAD_CACHE_MAX_MB, UploadCache, available_excel_engines,
+                    compact_dataframe, detect_header_row, frame_from_rows, load_tables, memory_report,
+                    read_csv_chunked, read_excel_rows)
+from merging import PRECEDENCE_OPTIONS, estimate_join, is_join_explosion, join_frames
+from metrics import ParsedMetricCache
 
 # ==============================================================================
 # PAGE CONFIGURATION
@@ -277,14 +292,26 @@ if 'file_name' not in st.session_state:
     st.session_state['file_name'] = "data.csv"
 if 'theme' not in st.session_state:
     st.session_state['theme'] = "Dark"
+if 'analytics_cache' not in st.session_state:
+    st.session_state['analytics_cache'] = StageCache()
+if 'contacted_store' not in st.session_state:
+    st.session_state['contacted_store'] = ContactedStore()
+if 'role_registry' not in st.session_state:
+    st.session_state['role_registry'] = RoleRegistry()
+if 'upload_cache_mb' not in st.session_state:
+    st.session_state['upload_cache_mb'] = UPLOAD_CACHE_MAX_MB
+if 'parsed_cards' not in st.session_state:
+    st.session_state['parsed_cards'] = None
+if 'extraction_session' not in st.session_state:
+    st.session_state['extraction_session'] = ExtractionSession()
+if 'editor_version' not in st.session_state:
+    st.session_state['editor_version'] = 0
 
 # ==============================================================================
 # HELPER FUNCTIONS
 # ==============================================================================
 def to_csv_download_link(df, filename="data.csv", label="Download CSV"):
     csv = df.to_csv(index=False)
-    b64 = base64.b64encode(csv.encode()).decode()
-    href = f'<a href="data:file/csv;base64,{b64}" download="{filename}" class="download-btn">{label}</a>'
     return st.download_button(
         label=label,
         data=csv,
@@ -292,115 +319,233 @@ def to_csv_download_link(df, filename="data.csv", label="Download CSV"):
         mime='text/csv',
     )
 
-def parse_metric_value(value):
-    """Parse string metrics like '1.2M', '$1K' into floats."""
-    if pd.isna(value):
-        return 0.0
-    
-    s = str(value).upper().replace('$', '').replace(',', '').replace('%', '').strip()
-    
-    multiplier = 1
-    if 'K' in s:
-        multiplier = 1000
-        s = s.replace('K', '')
-    elif 'M' in s:
-        multiplier = 1000000
-        s = s.replace('M', '')
-    elif 'B' in s:
-        multiplier = 1000000000
-        s = s.replace('B', '')
-        
-    try:
-        return float(s) * multiplier
-    except:
-        return 0.0
-
-def extract_usernames_from_text(text):
+def parsed_metric(df, col):
     """
-    Extract usernames using smart heuristics (PPS anchor) and fallback to regex.
-    Returns: (list of usernames, list of debug strings)
+    Parsed values of df[col], where df is the active dataset or a frame derived from it.
+    Each column is parsed once per loaded dataset; replacing st.session_state['df'] starts a fresh cache.
     """
-    debug_log = []
-    
-    if not text:
-        return [], ["No text provided"]
-        
-    lines = [L.strip() for L in text.split('\n') if L.strip()]
-    debug_log.append(f"Found {len(lines)} non-empty lines")
-    
-    smart_matches = []
-    
-    # Strategy 1: PPS Anchor
-    # Pattern: Username is 2 lines above "PPS:"
-    pps_found = False
-    for i, line in enumerate(lines):
-        # Case insensitive check for PPS
-        if "PPS:" in line.upper():
-            pps_found = True
-            if i >= 2:
-                candidate = lines[i-2]
-                # Basic validation: no spaces, decent length, not a number
-                # Usernames shouldn't contain spaces.
-                if ' ' not in candidate and len(candidate) >= 3:
-                    smart_matches.append(candidate)
-                    debug_log.append(f"Line {i} PPS found -> Accepted candidate '{candidate}'")
-                else:
-                    debug_log.append(f"Line {i} PPS found -> Rejected candidate '{candidate}' (invalid format)")
-            else:
-                debug_log.append(f"Line {i} PPS found -> No candidate (index < 2)")
-                
-    if smart_matches:
-        debug_log.append(f"Strategy 1 (PPS) Success: {len(smart_matches)} matches")
-        return sorted(list(set(smart_matches))), debug_log
-        
-    debug_log.append("Strategy 1 (PPS) returned 0 valid matches. Falling back to regex.")
-        
-    # Strategy 2: Fallback Regex with Stronger Filtering
-    pattern = r'@?([a-zA-Z0-9_.]+)'
-    raw_matches = re.findall(pattern, text)
-    debug_log.append(f"Regex found {len(raw_matches)} raw matches")
-    
-    # Expanded blacklist (lowercase for comparison)
-    blacklist_set = {
-        'health', 'male', 'female', 'previously', 'invited', 'fast', 'growing', 
-        'pps:', 'pps', 'womenswear', 'underwear', 'beauty', 'personal', 'care',
-        'sports', 'outdoor', 'ugc', 'level', 'deals', 'next', 'locked', 'mindset',
-        'midlifemomgrace', 'soberafjoe', # Keep these if they are actually names in current text? No, safer to exclude if known noise
-        'chenbo', 'unknown', 'creator', 'video', 'views', 'follower', 'sale', 'revenue'
-    }
-    
-    cleaned_matches = []
-    for m in raw_matches:
-        clean = m.strip()
-        clean_lower = clean.lower()
-        
-        # 1. Length Check
-        if len(clean) < 3:
-            continue
-            
-        # 2. Character Check (Must have at least one letter)
-        if not any(c.isalpha() for c in clean):
-            continue
-            
-        # 3. Blacklist Check (Case Insensitive)
-        if clean_lower in blacklist_set:
-            continue
-            
-        # 4. Symbol Check
-        if any(x in clean for x in ['/', '%', '$', ',']):
-            continue
-            
-        # 5. Number/Stat Check (e.g. 1.4K, 4.1, 5.0)
-        # If it starts with a digit, it's suspicious unless it's mixed with sufficient letters
-        if clean[0].isdigit():
-            # If matches mostly numbers/dots/K/M/B
-            if re.match(r'^[\d.]+[KMBkmb]?$', clean):
-                continue
-                
-        cleaned_matches.append(clean)
-            
-    debug_log.append(f"Strategy 2 (Regex) Final: {len(cleaned_matches)} matches")
-    return sorted(list(set(cleaned_matches))), debug_log
+    cache = st.session_state.get('metric_cache')
+    if cache is None or not cache.matches(st.session_state['df']):
+        new = None if cache is None else appended_rows(cache.df)
+        # Rows were appended to the dataset the cache was built for: parse only those
+        cache = ParsedMetricCache(st.session_state['df']) if new is None else cache.extended(st.session_state['df'], new)
+        st.session_state['metric_cache'] = cache
+    return cache.aligned(df, col)
+
+def month_index(df, col):
+    """MonthIndex of df[col]; for the active dataset it is built once per column and kept between reruns."""
+    if df is not st.session_state['df']:
+        return MonthIndex(df[col])
+    cache = st.session_state.get('month_cache')
+    if cache is None or not cache.matches(df):
+        cache = MonthIndexCache(df)
+        st.session_state['month_cache'] = cache
+    return cache.get(col)
+
+def record_append(base, df, new):
+    """
+    Note that the active dataset df is base with rows added (True in the boolean array new),
+    so caches built for base, or for the dataset base was appended to, are extended instead of rebuilt.
+    """
+    bases = [(base, new)]
+    lineage = st.session_state.get('df_lineage')
+    if lineage is not None and lineage['df'] is base:
+        # Also keep the oldest dataset in the chain, in case the caches were last built for it
+        oldest, oldest_new = lineage['bases'][-1]
+        composed = new.copy()
+        composed[~new] = oldest_new
+        bases.append((oldest, composed))
+    st.session_state['df_lineage'] = {'df': df, 'bases': bases}
+
+def appended_rows(base):
+    """Boolean array of the active dataset's rows appended since base, or None if it isn't base plus appended rows."""
+    lineage = st.session_state.get('df_lineage')
+    if lineage is None or lineage['df'] is not st.session_state['df']:
+        return None
+    for older, new in lineage['bases']:
+        if older is base:
+            return new
+    return None
+
+def release_old_datasets():
+    """
+    Drop everything that keeps an earlier dataset alive once another one is active, so
+    replaced frames are freed. Caches built for a dataset the active one was appended to
+    stay until they are extended, and the lineage keeps only datasets some cache still uses.
+    """
+    active = st.session_state['df']
+    lineage = st.session_state.get('df_lineage')
+    if lineage is not None and lineage['df'] is not active:
+        lineage = None
+    usable = [active] + ([base for base, _ in lineage['bases']] if lineage else [])
+    is_usable = lambda frame: any(frame is df for df in usable)
+
+    metric_cache = st.session_state.get('metric_cache')
+    if metric_cache is not None and not is_usable(metric_cache.df):
+        st.session_state['metric_cache'] = None
+    aggregates = st.session_state.get('creator_aggregates')
+    if aggregates is not None and not is_usable(aggregates['source']):
+        st.session_state['creator_aggregates'] = None
+    stage_cache = st.session_state['analytics_cache']
+    if stage_cache.source is not None and not is_usable(stage_cache.source):
+        stage_cache.clear()
+
+    # Nothing below is carried over to an appended dataset
+    month_cache = st.session_state.get('month_cache')
+    if month_cache is not None and not month_cache.matches(active):
+        st.session_state['month_cache'] = None
+    journal = st.session_state.get('edit_journal')
+    if journal is not None and journal.frame is not active:
+        st.session_state['edit_journal'] = None
+        # The grid starts afresh on the new dataset
+        st.session_state['editor_version'] += 1
+    batch_export = st.session_state.get('batch_export')
+    if batch_export is not None and batch_export.source is not active:
+        st.session_state['batch_export'] = None
+    # Grids of earlier versions: Streamlit keeps their change callback, and with it the variables of that run
+    current_grid = f"data_editor_{st.session_state['editor_version']}_"
+    for key in [k for k in st.session_state if str(k).startswith('data_editor_') and not str(k).startswith(current_grid)]:
+        del st.session_state[key]
+    loaded = st.session_state.get('upload_loaded')
+    if loaded is not None and loaded.get('df') is not None and loaded['df'] is not active:
+        # The File Manager shows a preview; switching back reads the file from the upload cache
+        loaded['df'] = None
+
+    if lineage is not None:
+        in_use = [stage_cache.source]
+        if st.session_state['metric_cache'] is not None:
+            in_use.append(st.session_state['metric_cache'].df)
+        if st.session_state['creator_aggregates'] is not None:
+            in_use.append(st.session_state['creator_aggregates']['source'])
+        lineage['bases'] = [(base, new) for base, new in lineage['bases'] if any(base is df for df in in_use)]
+        if not lineage['bases']:
+            lineage = None
+    st.session_state['df_lineage'] = lineage
+
+def creator_summary(df, roles, all_rows):
+    """
+    aggregate_creators(df, roles) for the Analytics page. When df holds every row of the active
+    dataset the aggregates are kept, and rows appended to the dataset later are added to them
+    instead of aggregating all rows again.
+    """
+    if not all_rows:
+        return aggregate_creators(df, roles)
+    active = st.session_state['df']
+    stored = st.session_state.get('creator_aggregates')
+    if stored is not None and stored['roles'] == roles and active.index.is_unique:
+        if stored['source'] is active:
+            return stored['aggregates'].summary()
+        new = appended_rows(stored['source'])
+        if new is not None:
+            new_rows = df[df.index.isin(active.index[new])]
+            # Appended rows whose ID columns changed type (say to float) can't be matched to the counted ones
+            if stored['aggregates'].accepts(new_rows):
+                stored['aggregates'].add(new_rows)
+                stored['source'] = active
+                return stored['aggregates'].summary()
+    aggregates = CreatorAggregates(roles).add(df)
+    st.session_state['creator_aggregates'] = {'source': active, 'roles': roles, 'aggregates': aggregates}
+    return aggregates.summary()
+
+def show_memory_report(memory):
+    """Show how much memory compacting a loaded dataset saved, per column (memory is memory_report's result)."""
+    report, before_mb, after_mb = memory
+    with st.expander(f"🗜️ Memory: {before_mb:,.1f} MB → {after_mb:,.1f} MB after compaction"):
+        st.dataframe(report, use_container_width=True, hide_index=True)
+
+def edit_journal():
+    """Undo history of the active dataset, started afresh whenever another dataset becomes active."""
+    journal = st.session_state.get('edit_journal')
+    if journal is None or journal.frame is not st.session_state['df']:
+        journal = EditJournal(st.session_state['df'])
+        st.session_state['edit_journal'] = journal
+    return journal
+
+def show_edited_df(df, message, new_rows=None):
+    """
+    Make a journal result the active dataset and start the editor afresh on it.
+    new_rows marks (boolean array) the rows of df added to the previous dataset when that is all the change did.
+    """
+    if new_rows is not None:
+        record_append(st.session_state['df'], df, new_rows)
+    else:
+        # Nothing kept for the previous dataset carries over: parsed metrics, aggregates, its fingerprint, its batches
+        st.session_state['metric_cache'] = None
+        st.session_state['creator_aggregates'] = None
+        st.session_state['analytics_cache'].forget_source()
+        st.session_state['batch_export'] = None
+    st.session_state['df'] = df
+    st.session_state['month_cache'] = None
+    st.session_state['editor_version'] += 1
+    st.session_state['editor_last_change'] = message
+
+def apply_data_editor_changes(editor_key, start, end):
+    """Data editor callback: apply the page's changes to the full dataset through the journal."""
+    journal = edit_journal()
+    change = EditorChange(start, end, st.session_state[editor_key])
+    df = journal.apply(change)
+    cells, added, deleted = change.counts
+    new_rows = None
+    if added and not cells and not deleted:
+        # Only rows were added (at the end of the page), so the Analytics caches can take just those in
+        new_rows = np.zeros(len(df), dtype=bool)
+        new_rows[end:end + added] = True
+    show_edited_df(df, change.describe(), new_rows)
+
+def apply_edit(op):
+    """Apply a toolbar operation through the journal, showing why it failed if it did."""
+    journal = edit_journal()
+    try:
+        df = journal.apply(op)
+    except ValueError as e:
+        st.error(f"❌ {e}")
+        return False
+    show_edited_df(df, op.describe())
+    return True
+
+def excel_sheet_rows(uploaded_file, file_digest, engine):
+    """Cells of an uploaded workbook, read once per file and engine and kept for header row changes."""
+    sheet = st.session_state.get('excel_rows')
+    if sheet is None or sheet['digest'] != file_digest or sheet['engine'] != engine:
+        sheet = {'digest': file_digest, 'engine': engine, 'rows': read_excel_rows(io.BytesIO(uploaded_file.getvalue()), engine)}
+        st.session_state['excel_rows'] = sheet
+    return sheet['rows']
+
+def username_column_index(columns):
+    """Position of the likeliest username column, for selectbox defaults."""
+    col = st.session_state['role_registry'].username_column(columns)
+    return list(columns).index(col) if col else 0
+
+def set_column_role(role, key, columns):
+    """Role picker callback: save the picked column as the role for files with these columns."""
+    st.session_state['role_registry'].set_role(columns, role, st.session_state[key])
+
+def reset_column_roles(columns):
+    """Button callback: forget the roles set by hand for files with these columns."""
+    st.session_state['role_registry'].reset(columns)
+    layout = layout_key(columns)
+    for role in ROLE_LABELS:
+        st.session_state.pop(f'role_{role}_{layout}', None)
+
+def extracted_text():
+    """Text to extract from: the uploaded dump if there is one, else the text box."""
+    text_file = st.session_state.get('extract_text_file')
+    if text_file is not None:
+        return text_file.getvalue().decode('utf-8', errors='replace')
+    return st.session_state.get('extract_text', '')
+
+def extract_into_session():
+    """Button callback: add the current paste to the extraction session, then empty the box for the next one."""
+    text = extracted_text()
+    st.session_state['extract_empty'] = not text.strip()
+    if text.strip():
+        st.session_state['extraction_session'].add(text)
+        if st.session_state.get('extract_clear', True):
+            # Kept for the card parser below, which reads the same paste
+            st.session_state['extract_last_text'] = text
+            st.session_state['extract_text'] = ''
+
+release_old_datasets()
 
 # ==============================================================================
 # SIDEBAR NAVIGATION
@@ -486,39 +631,71 @@ elif menu == "📂 File Manager":
     with tab1:
         st.subheader("Upload an existing CSV or Excel file")
         uploaded_file = st.file_uploader("Choose a file", type=['csv', 'xlsx'])
+        upload_cache = UploadCache(max_mb=st.session_state['upload_cache_mb'])
         if uploaded_file is not None:
             try:
+                # The parsed upload is kept per uploaded file, so reruns (Data Editor edits, the
+                # other tabs, ...) neither hash nor parse it again, nor replace the active dataset
+                loaded = st.session_state.get('upload_loaded')
+                if loaded is None or loaded['file_id'] != uploaded_file.file_id:
+                    # Parsed files are cached on disk by content, so re-uploading the same export is instant
+                    loaded = {
+                        'file_id': uploaded_file.file_id,
+                        'digest': upload_cache.digest(uploaded_file.getvalue()),
+                        'key': None,
+                    }
+                    st.session_state['upload_loaded'] = loaded
+                file_digest = loaded['digest']
+                df = None
+                compact_df = None
                 if uploaded_file.name.endswith('.csv'):
-                    df = pd.read_csv(uploaded_file)
+                    large_mode = st.checkbox(
+                        "⚡ Large file mode (chunked, Arrow-backed)",
+                        value=uploaded_file.size > LARGE_CSV_BYTES,
+                        help="Reads the file in blocks with pyarrow and shows progress. Integer columns are stored in the smallest type that fits."
+                    )
+                    cache_key = upload_cache.key(file_digest, 'csv')
+                    if loaded['key'] != cache_key:
+                        compact_df = upload_cache.load(cache_key)
+                        if compact_df is None:
+                            if large_mode:
+                                read_progress = st.progress(0.0, text="Reading CSV...")
+                                df = read_csv_chunked(
+                                    uploaded_file,
+                                    progress=lambda done: read_progress.progress(done, text=f"Reading CSV... {done:.0%}")
+                                )
+                                read_progress.empty()
+                            else:
+                                df = pd.read_csv(uploaded_file)
                 else:
-                    # Auto-detect header row
-                    detected_header = 0
-                    try:
-                        # Read first 20 rows to scan for headers
-                        df_preview = pd.read_excel(uploaded_file, nrows=20, header=None)
-                        
-                        # Keywords to look for (based on user screenshot/standard TikTok export)
-                        expected_cols = ['Creator name', 'Creator ID', 'Video ID', 'GMV', 'VV', 'Likes', 'Gross mer']
-                        
-                        max_matches = 0
-                        for idx, row in df_preview.iterrows():
-                            # Convert row to string and check for keywords
-                            row_str = " ".join([str(x) for x in row.values if pd.notna(x)])
-                            matches = sum(1 for kw in expected_cols if kw.lower() in row_str.lower())
-                            
-                            if matches > max_matches and matches >= 2: # At least 2 matches to be confident
-                                max_matches = matches
-                                detected_header = idx
-                        
-                        # Reset file pointer to beginning so we can read it again
-                        uploaded_file.seek(0)
-                        
-                        if detected_header > 0:
-                            st.info(f"💡 Auto-detected headers on Row {detected_header}. If incorrect, adjust below.")
+                    engines = available_excel_engines()
+                    excel_engine = engines[0]
+                    if len(engines) > 1:
+                        excel_engine = st.radio(
+                            "Excel reader",
+                            engines,
+                            index=len(engines) - 1,
+                            horizontal=True,
+                            help="calamine reads large workbooks several times faster than openpyxl; both give the same table."
+                        )
 
-                    except Exception as scan_e:
-                        print(f"Header scan failed: {scan_e}")
-                        uploaded_file.seek(0) # Ensure reset even on fail
+                    # Auto-detect header row (remembered per file, so the scan only runs once)
+                    if 'detected_header' not in loaded:
+                        loaded['detected_header'] = upload_cache.load_meta(file_digest).get('detected_header')
+                    detected_header = loaded['detected_header']
+                    if detected_header is None:
+                        detected_header = 0
+                        try:
+                            # Scan the top rows of the one read of the sheet for headers
+                            rows = excel_sheet_rows(uploaded_file, file_digest, excel_engine)
+                            detected_header = detect_header_row(pd.DataFrame(rows[:HEADER_SCAN_ROWS]))
+                            upload_cache.store_meta(file_digest, detected_header=detected_header)
+                        except Exception as scan_e:
+                            print(f"Header scan failed: {scan_e}")
+                        loaded['detected_header'] = detected_header
+
+                    if detected_header > 0:
+                        st.info(f"💡 Auto-detected headers on Row {detected_header}. If incorrect, adjust below.")
 
                      # Add option for header row
                     header_row = st.number_input(
@@ -528,19 +705,67 @@ elif menu == "📂 File Manager":
                         step=1,
                         help="If your Excel file has a title or empty rows at the top, increase this number until the correct headers are shown."
                     )
-                    df = pd.read_excel(uploaded_file, header=header_row)
+                    cache_key = upload_cache.key(file_digest, 'excel', header_row)
+                    if loaded['key'] != cache_key:
+                        compact_df = upload_cache.load(cache_key)
+                        if compact_df is None:
+                            # Built from the cells already read, so changing the header row doesn't re-read the file
+                            df = frame_from_rows(excel_sheet_rows(uploaded_file, file_digest, excel_engine), header_row)
+
+                # Only a new file or a changed header row loads anything and replaces the active dataset
+                if loaded['key'] != cache_key:
+                    if compact_df is None:
+                        compact_df = compact_dataframe(df)
+                        upload_cache.store(cache_key, compact_df)
+                    loaded.update(
+                        key=cache_key,
+                        df=compact_df,
+                        preview=compact_df.head(),
+                        memory=None if df is None else memory_report(df, compact_df),
+                    )
+                    st.session_state['df'] = compact_df
+                    st.session_state['file_name'] = uploaded_file.name
+                # Only the first rows: the full frame is let go once another dataset is active
+                preview = loaded['preview']
 
-                st.session_state['df'] = df
-                st.session_state['file_name'] = uploaded_file.name
-                
                 # Validation check
-                if df.columns.str.contains('^Unnamed').any():
+                if preview.columns.astype(str).str.contains('^Unnamed').any():
                     st.warning("⚠️ Some columns appear to be unnamed. You might need to adjust the 'Header Row Index' above if this is an Excel file.")
 
                 st.success(f"Successfully loaded **{uploaded_file.name}**!")
-                st.dataframe(df.head(), use_container_width=True)
+                if loaded['memory'] is None:
+                    st.caption("⚡ Loaded from the upload cache")
+                else:
+                    show_memory_report(loaded['memory'])
+                if st.session_state['df'] is not loaded['df']:
+                    st.info("✏️ The active dataset has changed since this file was loaded (edits, merge, ...). Your changes are kept.")
+                    if st.button("↩️ Use this upload as the active dataset again"):
+                        # Loads it again (from the upload cache when it's still there) and makes it active
+                        loaded['key'] = None
+                        st.rerun()
+                st.dataframe(preview, use_container_width=True)
             except Exception as e:
                 st.error(f"Error loading file: {e}")
+        else:
+            # Nothing to keep parsed once the file is removed from the uploader
+            st.session_state['upload_loaded'] = None
+            st.session_state['excel_rows'] = None
+
+        with st.expander("🗄️ Upload Cache"):
+            upload_cache.evict()
+            cached_files, cached_mb = upload_cache.usage()
+            st.write(f"**{cached_files}** parsed file(s) cached, {cached_mb:,.1f} MB on disk")
+            st.caption(f"Location: `{upload_cache.directory}`")
+            st.number_input(
+                "Size limit (MB)",
+                min_value=0.0,
+                step=256.0,
+                key='upload_cache_mb',
+                help="Least recently used files are removed once the cache grows past this size."
+            )
+            if st.button("🗑️ Clear Upload Cache"):
+                upload_cache.clear()
+                st.rerun()
 
     with tab2:
         st.subheader("Create a new CSV from scratch")
@@ -557,35 +782,67 @@ elif menu == "📂 File Manager":
         st.markdown("Combine multiple CSV/Excel files into one dataset.")
         
         uploaded_files = st.file_uploader(
-            "Upload files to merge (2 or more)", 
+            "Upload files to merge (2 or more, or 1 to add to the loaded dataset)", 
             type=['csv', 'xlsx'], 
             accept_multiple_files=True,
             key='merge_uploader'
         )
         
-        if uploaded_files and len(uploaded_files) >= 2:
+        has_current = st.session_state['df'] is not None
+        if uploaded_files and (len(uploaded_files) >= 2 or has_current):
             try:
                 with st.spinner('Loading files...'):
+                    # Files are read in parallel once per selection, not again on every option change
+                    file_ids = tuple(file.file_id for file in uploaded_files)
+                    loaded = st.session_state.get('merge_loaded')
+                    if loaded is None or loaded[0] != file_ids:
+                        load_progress = st.progress(0.0, text="Loading files...")
+                        load_results = load_tables(
+                            [(file.name, file.getvalue()) for file in uploaded_files],
+                            progress=lambda done, total, name, error: load_progress.progress(
+                                done / total, text=f"Loaded {done}/{total}: {name}" + (" (failed)" if error else "")
+                            )
+                        )
+                        load_progress.empty()
+                        st.session_state['merge_loaded'] = (file_ids, load_results)
+                    else:
+                        load_results = loaded[1]
+
                     dfs = []
+                    df_names = []
                     file_info = []
                     
-                    for file in uploaded_files:
-                        if file.name.endswith('.csv'):
-                            temp_df = pd.read_csv(file)
-                        else:
-                            temp_df = pd.read_excel(file)
+                    for file, (temp_df, load_error) in zip(uploaded_files, load_results):
+                        if load_error is not None:
+                            file_info.append({'name': file.name, 'rows': None, 'columns': None, 'status': f"❌ {load_error}"})
+                            continue
                         
                         dfs.append(temp_df)
+                        df_names.append(file.name)
                         file_info.append({
                             'name': file.name,
                             'rows': len(temp_df),
-                            'columns': len(temp_df.columns)
+                            'columns': len(temp_df.columns),
+                            'status': "✅ Loaded"
                         })
                     
                     # Display file info
                     st.markdown("#### Files to Merge")
-                    info_df = pd.DataFrame(file_info)
+                    info_df = pd.DataFrame(file_info).astype({'rows': 'Int64', 'columns': 'Int64'})
                     st.dataframe(info_df, use_container_width=True)
+
+                    include_current = has_current and st.checkbox(
+                        "Include the loaded dataset (as the first file)",
+                        value=len(uploaded_files) < 2,
+                        help="E.g. to append this week's export. Stacked rows are added to the Analytics totals without recomputing them."
+                    )
+                    if include_current:
+                        dfs.insert(0, st.session_state['df'])
+                        df_names.insert(0, "Loaded dataset")
+
+                    if len(dfs) < 2:
+                        st.error("At least 2 files must load successfully to merge.")
+                        st.stop()
                     
                     # Merge options
                     st.markdown("#### Merge Options")
@@ -613,18 +870,52 @@ elif menu == "📂 File Manager":
                             
                             if common_cols:
                                 join_col = st.selectbox("Join on Column", sorted(list(common_cols)))
+                                precedence = st.radio(
+                                    "Shared columns: keep the value from",
+                                    PRECEDENCE_OPTIONS,
+                                    format_func=lambda p: "First file that has one" if p == 'first' else "Last file that has one",
+                                    help="Columns that appear in several files are combined into one instead of '_dup' copies."
+                                )
                             else:
                                 st.error("No common columns found across all files!")
                                 st.stop()
+
+                    first_row_per_key = False
+                    if merge_method == "Join (Match Columns)":
+                        join_estimate = estimate_join(dfs, join_col)
+                        st.caption(
+                            f"Estimated result: {join_estimate['rows']:,} rows (~{join_estimate['bytes'] / 1e6:,.1f} MB) "
+                            f"from {join_estimate['input_rows']:,} input rows"
+                        )
+                        if is_join_explosion(join_estimate):
+                            dup_files = ", ".join(df_names[i] for i in join_estimate['duplicate_keys'])
+                            st.warning(
+                                f"⚠️ Repeated '{join_col}' values in {dup_files} multiply rows: every match is paired with every other. "
+                                "Keep one row per value to avoid a memory blow-up."
+                            )
+                            first_row_per_key = st.checkbox(f"Keep only the first row per '{join_col}' in each file", value=True)
                     
                     # Deduplication option
                     dedupe_after = st.checkbox("Remove duplicates after merge", value=True)
                     if dedupe_after:
                         # Get all columns from first file
                         dedupe_col = st.selectbox("Deduplicate by column", dfs[0].columns.tolist())
+
+                    contacted_store = st.session_state['contacted_store']
+                    exclude_contacted = st.checkbox(
+                        "Leave out creators already contacted",
+                        value=False,
+                        help=f"{contacted_store.count():,} usernames are marked as contacted (from the Batch Splitter)."
+                    )
+                    if exclude_contacted:
+                        contacted_col = st.selectbox(
+                            "Username column", dfs[0].columns.tolist(),
+                            index=username_column_index(dfs[0].columns), key="merge_contacted_col"
+                        )
                     
                     if st.button("🚀 Merge Files", type="primary"):
                         with st.spinner('Merging files...'):
+                            base_df = dfs[0] if include_current else None
                             if merge_method == "Stack (Append Rows)":
                                 if handle_columns == "Keep common columns only":
                                     # Find common columns
@@ -637,10 +928,8 @@ elif menu == "📂 File Manager":
                                 
                                 merged_df = pd.concat(dfs, ignore_index=True)
                             else:
-                                # Join method
-                                merged_df = dfs[0]
-                                for df in dfs[1:]:
-                                    merged_df = merged_df.merge(df, on=join_col, how='outer', suffixes=('', '_dup'))
+                                # Join method: one pass over all files
+                                merged_df = join_frames(dfs, join_col, precedence, first_row_per_key)
                             
                             # Deduplicate if requested
                             if dedupe_after and dedupe_col in merged_df.columns:
@@ -649,11 +938,25 @@ elif menu == "📂 File Manager":
                                 removed = before_count - len(merged_df)
                                 if removed > 0:
                                     st.info(f"Removed {removed} duplicate rows based on '{dedupe_col}'")
+
+                            if exclude_contacted and contacted_col in merged_df.columns:
+                                merged_df, removed = contacted_store.exclude(merged_df, contacted_col)
+                                if removed > 0:
+                                    st.info(f"Removed {removed} rows of creators already contacted")
                             
-                            st.session_state['df'] = merged_df
-                            st.session_state['file_name'] = f"merged_{len(uploaded_files)}_files.csv"
+                            compact_df = compact_dataframe(merged_df)
+                            st.session_state['df'] = compact_df
+                            st.session_state['file_name'] = f"merged_{len(dfs)}_files.csv"
+                            if merge_method == "Stack (Append Rows)" and base_df is not None and len(base_df):
+                                # Stacked rows keep their position as index labels: if every loaded row
+                                # survived dedupe and exclusion, the merge only appended rows to it
+                                kept = compact_df.index.to_numpy()
+                                if len(kept) >= len(base_df) and kept[len(base_df) - 1] == len(base_df) - 1:
+                                    record_append(base_df, compact_df, np.arange(len(kept)) >= len(base_df))
                             
-                            st.success(f"✅ Successfully merged {len(uploaded_files)} files! Total rows: {len(merged_df)}")
+                            st.success(f"✅ Successfully merged {len(dfs)} files! Total rows: {len(merged_df)}")
+                            show_memory_report(memory_report(merged_df, compact_df))
+                            merged_df = compact_df
                             st.dataframe(merged_df.head(20), use_container_width=True)
                             
                             # Download option
@@ -663,8 +966,8 @@ elif menu == "📂 File Manager":
             except Exception as e:
                 st.error(f"Error merging files: {e}")
                 st.exception(e)
-        elif uploaded_files and len(uploaded_files) < 2:
-            st.warning("Please upload at least 2 files to merge.")
+        elif uploaded_files:
+            st.warning("Please upload at least 2 files to merge, or load a dataset to add this file to.")
 
 
 # --- 3. DATA EDITOR ---
@@ -678,13 +981,13 @@ elif menu == "✍️ Data Editor":
         
         # --- Toolbar ---
         with st.expander("🛠️ columns & Tools", expanded=False):
-            t1, t2, t3 = st.tabs(["Drop Columns", "Rename Columns", "Filter Rows"])
+            t1, t2, t3, t4 = st.tabs(["Drop Columns", "Rename Columns", "Filter Rows", "Recipe"])
             
             with t1:
                 cols_to_drop = st.multiselect("Select columns to drop", df.columns)
                 if st.button("Drop Selected Columns"):
-                    st.session_state['df'] = df.drop(columns=cols_to_drop)
-                    st.rerun()
+                    if apply_edit(DropColumns(cols_to_drop)):
+                        st.rerun()
 
             with t2:
                 c1, c2, c3 = st.columns([1,1,1])
@@ -694,8 +997,8 @@ elif menu == "✍️ Data Editor":
                     st.write("") # Spacer
                     st.write("") # Spacer
                     if st.button("Rename"):
-                        st.session_state['df'] = df.rename(columns={col_rename: new_name})
-                        st.rerun()
+                        if apply_edit(RenameColumns({col_rename: new_name})):
+                            st.rerun()
 
             with t3:
                 c1, c2, c3 = st.columns([1,1,1])
@@ -706,35 +1009,95 @@ elif menu == "✍️ Data Editor":
                     st.write("")
                     if st.button("Apply Filter"):
                         if filter_val:
-                            filtered = df[df[filter_col].astype(str).str.contains(filter_val, case=False, na=False)]
-                            st.session_state['df'] = filtered.reset_index(drop=True)
-                            st.success(f"Filter matched {len(filtered)} rows.")
-                            st.rerun()
+                            if apply_edit(FilterRows(filter_col, filter_val)):
+                                st.rerun()
+
+            with t4:
+                # The column and row steps taken so far, to replay on another file
+                st.caption("Save the drop, rename and filter steps taken so far, or replay saved steps on this file. Cell edits made in the table are not included.")
+                journal = edit_journal()
+                st.download_button(
+                    label="💾 Download Recipe",
+                    data=journal.recipe_json,
+                    file_name="edit_recipe.json",
+                    mime='application/json',
+                    on_click="ignore",
+                )
+                recipe_file = st.file_uploader("Replay a recipe", type=['json'], key='recipe_file')
+                if recipe_file is not None and st.button("▶️ Apply Recipe"):
+                    try:
+                        replayed = journal.replay(recipe_file.getvalue())
+                    except ValueError as e:
+                        st.error(f"❌ {e}")
+                    else:
+                        show_edited_df(replayed, f"Applied recipe {recipe_file.name}")
+                        st.rerun()
+
+        # --- Undo / Redo ---
+        journal = edit_journal()
+        c1, c2, c3 = st.columns([1, 1, 2])
+        with c1:
+            if st.button("↩️ Undo", disabled=not journal.can_undo(), help=journal.next_undo(), use_container_width=True):
+                message = f"Undid: {journal.next_undo()}"
+                show_edited_df(journal.undo(), message)
+                st.rerun()
+        with c2:
+            if st.button("↪️ Redo", disabled=not journal.can_redo(), help=journal.next_redo(), use_container_width=True):
+                message = f"Redid: {journal.next_redo()}"
+                show_edited_df(journal.redo(), message)
+                st.rerun()
+        with c3:
+            history = journal.history()
+            if history:
+                with st.expander(f"📜 History ({len(history)} edit(s))"):
+                    for number, entry in enumerate(history, 1):
+                        st.write(f"{number}. {entry}")
 
         st.markdown("### Interactive Editor")
         st.markdown("Double-click cells to edit. Add/Delete rows using the table controls.")
-        
-        # Editable Dataframe
-        edited_df = st.data_editor(
-            st.session_state['df'],
+
+        # Only one page of rows goes to the browser; edits are applied to the full dataset as they happen
+        df = st.session_state['df']
+        n_rows = len(df)
+        c1, c2, c3 = st.columns([1, 1, 2])
+        with c1:
+            page_size = st.selectbox("Rows per page", PAGE_SIZES, index=PAGE_SIZES.index(DEFAULT_PAGE_SIZE), key='editor_page_size')
+        pages = page_count(n_rows, page_size)
+        if st.session_state.get('editor_page', 1) > pages:
+            st.session_state['editor_page'] = pages
+        with c2:
+            page = st.number_input(f"Page (of {pages:,})", min_value=1, max_value=pages, step=1, key='editor_page')
+        start, end = page_bounds(n_rows, page_size, page)
+        with c3:
+            st.write("")
+            st.caption(f"Rows {min(start + 1, n_rows):,}–{end:,} of {n_rows:,}")
+            last_change = st.session_state.get('editor_last_change')
+            if last_change:
+                st.caption(f"✅ {last_change}")
+
+        # Categorical columns are shown as plain text so any value can be typed
+        editor_key = f"data_editor_{st.session_state['editor_version']}_{start}_{page_size}"
+        st.data_editor(
+            editor_page(df, start, end),
             num_rows="dynamic",
             use_container_width=True,
-            height=600
+            height=600,
+            key=editor_key,
+            on_change=apply_data_editor_changes,
+            args=(editor_key, start, end),
         )
 
-        # Update session state with edits
-        # Note: In Streamlit, data_editor returns the new dataframe. 
-        # We update the session state only if the user manually saves or interacts? 
-        # Actually, let's just update the state implicitly or have a save button?
-        # Streamlit re-runs on edit, so 'edited_df' is the new state.
-        
-        if not edited_df.equals(st.session_state['df']):
-             st.session_state['df'] = edited_df
-
         st.markdown("---")
         st.markdown("### Download")
         new_filename = st.text_input("Filename", st.session_state['file_name'])
-        to_csv_download_link(edited_df, new_filename, "💾 Download CSV")
+        # The CSV is only built when the button is clicked
+        st.download_button(
+            label="💾 Download CSV",
+            data=lambda: st.session_state['df'].to_csv(index=False),
+            file_name=new_filename,
+            mime='text/csv',
+            on_click="ignore",
+        )
 
 # --- 4. BATCH SPLITTER ---
 elif menu == "📦 Batch Splitter":
@@ -750,58 +1113,118 @@ elif menu == "📦 Batch Splitter":
         with col1:
             batch_size = st.number_input("Rows per batch", min_value=1, value=100, step=10)
         
-        num_files = (len(df) + batch_size - 1) // batch_size
+        num_files = count_batches(len(df), batch_size)
         with col2:
             st.metric("Files to Create", num_files)
 
+        contacted_store = st.session_state['contacted_store']
+        with st.expander("🚫 Skip Already-Contacted Creators"):
+            contacted_count = contacted_store.count()
+            st.caption(f"{contacted_count:,} usernames marked as contacted in earlier batches.")
+            name_col = st.selectbox("Username column", df.columns.tolist(), index=username_column_index(df.columns), key="contacted_col")
+            skip_contacted = st.checkbox("Leave out creators already contacted", value=contacted_count > 0)
+            if contacted_count and st.button("🗑️ Forget All Contacted Creators"):
+                contacted_store.clear()
+                st.rerun()
+        split_options = (skip_contacted, name_col)
+
+        # Parts are serialized once and kept in session state, so download clicks don't lose them
         if st.button("🚀 Generate Batches", type="primary"):
+            batch_df = df
+            if skip_contacted:
+                batch_df, skipped = contacted_store.exclude(df, name_col)
+                st.info(f"Skipped {skipped} rows of creators already contacted; {len(batch_df)} rows left.")
+            st.session_state['batch_export'] = BatchExport(batch_df, batch_size, source=df, options=split_options)
+
+        batch_export = st.session_state.get('batch_export')
+        if batch_export is not None and batch_export.matches(df, batch_size, split_options):
+            num_files = len(batch_export.parts)
             st.markdown("### Download Batches")
             
-            # Store batches for download all functionality
-            batch_files = []
-            
             # Create a container for the buttons
             grid = st.columns(min(3, num_files)) if num_files > 0 else []
             
-            for i in range(0, len(df), batch_size):
-                batch_num = (i // batch_size) + 1
-                batch_df = df.iloc[i:i+batch_size]
-                fname = f"outreach_part_{batch_num}.csv"
-                
-                # Store batch data
-                batch_files.append((fname, batch_df))
-                
+            for batch_num, (fname, row_count, data) in enumerate(batch_export.parts, start=1):
                 # Dynamic column cycling
                 col_idx = (batch_num - 1) % 3
                 with grid[col_idx] if len(grid) > col_idx else st.container():
-                     to_csv_download_link(batch_df, fname, f"⬇️ Part {batch_num} ({len(batch_df)} rows)")
+                    st.download_button(
+                        label=f"⬇️ Part {batch_num} ({row_count} rows)",
+                        data=data,
+                        file_name=fname,
+                        mime='text/csv',
+                        on_click="ignore",
+                    )
             
             # Download All Button
             st.markdown("---")
             st.markdown("#### 📦 Download All Batches")
-            
-            if st.button("📥 Download All as ZIP", type="primary", key="download_all_zip"):
-                import io
-                import zipfile
-                
-                # Create zip file in memory
-                zip_buffer = io.BytesIO()
-                with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-                    for fname, batch_df in batch_files:
-                        # Convert DataFrame to CSV string
-                        csv_string = batch_df.to_csv(index=False)
-                        # Add to zip
-                        zip_file.writestr(fname, csv_string)
-                
-                # Offer download
-                st.download_button(
-                    label="💾 Download ZIP File",
-                    data=zip_buffer.getvalue(),
-                    file_name=f"all_batches_{num_files}_files.zip",
-                    mime="application/zip",
-                    key="zip_download_button"
+
+            zip_mode = st.radio(
+                "ZIP compression",
+                ["deflate", "store"],
+                horizontal=True,
+                help="'store' skips compression: a bigger file, but ready instantly."
+            )
+            # The archive is only built when the button is clicked
+            st.download_button(
+                label="📥 Download All as ZIP",
+                data=lambda: batch_export.zip_bytes(zip_mode),
+                file_name=f"all_batches_{num_files}_files.zip",
+                mime="application/zip",
+                type="primary",
+                key="zip_download_button",
+                on_click="ignore",
+            )
+
+            if st.button("✅ Mark These Creators as Contacted", help="Future batches and merges can then leave them out."):
+                added = contacted_store.add(batch_export.df[name_col], source=st.session_state['file_name'])
+                st.success(f"Marked {added} new creators as contacted.")
+
+    # Streaming split works straight from a file, without loading it as the active dataset
+    st.markdown("---")
+    with st.expander("🌊 Streaming Split (files larger than memory)"):
+        st.caption("Reads the CSV in chunks and writes each part to disk as it goes. Parts match the normal split byte for byte, and a manifest with row counts and checksums lets an interrupted split resume.")
+        stream_file = st.file_uploader("CSV to split", type=['csv'], key="stream_split_file")
+        s1, s2 = st.columns(2)
+        with s1:
+            stream_batch_size = st.number_input("Rows per batch", min_value=1, value=100, step=10, key="stream_batch_size")
+        with s2:
+            stream_out_dir = st.text_input("Output folder", "outreach_batches")
+        resume_split = st.checkbox("Resume a previous split into this folder", value=True)
+
+        if stream_file is not None and st.button("🌊 Split in Chunks"):
+            split_progress = st.progress(0.0, text="Splitting...")
+            try:
+                manifest = stream_split_csv(
+                    stream_file, stream_out_dir, stream_batch_size, resume=resume_split,
+                    progress=lambda done: split_progress.progress(done, text=f"Splitting... {done:.0%}")
                 )
-                st.success(f"✅ Created ZIP with {num_files} batch files!")
+                st.session_state['stream_split'] = (stream_out_dir, manifest)
+            except Exception as e:
+                st.error(f"Split stopped: {e}. Run it again to resume.")
+            split_progress.empty()
+
+        if st.session_state.get('stream_split'):
+            split_dir, manifest = st.session_state['stream_split']
+            st.success(f"✅ {len(manifest['parts'])} files, {manifest['total_rows']} rows written to `{split_dir}/`")
+            st.dataframe(pd.DataFrame(manifest['parts']), use_container_width=True, height=200)
+
+            def read_split_parts():
+                members = []
+                for part in manifest['parts']:
+                    with open(os.path.join(split_dir, part['file']), 'rb') as f:
+                        members.append((part['file'], f.read()))
+                return build_zip(members)
+
+            st.download_button(
+                label="📥 Download Parts as ZIP",
+                data=read_split_parts,
+                file_name=f"all_batches_{len(manifest['parts'])}_files.zip",
+                mime="application/zip",
+                key="stream_zip_download_button",
+                on_click="ignore",
+            )
 
 
 # --- 5. USERNAME EXTRACTOR ---
@@ -809,37 +1232,82 @@ elif menu == "🔍 Username Extractor":
     st.title("🔍 Username Extractor")
     st.markdown("Paste unstructured text below to extract `@usernames`.")
 
-    text_input = st.text_area("Paste text here", height=300, placeholder="@user1 some text @user2 ...")
+    st.text_area("Paste text here", height=300, placeholder="@user1 some text @user2 ...", key="extract_text")
+    st.file_uploader("...or upload a text dump", type=['txt'], key="extract_text_file")
+    st.checkbox("Clear the box after each extraction (paste one screen at a time)", value=True, key="extract_clear")
 
-    if st.button("✨ Extract Usernames (v2)", type="primary"):
+    session = st.session_state['extraction_session']
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        # Each press adds only the current paste; earlier pastes are never scanned again
+        st.button("✨ Extract Usernames (v2)", type="primary", on_click=extract_into_session)
+    with col2:
+        st.button("🧹 Start Over", on_click=session.clear, disabled=session.pastes == 0)
+
+    if st.session_state.get('extract_empty'):
+        st.error("Please paste some text first.")
+    elif session.last is not None:
+        last = session.last
+        if last['repeat']:
+            st.info("This text was already extracted - nothing new added.")
+        else:
+            st.success(f"This paste: {last['found']} usernames - {last['new']} new, {last['seen']} already seen.")
+
+        with st.expander("🛠️ Debug Logs (Check this if results are wrong)"):
+            # A huge paste logs one line per card; rendering all of them freezes the page
+            debug_log = last['debug_log']
+            shown = debug_log[:DEBUG_LOG_MAX_LINES]
+            if len(debug_log) > DEBUG_LOG_MAX_LINES:
+                shown = shown + [f"... {len(debug_log) - DEBUG_LOG_MAX_LINES:,} more lines", debug_log[-1]]
+            st.code("\n".join(shown))
+
+    if session.usernames:
+        st.markdown(f"**{len(session.usernames)} unique usernames** from {session.pastes} paste(s)")
+        result_df = pd.DataFrame({'username': session.sorted_usernames()})
+        st.dataframe(result_df, use_container_width=True)
+
+        # Options
+        col1, col2 = st.columns(2)
+        with col1:
+            to_csv_download_link(result_df, "extracted_usernames.csv", "💾 Download CSV")
+        with col2:
+            if st.button("Load into Data Editor"):
+                st.session_state['df'] = result_df
+                st.session_state['file_name'] = "extracted_usernames.csv"
+                st.success("Loaded! Go to Data Editor to view/edit.")
+    elif session.last is not None and not session.last['repeat']:
+        st.warning("No valid usernames found.")
+
+    st.markdown("---")
+    st.subheader("📇 Full Creator Cards")
+    st.caption("Parse every field of each card (PPS, categories, followers, flags, GMV, videos, views, engagement) into a typed table.")
+
+    if st.button("📇 Parse Creator Cards"):
+        # The box may have been cleared by the extraction above: parse the paste it held
+        text_input = extracted_text() or st.session_state.get('extract_last_text', '')
         if text_input.strip():
-            unique_users, debug_log = extract_usernames_from_text(text_input)
-            
-            with st.expander("🛠️ Debug Logs (Check this if results are wrong)"):
-                st.code("\n".join(debug_log))
-            
-            if unique_users:
-                st.success(f"Found {len(unique_users)} unique usernames!")
-                
-                # Create DataFrame
-                result_df = pd.DataFrame({'username': unique_users})
-                
-                st.dataframe(result_df, use_container_width=True)
-                
-                # Options
-                col1, col2 = st.columns(2)
-                with col1:
-                    to_csv_download_link(result_df, "extracted_usernames.csv", "💾 Download CSV")
-                with col2:
-                    if st.button("Load into Data Editor"):
-                        st.session_state['df'] = result_df
-                        st.session_state['file_name'] = "extracted_usernames.csv"
-                        st.success("Loaded! Go to Data Editor to view/edit.")
-            else:
-                st.warning("No valid usernames found.")
+            st.session_state['parsed_cards'] = parse_creator_cards(text_input)
         else:
             st.error("Please paste some text first.")
 
+    cards_df = st.session_state['parsed_cards']
+    if cards_df is not None:
+        if cards_df.empty:
+            st.warning("No creator cards found (each card needs a 'PPS:' line).")
+        else:
+            st.success(f"Parsed {len(cards_df)} creator cards!")
+            st.dataframe(cards_df, use_container_width=True)
+
+            col1, col2 = st.columns(2)
+            with col1:
+                to_csv_download_link(cards_df, "creator_cards.csv", "💾 Download CSV")
+            with col2:
+                if st.button("Load into Analytics", key="load_parsed_cards"):
+                    st.session_state['df'] = cards_df
+                    st.session_state['file_name'] = "creator_cards.csv"
+                    # Metric columns are already float64, so Analytics doesn't parse them again
+                    st.success("Loaded! Go to Analytics & Processing.")
+
 # --- 6. ANALYTICS & PROCESSING ---
 elif menu == "📊 Analytics & Processing":
     st.title("📊 Analytics & Processing")
@@ -847,21 +1315,45 @@ elif menu == "📊 Analytics & Processing":
     if st.session_state['df'] is None:
         st.warning('No data loaded. Please upload or create a file first.')
     else:
-        df = st.session_state['df'].copy()
+        # The processing stages below only record a plan; it runs once, after the last control,
+        # and builds a new frame, so the loaded data is never modified
+        source_df = st.session_state['df']
         
         # --- 1. COLUMN SELECTION ---
         st.subheader('1. Column Selection')
         with st.expander('Select Columns to Keep', expanded=True):
-            all_columns = df.columns.tolist()
+            all_columns = source_df.columns.tolist()
             default_cols = all_columns
             selected_cols = st.multiselect('Choose columns', all_columns, default=default_cols)
             
-            if selected_cols:
-                df = df[selected_cols]
-            else:
+            if not selected_cols:
                 st.warning('Please select at least one column.')
                 st.stop()
 
+        # Roles come from the registry: detected once per column layout, with the
+        # user's picks on top; unselected columns play no role
+        registry = st.session_state['role_registry']
+        with st.expander('🧭 Column Roles'):
+            st.caption('Which column holds what, detected from the column names. Changes are saved for every file with these same columns.')
+            layout = layout_key(all_columns)
+            source_roles = registry.roles(all_columns)
+            role_options = [None] + all_columns
+            role_cols = st.columns(5)
+            for i, (role, label) in enumerate(ROLE_LABELS.items()):
+                key = f'role_{role}_{layout}'
+                role_cols[i % 5].selectbox(
+                    label, role_options, index=role_options.index(source_roles[role]),
+                    format_func=lambda c: '(none)' if c is None else str(c),
+                    key=key, on_change=set_column_role, args=(role, key, all_columns)
+                )
+            overrides = registry.overrides(all_columns)
+            if overrides:
+                st.caption('Set by hand: ' + ', '.join(ROLE_LABELS[role] for role in overrides if role in ROLE_LABELS))
+                st.button('↩️ Reset to detected roles', on_click=reset_column_roles, args=(all_columns,))
+        roles = restrict_roles(source_roles, selected_cols)
+
+        plan = ProcessingPlan(source_df, selected_cols, parsed_metric, month_index)
+
         # --- 2. DATA PROCESSING ---
         st.subheader('2. Data Processing')
         
@@ -870,53 +1362,36 @@ elif menu == "📊 Analytics & Processing":
         # Deduplication
         with c1:
             st.markdown('#### Deduplication')
-            dedup_col = st.selectbox('Remove duplicates by', ['None'] + df.columns.tolist())
-            if dedup_col != 'None':
-                before_count = len(df)
-                df = df.drop_duplicates(subset=[dedup_col])
-                st.caption(f'Removed {before_count - len(df)} duplicates.')
+            dedup_col = st.selectbox('Remove duplicates by', ['None'] + selected_cols)
+            dedup_note = st.empty()
+            dedup_stage = plan.dedup(dedup_col) if dedup_col != 'None' else None
 
         # Filter by Month
         with c2:
             st.markdown('#### Filter by Month')
-            date_col = st.selectbox('Select Date Column', ['None'] + df.columns.tolist())
+            date_col = st.selectbox('Select Date Column', ['None'] + selected_cols)
+            month_stage = None
             if date_col != 'None':
                 try:
-                    # Convert to datetime temporarily
-                    temp_dates = pd.to_datetime(df[date_col], errors='coerce')
-                    df['bc_temp_date'] = temp_dates
-                    
-                    # Get unique months
-                    available_months = sorted(list(set(df['bc_temp_date'].dt.strftime('%Y-%m').dropna())))
+                    available_months = plan.month_options(date_col)
                     
                     selected_months = st.multiselect('Select Month(s)', available_months)
                     
                     if selected_months:
-                        mask = df['bc_temp_date'].dt.strftime('%Y-%m').isin(selected_months)
-                        df = df[mask]
-                        st.caption(f'Filtered to {len(df)} rows.')
-                    
-                    # Cleanup
-                    df = df.drop(columns=['bc_temp_date'])
+                        month_stage = plan.month_filter(date_col, selected_months)
                 except Exception as e:
                     st.error(f'Error parsing dates: {e}')
+            month_note = st.empty()
 
         # Sorting
         with c3:
             st.markdown('#### Sorting')
-            sort_col = st.selectbox('Sort by', ['None'] + df.columns.tolist())
+            sort_col = st.selectbox('Sort by', ['None'] + selected_cols)
             sort_order = st.radio('Order', ['Ascending', 'Descending'], horizontal=True)
             
             if sort_col != 'None':
-                ascending = True if sort_order == 'Ascending' else False
-                # Try to sort numerically if possible
-                try:
-                    # Create temp column for sorting to handle mix of strings/numbers
-                    df['temp_sort'] = df[sort_col].apply(parse_metric_value)
-                    df = df.sort_values(by='temp_sort', ascending=ascending).drop(columns=['temp_sort'])
-                except:
-                    # Fallback to standard sort
-                    df = df.sort_values(by=sort_col, ascending=ascending)
+                # Sorts numerically where the values parse as metrics (handles mixes of strings/numbers)
+                plan.sort(sort_col, ascending=sort_order == 'Ascending')
 
         # --- ADVANCED FILTERING ---
         st.markdown('---')
@@ -929,77 +1404,68 @@ elif menu == "📊 Analytics & Processing":
             
             with adv_c1:
                 st.markdown('**GMV Filter**')
-                # Detect GMV column
-                gmv_filter_col = None
-                for col in df.columns:
-                    if any(x in col.lower() for x in ['gmv', 'gross merchandise', 'revenue']):
-                        gmv_filter_col = col
-                        break
+                gmv_filter_col = roles['gmv']
                 
                 if gmv_filter_col:
-                    df['_temp_gmv'] = df[gmv_filter_col].apply(parse_metric_value)
                     min_gmv = st.number_input('Min GMV ($)', min_value=0, value=0, step=1000)
                     max_gmv = st.number_input('Max GMV ($)', min_value=0, value=1000000, step=10000)
                     
                     if min_gmv > 0 or max_gmv < 1000000:
-                        df = df[(df['_temp_gmv'] >= min_gmv) & (df['_temp_gmv'] <= max_gmv)]
+                        plan.metric_range(gmv_filter_col, min_gmv, max_gmv)
                         filter_applied = True
-                    
-                    df = df.drop(columns=['_temp_gmv'])
                 else:
                     st.info('No GMV column detected')
             
             with adv_c2:
                 st.markdown('**Video Count Filter**')
-                # Detect video count column
-                vid_count_col = None
-                for col in df.columns:
-                    if any(x in col.lower() for x in ['video count', 'videos', 'video id']):
-                        vid_count_col = col
-                        break
+                vid_count_col = roles['video_id'] or roles['video_count']
                 
                 if vid_count_col:
                     min_vids = st.number_input('Min Videos', min_value=0, value=0, step=1)
                     max_vids = st.number_input('Max Videos', min_value=1, value=1000, step=10)
                     
-                    if 'video id' in vid_count_col.lower():
+                    if vid_count_col == roles['video_id']:
                         # Count unique video IDs per creator
-                        creator_col_temp = None
-                        for col in df.columns:
-                            if 'creator' in col.lower() or 'name' in col.lower():
-                                creator_col_temp = col
-                                break
+                        creator_col_temp = roles['creator'] or roles['name']
                         
                         if creator_col_temp:
-                            vid_counts = df.groupby(creator_col_temp)[vid_count_col].nunique()
-                            valid_creators = vid_counts[(vid_counts >= min_vids) & (vid_counts <= max_vids)].index
-                            df = df[df[creator_col_temp].isin(valid_creators)]
+                            plan.distinct_count_range(creator_col_temp, vid_count_col, min_vids, max_vids)
                             filter_applied = True
                     else:
-                        df['_temp_vids'] = pd.to_numeric(df[vid_count_col], errors='coerce').fillna(0)
-                        df = df[(df['_temp_vids'] >= min_vids) & (df['_temp_vids'] <= max_vids)]
-                        df = df.drop(columns=['_temp_vids'])
+                        plan.number_range(vid_count_col, min_vids, max_vids)
                         filter_applied = True
                 else:
                     st.info('No video count column detected')
             
             with adv_c3:
                 st.markdown('**Text Search**')
-                search_col = st.selectbox('Search in column', ['None'] + df.columns.tolist(), key='adv_search_col')
+                search_col = st.selectbox('Search in column', ['None'] + selected_cols, key='adv_search_col')
                 search_term = st.text_input('Search term', key='adv_search_term')
                 
                 if search_col != 'None' and search_term:
-                    df = df[df[search_col].astype(str).str.contains(search_term, case=False, na=False)]
+                    plan.search(search_col, search_term)
                     filter_applied = True
             
-            if filter_applied:
-                st.success(f'✅ Filters applied. Showing {len(df)} rows.')
+            filters_note = st.empty()
+
+        # Run the plan once: filters first, then the sort, then the selected columns
+        df = plan.execute()
 
+        if dedup_stage is not None:
+            dedup_note.caption(f'Removed {plan.rows_in(dedup_stage) - plan.rows_out(dedup_stage)} duplicates.')
+        if month_stage is not None:
+            month_note.caption(f'Filtered to {plan.rows_out(month_stage)} rows.')
+        if filter_applied:
+            filters_note.success(f'✅ Filters applied. Showing {len(df)} rows.')
 
         # Apply Changes Button (Implicitly handled by streamlits rerun on interaction, 
         # but good to show current state)
         st.success(f'Processing Complete. Current Rows: {len(df)}')
         
+        with st.expander('🧮 Processing Plan'):
+            st.caption('Steps in the order they ran, after moving filters ahead of the sort. Only the listed columns are read until the selected columns are gathered at the end.')
+            st.dataframe(plan.report(), use_container_width=True, hide_index=True)
+
         with st.expander('View Processed Data'):
             st.dataframe(df, use_container_width=True)
 
@@ -1007,154 +1473,91 @@ elif menu == "📊 Analytics & Processing":
         # --- 3. ANALYTICS DASHBOARD ---
         st.markdown('---')
         st.subheader('3. Analytics Dashboard')
-        
-        # Identify numeric columns for aggregation
-        numeric_cols = df.select_dtypes(include=['number']).columns.tolist()
-        # Also try to identify columns that look like money or views
-        potential_metric_cols = [c for c in df.columns if any(x in c.lower() for x in ['view', 'gmv', 'video', 'follower', 'sale', 'revenue'])]
-        
-        # --- METRIC CARDS ---
-        
-        # Pre-calculate common metrics
-        # We need to parse columns like 'Videos', 'GMV', 'Views' if they exist
-        
-        # Helper to get column case-insensitive and partial match
-        def get_col(candidates):
-            # First try exact match (case-insensitive)
-            for c in df.columns:
-                if any(x.lower() == c.lower() for x in candidates):
-                    return c
-            # Then try exact match on full column name
-            for c in df.columns:
-                for candidate in candidates:
-                    if candidate.lower() == c.lower():
-                        return c
-            # Then try partial match (contains)
-            for c in df.columns:
-                if any(x.lower() in c.lower() for x in candidates):
-                    return c
-            return None
-
-        # 1. Identify Key Columns
-        video_count_col = get_col(['video count', 'videos_count']) 
-        video_id_col = get_col(['video id', 'item id'])
-        
-        view_col = get_col(['video views', 'vv', 'views', 'view count'])
-        if not view_col: view_col = get_col(['view'])
 
-        gmv_col = get_col(['Gross merchandise value (Video) ($)', 'gross merchandise value (video) ($)', 'gmv', 'gross merchandise value', 'gross mer', 'revenue', 'sales', 'gpm', 'merchandise value'])
-        
-        creator_col = get_col(['creator name', 'creator', 'username', 'user'])
-        
-        # New: Engagement & Commerce Columns
-        likes_col = get_col(['likes', 'like'])
-        comments_col = get_col(['comments', 'comment'])
-        shares_col = get_col(['shares', 'share'])
-        orders_col = get_col(['orders', 'order', 'items sold'])
+        # Every stage below is memoized on a fingerprint of the processed rows plus
+        # only the parameters it uses, so widgets that don't change the data
+        # (theme, commission rate, chart builder) reuse the previous results.
+        stage_cache = st.session_state['analytics_cache']
+        stage_cache.begin_rerun()
+        data_key = stage_cache.fingerprint(st.session_state['df'], df, appended_rows(stage_cache.source))
+
+        # 1. Key columns: the roles read from the registry above
+        role_key = tuple(sorted((k, str(v)) for k, v in roles.items()))
+        mode = roles['mode']
+        video_count_col = roles['video_count']
+        video_id_col = roles['video_id']
+        view_col = roles['views']
+        gmv_col = roles['gmv']
+        creator_col = roles['creator']
+        likes_col = roles['likes']
+        comments_col = roles['comments']
+        shares_col = roles['shares']
+        orders_col = roles['orders']
 
         # --- DATA PREPARATION ---
         # Clean and Parse Metrics
-        if view_col:
-            df['parsed_views'] = df[view_col].apply(parse_metric_value)
-        
-        if gmv_col:
-            df['parsed_gmv'] = df[gmv_col].apply(parse_metric_value)
-            
-        for col, name in [(likes_col, 'parsed_likes'), (comments_col, 'parsed_comments'), (shares_col, 'parsed_shares'), (orders_col, 'parsed_orders')]:
-            if col:
-                 df[name] = df[col].apply(parse_metric_value)
-
-        # Determine "Total Videos" and Creator Metrics Strategy
-        total_videos = 0
-        total_likes = 0
-        total_orders = 0
-        
-        creators_1_2_vids = 0
-        creators_3_9_vids = 0
-        creators_10plus_vids = 0
-        creators_10k_99k_gmv = 0
-        creators_100k_999k_gmv = 0
-        creators_1m_plus_gmv = 0
-        
-        mode = "Unknown"
-
-        if video_id_col and creator_col:
-            mode = "Granular (Video Level)"
-            # Group by Creator to get creator-level stats
-            agg_dict = {video_id_col: 'nunique'}
-            if gmv_col: agg_dict['parsed_gmv'] = 'sum'
-            if view_col: agg_dict['parsed_views'] = 'sum'
-            if likes_col: agg_dict['parsed_likes'] = 'sum'
-            if orders_col: agg_dict['parsed_orders'] = 'sum'
-            
-            creator_stats = df.groupby(creator_col).agg(agg_dict).rename(columns={video_id_col: 'video_count', 'parsed_gmv': 'total_gmv'})
-            
-            total_videos = df[video_id_col].nunique()
-            if likes_col: total_likes = int(df['parsed_likes'].sum())
-            if orders_col: total_orders = int(df['parsed_orders'].sum())
-            
-            creators_1_2_vids = len(creator_stats[(creator_stats['video_count'] >= 1) & (creator_stats['video_count'] <= 2)])
-            creators_3_9_vids = len(creator_stats[(creator_stats['video_count'] >= 3) & (creator_stats['video_count'] <= 9)])
-            creators_10plus_vids = len(creator_stats[creator_stats['video_count'] >= 10])
-            
-            if gmv_col:
-                creators_10k_99k_gmv = len(creator_stats[(creator_stats['total_gmv'] >= 10000) & (creator_stats['total_gmv'] < 100000)])
-                creators_100k_999k_gmv = len(creator_stats[(creator_stats['total_gmv'] >= 100000) & (creator_stats['total_gmv'] < 1000000)])
-                creators_1m_plus_gmv = len(creator_stats[creator_stats['total_gmv'] >= 1000000])
-                
-        elif video_count_col:
-            mode = "Aggregated (Creator Level)"
-            # Rows are creators already
-            df['parsed_videos'] = df[video_count_col].apply(lambda x: pd.to_numeric(x, errors='coerce')).fillna(0)
-            total_videos = int(df['parsed_videos'].sum())
-            if likes_col: total_likes = int(df['parsed_likes'].sum())
-            
-            creators_1_2_vids = len(df[(df['parsed_videos'] >= 1) & (df['parsed_videos'] <= 2)])
-            creators_3_9_vids = len(df[(df['parsed_videos'] >= 3) & (df['parsed_videos'] <= 9)])
-            creators_10plus_vids = len(df[df['parsed_videos'] >= 10])
-            
-            if gmv_col:
-                creators_10k_99k_gmv = len(df[(df['parsed_gmv'] >= 10000) & (df['parsed_gmv'] < 100000)])
-                creators_100k_999k_gmv = len(df[(df['parsed_gmv'] >= 100000) & (df['parsed_gmv'] < 1000000)])
-                creators_1m_plus_gmv = len(df[df['parsed_gmv'] >= 1000000])
-        
-        else:
-             mode = "Simple (Row Count)"
-             total_videos = len(df)
-             if creator_col:
-                 creator_counts = df[creator_col].value_counts()
-                 creators_1_2_vids = len(creator_counts[(creator_counts >= 1) & (creator_counts <= 2)])
-                 creators_3_9_vids = len(creator_counts[(creator_counts >= 3) & (creator_counts <= 9)])
-                 creators_10plus_vids = len(creator_counts[creator_counts >= 10])
-                 
-                 if gmv_col:
-                     creator_gmv = df.groupby(creator_col)['parsed_gmv'].sum()
-                     creators_10k_99k_gmv = len(creator_gmv[(creator_gmv >= 10000) & (creator_gmv < 100000)])
-                     creators_100k_999k_gmv = len(creator_gmv[(creator_gmv >= 100000) & (creator_gmv < 1000000)])
-                     creators_1m_plus_gmv = len(creator_gmv[creator_gmv >= 1000000])
+        parsed = stage_cache.run('parsing', (data_key, role_key), prepare_metrics, df, roles, parsed_metric)
+        df = df.assign(**parsed)
+
+        # Creator-level stats, totals and tier counts. While no filter removed rows, rows appended
+        # to the dataset since the last run are added to the kept aggregates instead.
+        summary = stage_cache.run('creator aggregation', (data_key, role_key), creator_summary, df, roles, len(df) == len(st.session_state['df']))
+        creator_stats = summary['creator_stats']
+        total_videos = summary['total_videos']
+        total_likes = summary['total_likes']
+        total_orders = summary['total_orders']
+        total_gmv = summary['total_gmv']
+
+        creator_perf = None
+        if mode == "Granular (Video Level)" and gmv_col and view_col:
+            creator_perf = stage_cache.run('segmentation', (data_key, role_key), segment_creators, creator_stats)
+
+        chart_data = stage_cache.run('chart data', (data_key, role_key), build_chart_data, df, roles, creator_stats)
 
         # Debug Info
         with st.expander("🛠️ Debug Information & Column Detection"):
-            st.info(f"**Detected Mode:** {mode}")
+            st.info(f"**Detected Mode:** {mode} (change the columns under 🧭 Column Roles)")
             st.write(f"**Video ID:** `{video_id_col}` | **Creator:** `{creator_col}`")
             st.write(f"**GMV:** `{gmv_col}` | **Views:** `{view_col}`")
             st.write(f"**Likes:** `{likes_col}` (from 'Likes', 'Like')")
             st.write(f"**Orders:** `{orders_col}` (from 'Orders', 'Order')")
+            st.markdown("**Stage Cache** (a miss means the stage reran)")
+            st.dataframe(stage_cache.report(), use_container_width=True, hide_index=True)
 
         
         # Display metrics in organized grid
         st.markdown('#### 📈 Key Metrics')
-        md_c1, md_c2, md_c3, md_c4, md_c5 = st.columns(5)
+
+        # Tier boundaries: changing them only recounts the tiers, not the creator aggregation
+        with st.expander('⚙️ Tier Boundaries'):
+            st.caption('Lower bound of each tier, separated by commas. Each tier runs up to the next bound; the last is open-ended.')
+            tb_c1, tb_c2 = st.columns(2)
+            tier_bounds = {}
+            for column, name, label, default, key in [
+                (tb_c1, 'videos', 'Videos per creator', VIDEO_TIER_BOUNDS, 'video_tier_bounds'),
+                (tb_c2, 'gmv', 'GMV per creator ($)', GMV_TIER_BOUNDS, 'gmv_tier_bounds'),
+            ]:
+                with column:
+                    text = st.text_input(label, ', '.join(map(str, default)), key=key)
+                    try:
+                        tier_bounds[name] = parse_tier_bounds(text)
+                    except ValueError as e:
+                        st.error(f'{e}. Using the default tiers.')
+                        tier_bounds[name] = default
+        tiers = stage_cache.run(
+            'tier counts', (data_key, role_key, tuple(tier_bounds['videos']), tuple(tier_bounds['gmv'])),
+            count_creator_tiers, summary, tier_bounds['videos'], tier_bounds['gmv']
+        )
+
+        video_tiers = tiers['videos']
+        md_cols = st.columns(len(video_tiers) + 2)
         
-        with md_c1:
+        with md_cols[0]:
             st.metric('Total Videos', f'{total_videos:,}')
-        with md_c2:
-            st.metric('Creators (1-2 vids)', creators_1_2_vids)
-        with md_c3:
-            st.metric('Creators (3-9 vids)', creators_3_9_vids)
-        with md_c4:
-            st.metric('Creators (10+ vids)', creators_10plus_vids)
-        with md_c5:
+        for column, (label, count) in zip(md_cols[1:], video_tiers):
+            with column:
+                st.metric(f'Creators ({label} vids)', count)
+        with md_cols[-1]:
             if likes_col:
                 st.metric('Total Likes', f'{total_likes:,}')
             elif orders_col:
@@ -1162,15 +1565,12 @@ elif menu == "📊 Analytics & Processing":
 
         if gmv_col:
             st.markdown('#### 💰 GMV Segmentation')
-            gm_c1, gm_c2, gm_c3, gm_c4 = st.columns(4)
-            with gm_c1:
-                st.metric('$10K-$99K GMV', creators_10k_99k_gmv)
-            with gm_c2:
-                st.metric('$100K-$999K GMV', creators_100k_999k_gmv)
-            with gm_c3:
-                st.metric('$1M+ GMV', creators_1m_plus_gmv)
-            with gm_c4:
-                total_gmv = df['parsed_gmv'].sum() if 'parsed_gmv' in df.columns else 0
+            gmv_tiers = tiers['gmv']
+            gm_cols = st.columns(len(gmv_tiers) + 1)
+            for column, (label, count) in zip(gm_cols, gmv_tiers):
+                with column:
+                    st.metric(f'{label} GMV', count)
+            with gm_cols[-1]:
                 st.metric('Total GMV', f'${total_gmv:,.0f}')
 
         # --- COMMISSION CALCULATOR ---
@@ -1217,7 +1617,7 @@ elif menu == "📊 Analytics & Processing":
                         comm_report['commission'] = comm_report['parsed_gmv'] * commission_rate / 100
                         
                         if creator_col:
-                            comm_summary = comm_report.groupby(creator_col).agg({
+                            comm_summary = comm_report.groupby(creator_col, observed=True).agg({
                                 'parsed_gmv': 'sum',
                                 'commission': 'sum'
                             }).reset_index()
@@ -1251,58 +1651,16 @@ elif menu == "📊 Analytics & Processing":
         
         with v1:
             st.markdown('#### Top Creators')
-            if mode == "Granular (Video Level)":
-                 # Use the aggregated stats we calculated earlier
-                 # creator_stats has index=Creator Name, columns=['video_count', 'total_gmv', 'parsed_views', etc]
-                 top_creators = creator_stats.reset_index()
-                 
-                 # Decide metric to sort/color by
-                 y_metric = 'video_count'
-                 title_metric = 'Video Count'
-                 color = 'video_count'
-                 scale = 'Reds'
-                 
-                 if 'total_gmv' in top_creators.columns and top_creators['total_gmv'].sum() > 0:
-                     y_metric = 'total_gmv'
-                     title_metric = 'GMV'
-                     color = 'total_gmv'
-                     scale = 'Greens'
-                 
-                 top_df = top_creators.nlargest(10, y_metric)
-                 
-                 fig = px.bar(top_df, x=creator_col, y=y_metric, 
-                              title=f'Top 10 Creators by {title_metric}',
-                              color=color, color_continuous_scale=scale)
+            top_spec = chart_data['top_creators']
+            if top_spec:
+                 fig = px.bar(top_spec['data'], x=top_spec['x'], y=top_spec['y'],
+                              title=f"Top 10 Creators by {top_spec['title_metric']}",
+                              color=top_spec['y'], color_continuous_scale=top_spec['scale'])
                  fig.update_layout(xaxis_tickangle=-45)
                  st.plotly_chart(fig, use_container_width=True)
-                 
             elif mode == "Aggregated (Creator Level)" or (mode == "Simple (Row Count)" and creator_col):
-                 # We are working with the main DF
-                 # Try to find relevant columns
-                 y_metric = None
-                 title_metric = ''
-                 scale = 'Reds'
-                 
-                 if 'parsed_gmv' in df.columns and df['parsed_gmv'].sum() > 0:
-                     y_metric = 'parsed_gmv'
-                     title_metric = 'GMV'
-                     scale = 'Greens'
-                 elif 'parsed_videos' in df.columns:
-                     y_metric = 'parsed_videos'
-                     title_metric = 'Video Count'
-                     
-                 if y_metric:
-                     # Attempt to find name col
-                     name_col = get_col(['name', 'creator', 'user', 'handle', 'username'])
-                     if name_col:
-                         top_df = df.nlargest(10, y_metric)
-                         fig = px.bar(top_df, x=name_col, y=y_metric, 
-                                      title=f'Top 10 Creators by {title_metric}',
-                                      color=y_metric, color_continuous_scale=scale)
-                         fig.update_layout(xaxis_tickangle=-45)
-                         st.plotly_chart(fig, use_container_width=True)
-                     else:
-                         st.warning("Could not identify Creator Name column for chart.")
+                 if chart_data['top_creators_metric']:
+                     st.warning("Could not identify Creator Name column for chart.")
                  else:
                      st.info('Top Creators chart requires Videos or GMV column.')
             else:
@@ -1335,8 +1693,7 @@ elif menu == "📊 Analytics & Processing":
             # Engagement Rate (Likes/Views)
             if likes_col and view_col:
                 st.markdown('#### Engagement Rate (Likes/Views)')
-                df['engagement_rate'] = (df['parsed_likes'] / df['parsed_views'] * 100).fillna(0)
-                df['engagement_rate'] = df['engagement_rate'].replace([float('inf'), -float('inf')], 0)
+                df['engagement_rate'] = chart_data['engagement_rate']
                 
                 fig_eng = px.box(df, y='engagement_rate', 
                                 title='Engagement Rate Distribution',
@@ -1353,8 +1710,7 @@ elif menu == "📊 Analytics & Processing":
             # GMV per View (if available)
             if gmv_col and view_col:
                 st.markdown('#### Revenue Efficiency (GMV/View)')
-                df['gmv_per_view'] = (df['parsed_gmv'] / df['parsed_views']).fillna(0)
-                df['gmv_per_view'] = df['gmv_per_view'].replace([float('inf'), -float('inf')], 0)
+                df['gmv_per_view'] = chart_data['gmv_per_view']
                 
                 fig_rev = px.scatter(df, x='parsed_views', y='parsed_gmv',
                                     title='Views vs GMV',
@@ -1369,8 +1725,7 @@ elif menu == "📊 Analytics & Processing":
                 st.metric('Avg GMV per View', f'${avg_gmv_per_view:.4f}')
             elif gmv_col and orders_col:
                 st.markdown('#### Order Value Analysis')
-                df['gmv_per_order'] = (df['parsed_gmv'] / df['parsed_orders']).fillna(0)
-                df['gmv_per_order'] = df['gmv_per_order'].replace([float('inf'), -float('inf')], 0)
+                df['gmv_per_order'] = chart_data['gmv_per_order']
                 
                 fig_order = px.histogram(df, x='gmv_per_order', nbins=25,
                                         title='GMV per Order Distribution',
@@ -1466,7 +1821,7 @@ elif menu == "📊 Analytics & Processing":
                     
                     elif chart_type == 'Pie Chart' and x_col and y_col:
                         # Aggregate data for pie chart
-                        pie_data = df.groupby(x_col)[y_col].sum().reset_index()
+                        pie_data = df.groupby(x_col, observed=True)[y_col].sum().reset_index()
                         fig_custom = px.pie(pie_data, names=x_col, values=y_col,
                                            title=f'{y_col} by {x_col}')
                     
@@ -1523,26 +1878,8 @@ elif menu == "📊 Analytics & Processing":
             st.markdown('---')
             st.markdown('### 🎯 Creator Performance Segmentation')
             
-            # Create segments based on GMV and engagement
-            creator_perf = creator_stats.reset_index()
-            
-            if 'total_gmv' in creator_perf.columns and 'parsed_views' in creator_perf.columns:
-                # Calculate percentiles for segmentation
-                gmv_median = creator_perf['total_gmv'].median()
-                views_median = creator_perf['parsed_views'].median()
-                
-                def segment_creator(row):
-                    if row['total_gmv'] >= gmv_median and row['parsed_views'] >= views_median:
-                        return 'Star Performers'
-                    elif row['total_gmv'] >= gmv_median:
-                        return 'High Revenue'
-                    elif row['parsed_views'] >= views_median:
-                        return 'High Reach'
-                    else:
-                        return 'Emerging'
-                
-                creator_perf['segment'] = creator_perf.apply(segment_creator, axis=1)
-                
+            # Segments based on GMV and views (computed in the segmentation stage)
+            if creator_perf is not None:
                 seg_c1, seg_c2 = st.columns(2)
                 
                 with seg_c1:
@@ -1605,10 +1942,10 @@ elif menu == "📊 Analytics & Processing":
             if export_template == 'Top Performers (Top 50)':
                 # Sort by GMV or views
                 if gmv_col and 'parsed_gmv' in export_df.columns:
-                    export_df['_sort_col'] = export_df[gmv_col].apply(parse_metric_value)
+                    export_df['_sort_col'] = parsed_metric(export_df, gmv_col)
                     export_df = export_df.nlargest(50, '_sort_col').drop(columns=['_sort_col'])
                 elif view_col and 'parsed_views' in export_df.columns:
-                    export_df['_sort_col'] = export_df[view_col].apply(parse_metric_value)
+                    export_df['_sort_col'] = parsed_metric(export_df, view_col)
                     export_df = export_df.nlargest(50, '_sort_col').drop(columns=['_sort_col'])
                 else:
                     export_df = export_df.head(50)
@@ -1616,7 +1953,7 @@ elif menu == "📊 Analytics & Processing":
             
             elif export_template == 'High GMV Creators':
                 if gmv_col:
-                    export_df['_temp_gmv'] = export_df[gmv_col].apply(parse_metric_value)
+                    export_df['_temp_gmv'] = parsed_metric(export_df, gmv_col)
                     export_df = export_df[export_df['_temp_gmv'] >= 10000].drop(columns=['_temp_gmv'])
                     st.info(f'Exporting {len(export_df)} creators with GMV ≥ $10K')
                 else:
@@ -1624,8 +1961,8 @@ elif menu == "📊 Analytics & Processing":
             
             elif export_template == 'High Engagement':
                 if likes_col and view_col:
-                    export_df['_temp_likes'] = export_df[likes_col].apply(parse_metric_value)
-                    export_df['_temp_views'] = export_df[view_col].apply(parse_metric_value)
+                    export_df['_temp_likes'] = parsed_metric(export_df, likes_col)
+                    export_df['_temp_views'] = parsed_metric(export_df, view_col)
                     export_df['_eng_rate'] = (export_df['_temp_likes'] / export_df['_temp_views'] * 100).fillna(0)
                     export_df = export_df[export_df['_eng_rate'] >= 5].drop(columns=['_temp_likes', '_temp_views', '_eng_rate'])
                     st.info(f'Exporting {len(export_df)} videos with engagement ≥ 5%')
@@ -0,0 +1,360 @@
+import hashlib
+import io
+import json
+import os
+import struct
+import time
+import zlib
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# ==============================================================================
+# BATCH EXPORT
+# ==============================================================================
+# The Batch Splitter offers every part as its own CSV download and all of them
+# together as a ZIP. Each part is serialized once and the same bytes are used
+# for both. The whole frame goes through a single to_csv call, and parts are
+# cut out of that text at row boundaries, so a part is byte-for-byte what
+# batch_df.to_csv(index=False) would give.
+
+
+def batch_file_name(batch_num):
+    """File name for a 1-based batch number."""
+    return f"outreach_part_{batch_num}.csv"
+
+
+def count_batches(n_rows, batch_size):
+    return (n_rows + batch_size - 1) // batch_size
+
+
+def serialize_batches(df, batch_size, first_batch=1):
+    """
+    Split df into CSV parts of batch_size rows, numbered from first_batch.
+    Returns:
+        List of (file name, row count, CSV bytes), one per part
+    """
+    header = df.head(0).to_csv(index=False).encode('utf-8')
+    body = df.to_csv(index=False, header=False).encode('utf-8')
+
+    # Every row ends with exactly one newline unless a quoted cell contains a line break
+    ends = np.flatnonzero(np.frombuffer(body, dtype=np.uint8) == ord('\n')) + 1
+    if len(ends) != len(df):
+        return [
+            (batch_file_name(first_batch + num - 1), len(part), part.to_csv(index=False).encode('utf-8'))
+            for num, part in _iter_frame_batches(df, batch_size)
+        ]
+
+    parts = []
+    offsets = np.concatenate(([0], ends))
+    for start in range(0, len(df), batch_size):
+        stop = min(start + batch_size, len(df))
+        data = header + body[offsets[start]:offsets[stop]]
+        parts.append((batch_file_name(first_batch + start // batch_size), stop - start, data))
+    return parts
+
+
+def _iter_frame_batches(df, batch_size):
+    for start in range(0, len(df), batch_size):
+        yield start // batch_size + 1, df.iloc[start:start + batch_size]
+
+
+class BatchExport:
+    """
+    Serialized parts of one dataset at one batch size.
+    Kept in session state so the download buttons survive reruns; matches()
+    tells whether it still belongs to the active dataset.
+    """
+
+    def __init__(self, df, batch_size, source=None, options=None):
+        self.df = df
+        # The dataset df was filtered from (if it was), and the settings that filtered it
+        self.source = df if source is None else source
+        self.options = options
+        self.batch_size = batch_size
+        self.parts = serialize_batches(df, batch_size)
+
+    def matches(self, source, batch_size, options=None):
+        return self.source is source and self.batch_size == batch_size and self.options == options
+
+    def zip_bytes(self, compression='deflate', workers=None):
+        return build_zip([(name, data) for name, _, data in self.parts], compression, workers)
+
+
+# ==============================================================================
+# ZIP WRITER
+# ==============================================================================
+# zipfile compresses members one after another on a single core. Here the
+# members are deflated in a thread pool (zlib releases the GIL) while the
+# archive is written to the output stream in member order.
+
+ZIP_COMPRESSION = {'deflate': zipfile.ZIP_DEFLATED, 'store': zipfile.ZIP_STORED}
+
+# Limits of the plain (non-ZIP64) format
+_ZIP_MAX_ENTRIES = 0xFFFF
+_ZIP_MAX_SIZE = 0xFFFFFFFF
+
+
+def _deflate(data, level=6):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _dos_timestamp(timestamp=None):
+    t = time.localtime(timestamp)
+    dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+    dos_date = ((max(t.tm_year, 1980) - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    return dos_time, dos_date
+
+
+def write_zip(out, members, compression='deflate', workers=None):
+    """
+    Write (name, bytes) members to the binary stream out as a ZIP archive.
+    compression is 'deflate' or 'store'; workers defaults to the CPU count.
+    """
+    method = ZIP_COMPRESSION[compression]
+    members = list(members)
+    total = sum(len(data) for _, data in members)
+    if len(members) > _ZIP_MAX_ENTRIES or total > _ZIP_MAX_SIZE:
+        # Needs ZIP64 records - let zipfile handle it, one member at a time
+        with zipfile.ZipFile(out, 'w', method) as zf:
+            for name, data in members:
+                zf.writestr(name, data)
+        return
+
+    def pack(data):
+        payload = _deflate(data) if method == zipfile.ZIP_DEFLATED else data
+        return zlib.crc32(data), payload
+
+    dos_time, dos_date = _dos_timestamp()
+    flags = 0x0800  # names are UTF-8
+    offset = 0
+    central = []
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+        # map() yields in member order, so each member is written as soon as it's ready
+        packed = pool.map(pack, (data for _, data in members))
+        for (name, data), (crc, payload) in zip(members, packed):
+            encoded_name = name.encode('utf-8')
+            local_header = struct.pack(
+                '<IHHHHHIIIHH', 0x04034B50, 20, flags, method, dos_time, dos_date,
+                crc, len(payload), len(data), len(encoded_name), 0
+            )
+            out.write(local_header)
+            out.write(encoded_name)
+            out.write(payload)
+            central.append(struct.pack(
+                '<IHHHHHHIIIHHHHHII', 0x02014B50, 20, 20, flags, method, dos_time, dos_date,
+                crc, len(payload), len(data), len(encoded_name), 0, 0, 0, 0, 0, offset
+            ) + encoded_name)
+            offset += len(local_header) + len(encoded_name) + len(payload)
+
+    directory = b''.join(central)
+    out.write(directory)
+    out.write(struct.pack('<IHHHHIIH', 0x06054B50, 0, 0, len(members), len(members), len(directory), offset, 0))
+
+
+def build_zip(members, compression='deflate', workers=None):
+    """ZIP archive of (name, bytes) members, as bytes."""
+    buffer = io.BytesIO()
+    write_zip(buffer, members, compression, workers)
+    return buffer.getvalue()
+
+
+# ==============================================================================
+# STREAMING SPLIT
+# ==============================================================================
+# Splits a CSV on disk without loading it. The source is read twice in chunks:
+# the first pass works out the type pandas would give each column if it read
+# the whole file, and the second casts every chunk to those types and writes
+# its parts. That keeps the parts byte-identical to loading the file with
+# pd.read_csv and splitting it in memory. A manifest next to the parts records
+# row counts and checksums, so an interrupted split picks up where it stopped.
+
+MANIFEST_NAME = 'manifest.json'
+STREAM_CHUNK_ROWS = 50000
+
+
+def _chunk_kind(col):
+    """What pandas made of one column in one chunk."""
+    if col.isna().all():
+        return 'empty'
+    kind = col.dtype.kind
+    if kind in 'biuf':
+        return {'b': 'bool', 'i': 'int', 'u': 'uint', 'f': 'float'}[kind]
+    if pd.api.types.infer_dtype(col, skipna=True) == 'boolean':
+        return 'boolna'  # booleans with missing values
+    return 'text'
+
+
+def _merge_kinds(kinds):
+    """
+    The type pandas settles on for a column across the whole file, given the per-chunk kinds.
+    Returns 'as read' (chunks already agree), 'float', 'object' or 'text'.
+    """
+    kinds = set(kinds)
+    has_missing = bool(kinds & {'empty', 'float', 'boolna'})
+    kinds.discard('empty')
+    if not kinds:
+        return 'as read'
+    if kinds <= {'int', 'uint', 'float'} and kinds != {'int', 'uint'}:
+        return 'float' if has_missing else 'as read'
+    if kinds <= {'bool', 'boolna'}:
+        return 'object' if has_missing else 'as read'
+    # Mixed values - pandas keeps the original text
+    return 'text'
+
+
+def _open_source(source):
+    if isinstance(source, (str, os.PathLike)):
+        return open(source, 'rb')
+    source.seek(0)
+    return source
+
+
+def _read_chunks(source, chunk_rows, dtype=None):
+    handle = _open_source(source)
+    try:
+        yield from pd.read_csv(handle, chunksize=chunk_rows, dtype=dtype)
+    finally:
+        if handle is not source:
+            handle.close()
+
+
+def source_fingerprint(source, block_size=16 * 1024 * 1024):
+    """(size in bytes, blake2b hex digest) of a CSV path or binary file."""
+    digest = hashlib.blake2b(digest_size=20)
+    size = 0
+    handle = _open_source(source)
+    try:
+        while block := handle.read(block_size):
+            digest.update(block)
+            size += len(block)
+    finally:
+        if handle is not source:
+            handle.close()
+        else:
+            source.seek(0)
+    return size, digest.hexdigest()
+
+
+def scan_csv_types(source, chunk_rows=STREAM_CHUNK_ROWS):
+    """
+    One streaming pass over a CSV.
+    Returns:
+        (row count, {column: merged type}) - see _merge_kinds
+    """
+    rows = 0
+    kinds = {}
+    for chunk in _read_chunks(source, chunk_rows):
+        rows += len(chunk)
+        for col in chunk.columns:
+            kinds.setdefault(col, set()).add(_chunk_kind(chunk[col]))
+    return rows, {col: _merge_kinds(col_kinds) for col, col_kinds in kinds.items()}
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while block := f.read(1024 * 1024):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _write_atomic(path, data):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _save_manifest(out_dir, manifest):
+    _write_atomic(os.path.join(out_dir, MANIFEST_NAME), json.dumps(manifest, indent=1).encode('utf-8'))
+
+
+def load_manifest(out_dir):
+    """The split manifest in out_dir, or None."""
+    try:
+        with open(os.path.join(out_dir, MANIFEST_NAME), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _verified_parts(out_dir, parts):
+    """The leading parts of a manifest whose files are still on disk unchanged."""
+    verified = []
+    for part in parts:
+        path = os.path.join(out_dir, part['file'])
+        if not os.path.exists(path) or _file_sha256(path) != part['sha256']:
+            break
+        verified.append(part)
+    return verified
+
+
+def stream_split_csv(source, out_dir, batch_size, resume=True, chunk_rows=STREAM_CHUNK_ROWS, progress=None):
+    """
+    Split a CSV (path or binary file) into outreach_part_N.csv files in out_dir
+    without loading it. Memory stays around one chunk of rows (a multiple of
+    batch_size). With resume=True, parts already recorded in out_dir's manifest
+    for the same source and batch size are kept and the split continues after them.
+    progress, if given, is called with the fraction of rows written.
+    Returns:
+        The manifest dict (also saved as out_dir/manifest.json)
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    size, digest = source_fingerprint(source)
+
+    manifest = load_manifest(out_dir) if resume else None
+    if (manifest is None or manifest.get('source_blake2b') != digest
+            or manifest.get('batch_size') != batch_size):
+        total_rows, types = scan_csv_types(source, chunk_rows)
+        manifest = {
+            'source': getattr(source, 'name', str(source)),
+            'source_size': size,
+            'source_blake2b': digest,
+            'batch_size': batch_size,
+            'total_rows': total_rows,
+            'column_types': types,
+            'parts': [],
+            'complete': False,
+        }
+    else:
+        manifest['parts'] = _verified_parts(out_dir, manifest['parts'])
+        manifest['complete'] = sum(p['rows'] for p in manifest['parts']) == manifest['total_rows']
+    _save_manifest(out_dir, manifest)
+    if manifest['complete']:
+        if progress:
+            progress(1.0)
+        return manifest
+
+    types = manifest['column_types']
+    text_columns = {col: str for col, kind in types.items() if kind == 'text'}
+    done_rows = sum(p['rows'] for p in manifest['parts'])
+    chunk_rows = batch_size * max(1, chunk_rows // batch_size)
+
+    row = 0
+    for chunk in _read_chunks(source, chunk_rows, dtype=text_columns or None):
+        start, row = row, row + len(chunk)
+        if row <= done_rows:
+            continue
+        chunk = chunk.iloc[max(done_rows - start, 0):]
+        for col, kind in types.items():
+            if kind == 'float':
+                chunk[col] = chunk[col].astype('float64')
+            elif kind == 'object':
+                chunk[col] = chunk[col].astype(object)
+
+        first_batch = len(manifest['parts']) + 1
+        for name, rows, data in serialize_batches(chunk, batch_size, first_batch):
+            _write_atomic(os.path.join(out_dir, name), data)
+            manifest['parts'].append({'file': name, 'rows': rows, 'sha256': hashlib.sha256(data).hexdigest()})
+        done_rows = row
+        _save_manifest(out_dir, manifest)
+        if progress:
+            progress(done_rows / max(manifest['total_rows'], 1))
+
+    manifest['complete'] = True
+    _save_manifest(out_dir, manifest)
+    return manifest
@@ -0,0 +1,411 @@
+import argparse
+import datetime
+import io
+import json
+import os
+import platform
+import subprocess
+import time
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+from analytics import aggregate_creators, build_chart_data, detect_columns, prepare_metrics, segment_creators
+from batches import BatchExport
+from extraction import extract_usernames_from_text, extract_usernames_parallel, extract_usernames_reference
+from ingest import (HEADER_SCAN_ROWS, available_excel_engines, detect_header_row, frame_from_rows, read_csv_chunked,
+                    read_excel_rows)
+from merging import join_frames
+from metrics import parse_metric_value, parse_metric_series
+
+# ==============================================================================
+# BENCHMARKS
+# ==============================================================================
+# Run with: python benchmark.py
+#
+# That compares old and new implementations of each optimized path. The suite
+# times every page's hot path on generated exports of several sizes and saves
+# the timings as JSON, so two commits can be compared:
+#
+#   python benchmark.py suite --sizes 10k,100k,1m
+#   python benchmark.py compare benchmark_results/<before>.json benchmark_results/<after>.json
+
+
+def make_metric_column(rows, seed=0):
+    """Build a GMV-style column mixing '$1,262.34', '$40.4K', '1.2M', '4.6%' and blanks."""
+    rng = np.random.default_rng(seed)
+    amounts = rng.gamma(1.0, 20000.0, rows)
+    formatted = np.where(
+        amounts < 1000,
+        pd.Series(amounts).map(lambda v: f"${v:,.2f}"),
+        pd.Series(amounts).map(lambda v: f"${v / 1000:.1f}K" if v < 1000000 else f"{v / 1000000:.1f}M"),
+    )
+    column = pd.Series(formatted, dtype=object)
+    column[rng.random(rows) < 0.02] = None
+    column[rng.random(rows) < 0.01] = '4.6%'
+    return column
+
+
+def make_creator_cards(cards, seed=0):
+    """Build a pasted TikTok Shop creator listing with the given number of cards."""
+    rng = np.random.default_rng(seed)
+    categories = ['Health', 'Beauty & Personal Care', 'Womenswear & Underwear', 'Sports & Outdoor']
+    text = []
+    for i in range(cards):
+        handle = f"creator{rng.integers(0, cards * 2)}_{i % 97}"
+        text.append(
+            f"{handle}\n{handle.title()} 💜\nPPS: {rng.uniform(2, 5):.1f}/5.0\n{categories[i % 4]}\n, +{i % 3 + 1}\n"
+            f"{rng.integers(1, 999)}.{rng.integers(0, 9)}K, {'Female' if i % 2 else 'Male'} {rng.integers(40, 90)}%, 35-44\n"
+            f"Previously invited\n{'Fast growing' if i % 3 == 0 else ''}\n\n"
+            f"${rng.integers(1, 99)}.{rng.integers(0, 9)}K\n{rng.integers(1, 999)}\n"
+            f"{rng.integers(1, 99)}.{rng.integers(0, 9)}K\n{rng.uniform(0, 9):.1f}%\n\n\n"
+        )
+    return ''.join(text)
+
+
+def time_call(func, *args, repeat=3):
+    """Best wall-clock time of func(*args) over a few runs, in seconds."""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def bench_parse_metrics(rows=500000):
+    """Compare the row-by-row metric parser against the column parser."""
+    column = make_metric_column(rows)
+    scalar_time, expected = time_call(lambda c: c.apply(parse_metric_value), column, repeat=1)
+    vector_time, parsed = time_call(parse_metric_series, column)
+
+    identical = np.array_equal(expected.to_numpy(dtype='float64'), parsed.to_numpy(), equal_nan=True)
+    print(f"parse_metric_value  .apply(): {scalar_time:8.3f}s  ({rows:,} rows)")
+    print(f"parse_metric_series         : {vector_time:8.3f}s  ({scalar_time / vector_time:.1f}x faster)")
+    print(f"Identical results           : {identical}")
+
+
+def bench_csv_ingest(rows=500000):
+    """Compare pd.read_csv against the chunked Arrow reader on an in-memory CSV export."""
+    rng = np.random.default_rng(1)
+    export = pd.DataFrame({
+        'Creator name': rng.choice([f'creator_{i}' for i in range(5000)], rows),
+        'Video ID': 7000000000000000000 + np.arange(rows),
+        # Past the int64 range: must keep every digit, as uint64
+        'Order ID': np.uint64(10000000000000000000) + np.arange(rows, dtype='uint64'),
+        'Gross merchandise value (Video) ($)': make_metric_column(rows),
+        'Likes': rng.integers(0, 50000, rows),
+        'Orders': rng.integers(0, 100, rows),
+    })
+    data = export.to_csv(index=False).encode()
+
+    pandas_time, expected = time_call(lambda raw: pd.read_csv(io.BytesIO(raw)), data, repeat=1)
+    chunked_time, loaded = time_call(lambda raw: read_csv_chunked(io.BytesIO(raw)), data, repeat=1)
+
+    same = expected.astype(str).equals(loaded.astype(str))
+    print(f"pd.read_csv        : {pandas_time:8.3f}s  {expected.memory_usage(deep=True).sum() / 1e6:8.1f} MB  ({len(data) / 1e6:.0f} MB CSV)")
+    print(f"read_csv_chunked   : {chunked_time:8.3f}s  {loaded.memory_usage(deep=True).sum() / 1e6:8.1f} MB")
+    print(f"Same values        : {same}")
+
+
+def bench_batch_export(rows=1000000, batch_size=100):
+    """Compare per-part to_csv + zipfile against the single-serialization batch export."""
+    rng = np.random.default_rng(2)
+    export = pd.DataFrame({
+        'Creator name': rng.choice([f'creator_{i}' for i in range(5000)], rows),
+        'Video ID': 7000000000000000000 + np.arange(rows),
+        # Past the int64 range: must keep every digit, as uint64
+        'Order ID': np.uint64(10000000000000000000) + np.arange(rows, dtype='uint64'),
+        'Gross merchandise value (Video) ($)': make_metric_column(rows),
+        'Likes': rng.integers(0, 50000, rows),
+    })
+
+    def per_part(df):
+        # What the Batch Splitter used to do: one to_csv per button, another per ZIP member
+        parts = [df.iloc[i:i + batch_size] for i in range(0, len(df), batch_size)]
+        for part in parts:
+            part.to_csv(index=False)
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
+            for i, part in enumerate(parts, start=1):
+                zf.writestr(f"outreach_part_{i}.csv", part.to_csv(index=False))
+        return buffer.getvalue()
+
+    def single_pass(df):
+        batch_export = BatchExport(df, batch_size)
+        return batch_export, batch_export.zip_bytes('deflate')
+
+    old_time, old_zip = time_call(per_part, export, repeat=1)
+    new_time, (batch_export, new_zip) = time_call(single_pass, export, repeat=1)
+    store_time, _ = time_call(batch_export.zip_bytes, 'store', repeat=1)
+
+    with zipfile.ZipFile(io.BytesIO(old_zip)) as old, zipfile.ZipFile(io.BytesIO(new_zip)) as new:
+        same = all(old.read(name) == new.read(name) for name in old.namelist()) and old.namelist() == new.namelist()
+    parts = len(batch_export.parts)
+    print(f"per-part to_csv x2 + zipfile : {old_time:8.3f}s  ({rows:,} rows, {parts:,} parts)")
+    print(f"BatchExport + parallel ZIP   : {new_time:8.3f}s  ({old_time / new_time:.1f}x faster)")
+    print(f"ZIP 'store' from cached parts: {store_time:8.3f}s")
+    print(f"Identical parts              : {same}")
+
+
+def bench_username_extraction(cards=150000):
+    """Compare the original username extractor against the single-scan one, in MB/s of pasted text."""
+    listing = make_creator_cards(cards)
+    # Same cards without PPS lines, so both take the regex fallback
+    no_pps = listing.replace('PPS:', 'Score')
+    megabytes = len(listing.encode()) / 1e6
+
+    for label, text in [('PPS anchor', listing), ('regex fallback', no_pps)]:
+        old_time, expected = time_call(extract_usernames_reference, text)
+        new_time, result = time_call(extract_usernames_from_text, text)
+        print(f"{label:15s} original: {old_time:8.3f}s  {megabytes / old_time:6.1f} MB/s  ({megabytes:.1f} MB, {cards:,} cards)")
+        print(f"{label:15s} scanner : {new_time:8.3f}s  {megabytes / new_time:6.1f} MB/s  ({old_time / new_time:.1f}x faster)")
+        print(f"{label:15s} same results and logs: {result == expected}")
+        workers = os.cpu_count() or 1
+        parallel_time, parallel = time_call(extract_usernames_parallel, text, repeat=1)
+        print(f"{label:15s} parallel: {parallel_time:8.3f}s  {megabytes / parallel_time:6.1f} MB/s  ({workers} workers, same: {parallel == expected})")
+
+
+# ==============================================================================
+# SYNTHETIC EXPORTS
+# ==============================================================================
+# Exports repeat the same formatted values a lot, so metric columns are drawn
+# from a pool of distinct strings. That keeps generating 10M rows fast.
+
+METRIC_POOL_SIZE = 20000
+
+
+def _format_metric(value, prefix=''):
+    """A number the way TikTok Shop exports show it: '$1,262.34', '$40.4K', '1.2M', '109'."""
+    if value < 1000:
+        return f"{prefix}{value:,.2f}" if prefix else f"{int(value)}"
+    if value < 1000000:
+        return f"{prefix}{value / 1000:.1f}K"
+    return f"{prefix}{value / 1000000:.1f}M"
+
+
+def make_metric_strings(rows, mean, prefix='', seed=0):
+    """rows formatted metrics with a long-tailed (gamma) spread around mean."""
+    rng = np.random.default_rng(seed)
+    pool = np.array([_format_metric(v, prefix) for v in rng.gamma(1.0, mean, METRIC_POOL_SIZE)], dtype=object)
+    return pool[rng.integers(0, len(pool), rows)]
+
+
+def make_video_export(rows, seed=0):
+    """Video-level export: one row per video, a few creators posting most of them."""
+    rng = np.random.default_rng(seed)
+    creators = max(1, rows // 8)
+    creator = (rng.pareto(1.2, rows) * creators / 20).astype('int64') % creators
+    names = np.array([f"creator_{i}" for i in range(creators)], dtype=object)
+    return pd.DataFrame({
+        'Creator name': names[creator],
+        'Creator ID': 6800000000000000000 + creator,
+        'Video ID': 7000000000000000000 + np.arange(rows),
+        # Past the int64 range: must keep every digit, as uint64
+        'Order ID': np.uint64(10000000000000000000) + np.arange(rows, dtype='uint64'),
+        'Gross merchandise value (Video) ($)': make_metric_strings(rows, 2000.0, '$', seed),
+        'VV': make_metric_strings(rows, 20000.0, seed=seed + 1),
+        'Likes': make_metric_strings(rows, 1500.0, seed=seed + 2),
+        'Orders': rng.integers(0, 100, rows),
+    })
+
+
+def make_creator_export(rows, seed=0):
+    """Creator-level export: one row per creator with totals."""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'Creator name': [f"creator_{i}" for i in range(rows)],
+        'Creator ID': 6800000000000000000 + np.arange(rows),
+        'Video count': rng.geometric(0.2, rows),
+        'Gross merchandise value (Video) ($)': make_metric_strings(rows, 30000.0, '$', seed),
+        'VV': make_metric_strings(rows, 200000.0, seed=seed + 1),
+        'Likes': make_metric_strings(rows, 15000.0, seed=seed + 2),
+        'Orders': rng.integers(0, 1000, rows),
+    })
+
+
+def make_excel_export(df, title_rows=3):
+    """xlsx bytes of df with a report title and blank rows above the header, like the Excel exports."""
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+        df.to_excel(writer, index=False, startrow=title_rows)
+        writer.sheets['Sheet1'].cell(row=1, column=1, value='Video performance report')
+    return buffer.getvalue()
+
+
+# ==============================================================================
+# BENCHMARK SUITE
+# ==============================================================================
+# Paths that are slow by nature (the row-by-row parser, openpyxl, pasted text)
+# run on a capped share of each size; every result records the rows and MB it
+# actually timed.
+
+SUITE_SIZES = '10k,100k,1m'
+SUITE_SCALAR_MAX_ROWS = 200000
+SUITE_EXCEL_MAX_ROWS = 20000
+SUITE_MAX_CARDS = 200000
+SUITE_RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_results')
+
+# A case this much slower than in the older results is flagged by compare
+REGRESSION_RATIO = 1.10
+
+
+def parse_size(text):
+    """'10k' -> 10000, '1m' -> 1000000, '500' -> 500."""
+    text = text.strip().lower()
+    multiplier = {'k': 1000, 'm': 1000000}.get(text[-1:], 1)
+    return int(float(text.rstrip('km')) * multiplier)
+
+
+def run_analytics(df):
+    """The Analytics page's stages, start to finish."""
+    roles = detect_columns(df.columns)
+    parsed = pd.concat([df, prepare_metrics(df, roles)], axis=1)
+    stats = aggregate_creators(parsed, roles)
+    segment_creators(stats['creator_stats'])
+    return build_chart_data(parsed, roles, stats['creator_stats'])
+
+
+def suite_cases(rows, seed=0):
+    """
+    Hot paths of every page at one export size.
+    Returns:
+        List of (case name, function, argument, rows timed, MB of input)
+    """
+    video = make_video_export(rows, seed)
+    creators = make_creator_export(max(1, rows // 8), seed)
+    video_csv = video.to_csv(index=False).encode()
+    csv_mb = len(video_csv) / 1e6
+
+    excel_rows = min(rows, SUITE_EXCEL_MAX_ROWS)
+    workbook = make_excel_export(video.head(excel_rows))
+
+    # Two files sharing the Video ID, in different orders, like the Merge tab gets them
+    left = video[['Video ID', 'Creator name', 'VV']]
+    right = video[['Video ID', 'Gross merchandise value (Video) ($)', 'Likes', 'Orders']].iloc[::-1]
+
+    cards = min(rows, SUITE_MAX_CARDS)
+    listing = make_creator_cards(cards, seed)
+    gmv = video['Gross merchandise value (Video) ($)']
+    scalar_gmv = gmv.head(SUITE_SCALAR_MAX_ROWS)
+
+    def load_excel(data, engine):
+        rows = read_excel_rows(io.BytesIO(data), engine)
+        return frame_from_rows(rows, detect_header_row(pd.DataFrame(rows[:HEADER_SCAN_ROWS])))
+
+    excel_rows_read = read_excel_rows(io.BytesIO(workbook))
+    excel_cases = [
+        (f'excel_load_{engine}', lambda data, engine=engine: load_excel(data, engine), workbook, excel_rows,
+         len(workbook) / 1e6)
+        for engine in available_excel_engines()
+    ]
+
+    return [
+        ('upload_csv_pandas', lambda data: pd.read_csv(io.BytesIO(data)), video_csv, rows, csv_mb),
+        ('upload_csv_chunked', lambda data: read_csv_chunked(io.BytesIO(data)), video_csv, rows, csv_mb),
+        *excel_cases,
+        ('header_detection', lambda rows: detect_header_row(pd.DataFrame(rows[:HEADER_SCAN_ROWS])),
+         excel_rows_read, HEADER_SCAN_ROWS, None),
+        ('merge_join', lambda frames: join_frames(frames, 'Video ID'), [left, right], 2 * rows, None),
+        ('split_zip', lambda df: BatchExport(df, 100).zip_bytes('deflate'), video, rows, None),
+        ('extract_usernames', extract_usernames_from_text, listing, cards, len(listing.encode()) / 1e6),
+        ('parse_metric_value', lambda col: col.apply(parse_metric_value), scalar_gmv, len(scalar_gmv), None),
+        ('parse_metric_series', parse_metric_series, gmv, rows, None),
+        ('analytics_video_level', run_analytics, video, rows, None),
+        ('analytics_creator_level', run_analytics, creators, len(creators), None),
+    ]
+
+
+def run_suite(sizes, repeat=1, seed=0):
+    """Time every suite case at every size. Returns a list of result dicts."""
+    results = []
+    for size in sizes:
+        for name, func, argument, rows, megabytes in suite_cases(size, seed):
+            seconds, _ = time_call(func, argument, repeat=repeat)
+            result = {'size': size, 'case': name, 'rows': rows, 'seconds': round(seconds, 6)}
+            if megabytes:
+                result['mb'] = round(megabytes, 3)
+                result['mb_per_s'] = round(megabytes / seconds, 3)
+            print(f"{size:>10,}  {name:24s} {seconds:9.3f}s  ({rows:,} rows"
+                  + (f", {megabytes / seconds:.1f} MB/s)" if megabytes else ")"))
+            results.append(result)
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_results(results, path=None):
+    """Write suite results with the commit and environment they came from. Returns the path."""
+    commit = _git_commit()
+    created = datetime.datetime.now()
+    if path is None:
+        path = os.path.join(SUITE_RESULTS_DIR, f"{created:%Y%m%d-%H%M%S}-{commit or 'nogit'}.json")
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    report = {
+        'commit': commit,
+        'created': created.isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'cpu_count': os.cpu_count(),
+        'results': results,
+    }
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    return path
+
+
+def compare_results(old_path, new_path, threshold=REGRESSION_RATIO):
+    """Print each case's time in two saved runs and flag the ones that got slower."""
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    old_times = {(r['size'], r['case']): r['seconds'] for r in old['results']}
+
+    print(f"{old['commit']} -> {new['commit']}")
+    regressions = 0
+    for r in new['results']:
+        before = old_times.get((r['size'], r['case']))
+        if before is None:
+            continue
+        ratio = r['seconds'] / before if before else float('inf')
+        flag = 'SLOWER' if ratio > threshold else ''
+        regressions += bool(flag)
+        print(f"{r['size']:>10,}  {r['case']:24s} {before:9.3f}s -> {r['seconds']:9.3f}s  {ratio:5.2f}x  {flag}")
+    print(f"{regressions} case(s) more than {threshold:.2f}x slower")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the app's hot paths on generated data.")
+    commands = parser.add_subparsers(dest='command')
+    suite_parser = commands.add_parser('suite', help="time every page's hot path and save the results as JSON")
+    suite_parser.add_argument('--sizes', default=SUITE_SIZES, help="comma-separated row counts, e.g. 10k,100k,1m,10m")
+    suite_parser.add_argument('--repeat', type=int, default=3, help="runs per case (the best is kept)")
+    suite_parser.add_argument('--output', help=f"JSON file to write (default: {SUITE_RESULTS_DIR}/<time>-<commit>.json)")
+    compare_parser = commands.add_parser('compare', help="compare two saved suite runs")
+    compare_parser.add_argument('old')
+    compare_parser.add_argument('new')
+    args = parser.parse_args()
+
+    if args.command == 'suite':
+        suite_results = run_suite([parse_size(size) for size in args.sizes.split(',')], repeat=args.repeat)
+        print(f"Saved {save_results(suite_results, args.output)}")
+    elif args.command == 'compare':
+        compare_results(args.old, args.new)
+    else:
+        bench_parse_metrics()
+        bench_csv_ingest()
+        bench_batch_export()
+        bench_username_extraction()
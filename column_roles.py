@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+
+from analytics import analysis_mode, detect_columns
+
+# ==============================================================================
+# COLUMN ROLE REGISTRY
+# ==============================================================================
+# Pages used to find their columns by name on their own: the dashboard ran
+# detect_columns, the Advanced Filters looked for 'gmv' / 'video id' /
+# 'creator' in the names again, and the username pickers had a third rule. An
+# export whose columns the rules misread had to be fixed on every page.
+#
+# RoleRegistry infers the roles of a layout (an export's column names, in
+# order) once, and every page reads them from it. Roles the user assigns by
+# hand are saved to a small JSON file, keyed by the layout. Next week's export
+# with the same columns gets them back.
+
+COLUMN_ROLES_FILE = os.environ.get(
+    'COLUMN_ROLES_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'column_roles.json')
+)
+
+# Bump when the file layout changes, so old files are ignored instead of misread
+COLUMN_ROLES_VERSION = 1
+
+# Roles a column can be assigned, with their labels in the role picker
+ROLE_LABELS = {
+    'creator': 'Creator',
+    'name': 'Name / handle',
+    'video_id': 'Video ID',
+    'video_count': 'Video count',
+    'views': 'Views',
+    'gmv': 'GMV',
+    'likes': 'Likes',
+    'comments': 'Comments',
+    'shares': 'Shares',
+    'orders': 'Orders',
+}
+
+
+def layout_key(columns):
+    """Short stable key of an export layout: its column names, in order."""
+    names = '\x1f'.join(str(c) for c in columns)
+    return hashlib.blake2b(names.encode(), digest_size=8).hexdigest()
+
+
+def restrict_roles(roles, columns):
+    """roles with every column not in columns unassigned, and the mode those leave."""
+    present = set(columns)
+    restricted = {role: (col if col in present else None) for role, col in roles.items() if role != 'mode'}
+    restricted['mode'] = analysis_mode(restricted)
+    return restricted
+
+
+class RoleRegistry:
+    """
+    Column roles per export layout: inferred once per layout, with the user's
+    overrides saved to a JSON file (reread when another session changes it).
+    """
+
+    def __init__(self, path=COLUMN_ROLES_FILE):
+        self.path = path
+        self.inferred = {}
+        self._saved = {}
+        self._saved_mtime = None
+
+    # --- Saved overrides ----------------------------------------------------
+
+    def _layouts(self):
+        """Saved overrides by layout key, reloaded only when the file changed."""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime != self._saved_mtime:
+            self._saved = {}
+            if mtime is not None:
+                try:
+                    with open(self.path, encoding='utf-8') as f:
+                        saved = json.load(f)
+                    if saved.get('version') == COLUMN_ROLES_VERSION:
+                        self._saved = saved['layouts']
+                except (OSError, KeyError, ValueError, AttributeError):
+                    pass
+            self._saved_mtime = mtime
+        return self._saved
+
+    def _save(self, layouts):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': COLUMN_ROLES_VERSION, 'layouts': layouts}, f, indent=1)
+        os.replace(tmp_path, self.path)
+        self._saved = layouts
+        self._saved_mtime = os.stat(self.path).st_mtime_ns
+
+    def overrides(self, columns):
+        """Roles assigned by hand for this layout: role -> column name (None: no column has it)."""
+        saved = self._layouts().get(layout_key(columns))
+        return dict(saved['roles']) if saved else {}
+
+    def set_role(self, columns, role, column):
+        """Assign role to column (None for no column) in this layout, and save it."""
+        if role not in ROLE_LABELS:
+            raise ValueError(f"Unknown role '{role}'")
+        if column is not None and column not in list(columns):
+            raise ValueError(f"Column '{column}' is not in this file")
+        key = layout_key(columns)
+        layouts = dict(self._layouts())
+        saved = layouts.get(key) or {'columns': [str(c) for c in columns], 'roles': {}}
+        roles = dict(saved['roles'])
+        if column == self.inferred_roles(columns)[role]:
+            # Back to what inference picks - nothing to remember
+            roles.pop(role, None)
+        else:
+            roles[role] = column
+        if roles:
+            layouts[key] = {'columns': saved['columns'], 'roles': roles}
+        else:
+            layouts.pop(key, None)
+        self._save(layouts)
+
+    def reset(self, columns):
+        """Forget this layout's overrides."""
+        layouts = dict(self._layouts())
+        if layouts.pop(layout_key(columns), None) is not None:
+            self._save(layouts)
+
+    # --- Roles --------------------------------------------------------------
+
+    def inferred_roles(self, columns):
+        """Roles detect_columns infers for this layout, worked out once per layout."""
+        key = layout_key(columns)
+        if key not in self.inferred:
+            self.inferred[key] = detect_columns(list(columns))
+        return self.inferred[key]
+
+    def roles(self, columns):
+        """
+        Column roles for a dataset with these columns: the inferred ones, with
+        this layout's overrides on top.
+        Returns: dict of role -> column name (or None), plus the analysis 'mode'.
+        """
+        roles = dict(self.inferred_roles(columns))
+        present = set(columns)
+        for role, column in self.overrides(columns).items():
+            if role in ROLE_LABELS and (column is None or column in present):
+                roles[role] = column
+        roles['mode'] = analysis_mode(roles)
+        return roles
+
+    def username_column(self, columns):
+        """The likeliest column of usernames: the creator column, else the name column."""
+        roles = self.roles(columns)
+        return roles['creator'] or roles['name']
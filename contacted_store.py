@@ -0,0 +1,240 @@
+import os
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+# ==============================================================================
+# ALREADY-CONTACTED CREATOR STORE
+# ==============================================================================
+# Usernames that went out in earlier outreach batches, kept in a local SQLite
+# file so later merges and splits can leave them out. Each username is stored
+# under a 64-bit hash of its normalized form ('@Name ' -> 'name').
+#
+# Lookups hash a whole column at once, then check it against a Bloom filter
+# that is kept in memory and saved next to the database. Most new usernames
+# are ruled out by the filter, and only the few that might be stored are
+# confirmed with SQLite. That stays fast with tens of millions of handles.
+
+CONTACTED_DB = os.environ.get(
+    'CONTACTED_DB', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'contacted.db')
+)
+
+# ~0.8% false positives (each one only costs a SQLite lookup)
+BLOOM_BITS_PER_ITEM = 10
+BLOOM_HASHES = 7
+BLOOM_MIN_CAPACITY = 1000000
+
+# Rows per SQLite round trip and per vectorized Bloom step
+_CHUNK = 1000000
+
+
+def normalize_usernames(values):
+    """Usernames as stored: stripped, without a leading '@', lower-case. Blanks become NaN."""
+    names = pd.Series(values).astype('str').str.strip().str.lstrip('@').str.lower()
+    return names.where(names.str.len() > 0)
+
+
+def username_hashes(names):
+    """64-bit hashes (as int64, SQLite's integer type) of already-normalized, non-null usernames."""
+    hashed = pd.util.hash_array(np.asarray(names, dtype=object), categorize=False)
+    return hashed.view('int64')
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over 64-bit hashes, with numpy bit operations."""
+
+    def __init__(self, capacity, bits=None):
+        self.capacity = capacity
+        self.size = max(64, capacity * BLOOM_BITS_PER_ITEM)
+        self.bits = bits if bits is not None else np.zeros((self.size + 7) // 8, dtype=np.uint8)
+
+    def _positions(self, hashes, i):
+        # Double hashing: position_i = h1 + i * h2 (mod size)
+        h = hashes.view('uint64')
+        h1 = h & np.uint64(0xFFFFFFFF)
+        h2 = (h >> np.uint64(32)) | np.uint64(1)
+        return (h1 + np.uint64(i) * h2) % np.uint64(self.size)
+
+    def add(self, hashes):
+        for start in range(0, len(hashes), _CHUNK):
+            chunk = hashes[start:start + _CHUNK]
+            for i in range(BLOOM_HASHES):
+                pos = self._positions(chunk, i)
+                np.bitwise_or.at(self.bits, pos >> np.uint64(3), np.left_shift(1, pos & np.uint64(7)).astype(np.uint8))
+
+    def might_contain(self, hashes):
+        """False where a hash was certainly never added."""
+        result = np.empty(len(hashes), dtype=bool)
+        for start in range(0, len(hashes), _CHUNK):
+            chunk = hashes[start:start + _CHUNK]
+            hit = np.ones(len(chunk), dtype=bool)
+            for i in range(BLOOM_HASHES):
+                pos = self._positions(chunk, i)
+                hit &= ((self.bits[pos >> np.uint64(3)] >> (pos & np.uint64(7)).astype(np.uint8)) & 1).astype(bool)
+            result[start:start + _CHUNK] = hit
+        return result
+
+
+class ContactedStore:
+    """
+    Persistent set of contacted usernames (SQLite + Bloom filter).
+    The database's user_version goes up on every change, so version() tells callers
+    when results they cached from this store are out of date.
+    """
+
+    def __init__(self, path=CONTACTED_DB):
+        self.path = path
+        self.bloom_path = path + '.bloom.npz'
+        self._bloom = None
+        self._bloom_version = None
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS contacted ('
+                ' hash INTEGER PRIMARY KEY,'
+                ' username TEXT NOT NULL,'
+                ' added_at REAL NOT NULL,'
+                ' source TEXT'
+                ') WITHOUT ROWID'
+            )
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def version(self):
+        with self._connect() as conn:
+            return conn.execute('PRAGMA user_version').fetchone()[0]
+
+    def count(self):
+        with self._connect() as conn:
+            return conn.execute('SELECT count(*) FROM contacted').fetchone()[0]
+
+    def _bump_version(self, conn):
+        version = conn.execute('PRAGMA user_version').fetchone()[0] + 1
+        conn.execute(f'PRAGMA user_version = {version}')
+        return version
+
+    # --- Bloom filter -------------------------------------------------------
+
+    def _load_bloom(self):
+        """The Bloom filter matching the database, loaded from disk or rebuilt."""
+        version = self.version()
+        if self._bloom is not None and self._bloom_version == version:
+            return self._bloom
+        try:
+            saved = np.load(self.bloom_path)
+            if int(saved['version']) == version:
+                self._bloom = BloomFilter(int(saved['capacity']), saved['bits'])
+                self._bloom_version = version
+                return self._bloom
+        except (OSError, KeyError, ValueError):
+            pass
+        return self._rebuild_bloom(version)
+
+    def _rebuild_bloom(self, version):
+        with self._connect() as conn:
+            total = conn.execute('SELECT count(*) FROM contacted').fetchone()[0]
+            bloom = BloomFilter(max(BLOOM_MIN_CAPACITY, 2 * total))
+            cursor = conn.execute('SELECT hash FROM contacted')
+            while rows := cursor.fetchmany(_CHUNK):
+                bloom.add(np.fromiter((r[0] for r in rows), dtype='int64', count=len(rows)))
+        self._save_bloom(bloom, version)
+        return bloom
+
+    def _save_bloom(self, bloom, version):
+        tmp_path = self.bloom_path + '.tmp.npz'
+        np.savez(tmp_path, bits=bloom.bits, capacity=bloom.capacity, version=version)
+        os.replace(tmp_path, self.bloom_path)
+        self._bloom = bloom
+        self._bloom_version = version
+
+    # --- Lookups and updates ------------------------------------------------
+
+    def _stored(self, conn, hashes):
+        """The subset of (sorted, distinct) hashes present in the database."""
+        conn.execute('CREATE TEMP TABLE IF NOT EXISTS probe (hash INTEGER PRIMARY KEY) WITHOUT ROWID')
+        found = []
+        for start in range(0, len(hashes), _CHUNK):
+            conn.execute('DELETE FROM probe')
+            conn.executemany('INSERT INTO probe VALUES (?)', ((h,) for h in hashes[start:start + _CHUNK].tolist()))
+            found.extend(r[0] for r in conn.execute('SELECT hash FROM probe JOIN contacted USING (hash)'))
+        return np.array(found, dtype='int64')
+
+    def contains(self, usernames):
+        """Boolean array: True where a username is already in the store."""
+        names = normalize_usernames(usernames)
+        result = np.zeros(len(names), dtype=bool)
+        valid = names.notna().to_numpy()
+        if not valid.any():
+            return result
+
+        # Hash every row (cheap), then look up each distinct hash once
+        codes, hashes = pd.factorize(username_hashes(names[valid]))
+        candidates = np.flatnonzero(self._load_bloom().might_contain(hashes))
+        candidates = candidates[np.argsort(hashes[candidates])]
+        with self._connect() as conn:
+            stored = self._stored(conn, hashes[candidates])
+        unique_hit = np.zeros(len(hashes), dtype=bool)
+        unique_hit[candidates] = np.isin(hashes[candidates], stored, assume_unique=True)
+        result[valid] = unique_hit[codes]
+        return result
+
+    def exclude(self, df, column):
+        """
+        Rows of df whose username in column has not been contacted.
+        Returns:
+            (filtered DataFrame, number of rows removed)
+        """
+        contacted = self.contains(df[column])
+        return df[~contacted], int(contacted.sum())
+
+    def add(self, usernames, source=None):
+        """Record usernames as contacted. Returns how many were new."""
+        names = normalize_usernames(usernames).dropna().drop_duplicates()
+        if names.empty:
+            return 0
+        hashes = username_hashes(names)
+        # Inserting in key order keeps SQLite appending to the index instead of jumping around it
+        order = np.argsort(hashes)
+        now = time.time()
+        with self._connect() as conn:
+            before = conn.total_changes
+            rows = zip(hashes[order].tolist(), names.to_numpy(dtype=object)[order].tolist())
+            conn.executemany(
+                'INSERT OR IGNORE INTO contacted VALUES (?, ?, ?, ?)',
+                ((h, name, now, source) for h, name in rows)
+            )
+            added = conn.total_changes - before
+            total = conn.execute('SELECT count(*) FROM contacted').fetchone()[0]
+            version = self._bump_version(conn)
+
+        bloom = self._load_bloom_for_update(version - 1)
+        if bloom is None or total > bloom.capacity:
+            self._rebuild_bloom(version)
+        else:
+            bloom.add(hashes)
+            self._save_bloom(bloom, version)
+        return added
+
+    def _load_bloom_for_update(self, version):
+        """The in-memory filter if it was up to date just before this write."""
+        if self._bloom is not None and self._bloom_version == version:
+            return self._bloom
+        try:
+            saved = np.load(self.bloom_path)
+            if int(saved['version']) == version:
+                return BloomFilter(int(saved['capacity']), saved['bits'])
+        except (OSError, KeyError, ValueError):
+            pass
+        return None
+
+    def clear(self):
+        """Forget every contacted username."""
+        with self._connect() as conn:
+            conn.execute('DELETE FROM contacted')
+            version = self._bump_version(conn)
+        self._save_bloom(BloomFilter(BLOOM_MIN_CAPACITY), version)
@@ -0,0 +1,423 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from ingest import editable_frame
+
+# ==============================================================================
+# PAGED DATA EDITOR
+# ==============================================================================
+# st.data_editor sends every row it is given to the browser on each rerun, and
+# the old page then compared the whole returned frame with the dataset to spot
+# edits. The Data Editor page now shows one page of rows at a time. It applies
+# what the widget reports as changed (edited cells, added rows, deleted rows,
+# by position in the page) to the full dataset. A cell edit copies only the
+# columns it changes into a new frame; row inserts and deletes rebuild the
+# frame once. The frame given is never changed, so anything kept for it (the
+# upload, the batch export, parsed metrics) stays true to it.
+
+PAGE_SIZES = [100, 500, 1000, 5000]
+DEFAULT_PAGE_SIZE = 500
+
+
+def page_count(n_rows, page_size):
+    return max(1, -(-n_rows // page_size))
+
+
+def page_bounds(n_rows, page_size, page):
+    """(start, end) row positions of a 1-based page, clamped to the data."""
+    page = min(max(1, page), page_count(n_rows, page_size))
+    start = (page - 1) * page_size
+    return start, min(start + page_size, n_rows)
+
+
+def editor_page(df, start, end):
+    """The rows shown in the editor, with categoricals as plain text so any value can be typed."""
+    return editable_frame(df.iloc[start:end])
+
+
+def _with_own_columns(df, columns):
+    """Shallow copy of df holding its own copy of each of columns, so writing to those leaves df as it was."""
+    df = df.copy(deep=False)
+    for col in columns:
+        df[col] = df[col].copy()
+    return df
+
+
+def _set_cell(df, row, col, value):
+    """df.iloc[row, col] = value in place, widening the column's dtype when the value doesn't fit it."""
+    j = df.columns.get_loc(col)
+    try:
+        df.iloc[row, j] = value
+        return
+    except (TypeError, ValueError):
+        pass
+    column = df[col]
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        # A new value becomes one more category; the column stays compact
+        column = column.cat.add_categories([value])
+    try:
+        column = column.astype(np.result_type(column.dtype, type(value))) if column.dtype.kind in 'biuf' else column
+        column.iloc[row] = value
+    except (TypeError, ValueError):
+        column = column.astype(object)
+        column.iloc[row] = value
+    df[col] = column
+
+
+def _new_rows(added, dtypes):
+    """
+    Rows typed into the editor as a frame, in the dataset's column types where the values allow.
+    Values of categorical columns that aren't categories yet are added to the categories.
+    """
+    rows = pd.DataFrame(added, columns=dtypes.index)
+    for col, dtype in dtypes.items():
+        if isinstance(dtype, pd.CategoricalDtype):
+            typed = pd.Index(rows[col].dropna().unique())
+            dtype = pd.CategoricalDtype(dtype.categories.append(typed.difference(dtype.categories)), dtype.ordered)
+        try:
+            rows[col] = rows[col].astype(dtype)
+        except (TypeError, ValueError):
+            pass
+    return rows
+
+
+def apply_editor_delta(df, start, end, delta):
+    """
+    Apply the data editor's changes for the page of rows start:end.
+    delta is the widget's state: {'edited_rows': {page row: {column: value}},
+    'added_rows': [{column: value}], 'deleted_rows': [page row]}.
+    Returns:
+        (new DataFrame, cells edited, rows added, rows deleted)
+    """
+    edited = delta.get('edited_rows', {})
+    added = delta.get('added_rows', [])
+    deleted = delta.get('deleted_rows', [])
+
+    columns = {col for changes in edited.values() for col in changes if col in df.columns}
+    if columns:
+        df = _with_own_columns(df, [col for col in df.columns if col in columns])
+    cells = 0
+    for row, changes in edited.items():
+        for col, value in changes.items():
+            if col in df.columns:
+                _set_cell(df, start + int(row), col, value)
+                cells += 1
+
+    if not added and not deleted:
+        return df, cells, 0, 0
+
+    # Rows before the page, the page minus deleted rows, new rows (added at the page's end), the rest
+    source = df
+    rows = _new_rows(added, df.dtypes) if added else None
+    if added:
+        # Categoricals take the new rows' categories (only the categories change), so concat keeps them categorical
+        widened = [col for col, dtype in rows.dtypes.items()
+                   if isinstance(dtype, pd.CategoricalDtype) and dtype != df[col].dtype]
+        if widened:
+            source = df.copy(deep=False)
+            for col in widened:
+                source[col] = source[col].cat.set_categories(rows[col].cat.categories)
+    keep = np.ones(end - start, dtype=bool)
+    keep[[int(row) for row in deleted]] = False
+    parts = [source.iloc[:start], source.iloc[start:end][keep]]
+    if added:
+        parts.append(rows)
+    parts.append(source.iloc[end:])
+    df = pd.concat(parts, ignore_index=True)
+    return df, cells, len(added), len(deleted)
+
+
+# ==============================================================================
+# EDIT JOURNAL (UNDO / REDO / RECIPES)
+# ==============================================================================
+# Edits used to replace the dataset with a new frame and forget the old one, so
+# nothing could be undone. Every edit is now an operation kept in a journal.
+# An operation stores only what it needs to reverse itself: the columns it
+# dropped, the rows it removed and where they were, or the page of rows the
+# editor changed. It never stores a copy of the whole dataset.
+#
+# Column drops and renames undo in time proportional to the columns involved.
+# Cell edits undo in time proportional to the page. Putting removed rows back
+# means building one new frame.
+#
+# The journal's steps can be saved as a JSON recipe and replayed on another
+# file. Cell edits made in the grid refer to rows of this file only, so they
+# are left out of recipes.
+
+JOURNAL_MAX_STEPS = 50
+RECIPE_VERSION = 1
+
+
+class DropColumns:
+    kind = 'drop_columns'
+
+    def __init__(self, columns):
+        self.columns = list(dict.fromkeys(columns))
+        self._dropped = None
+
+    def apply(self, df):
+        missing = [col for col in self.columns if col not in df.columns]
+        if missing:
+            raise ValueError(f"Columns not found: {missing}")
+        # Sorted by position, so putting them back in this order restores it
+        self._dropped = sorted((df.columns.get_loc(col), df[col]) for col in self.columns)
+        return df.drop(columns=self.columns)
+
+    def revert(self, df):
+        df = df.copy(deep=False)
+        for position, column in self._dropped:
+            df.insert(position, column.name, column)
+        return df
+
+    def step(self):
+        return {'op': self.kind, 'columns': self.columns}
+
+    def describe(self):
+        return f"Dropped column(s) {', '.join(map(str, self.columns))}"
+
+
+class RenameColumns:
+    kind = 'rename_columns'
+
+    def __init__(self, mapping):
+        self.mapping = dict(mapping)
+
+    def apply(self, df):
+        missing = [col for col in self.mapping if col not in df.columns]
+        if missing:
+            raise ValueError(f"Columns not found: {missing}")
+        if any(not str(new).strip() for new in self.mapping.values()):
+            raise ValueError("New column name cannot be empty")
+        # Renaming onto a column that stays would make two columns with one name, which can't be undone
+        kept = set(df.columns) - set(self.mapping)
+        clashes = [new for new in self.mapping.values() if new in kept]
+        if clashes:
+            raise ValueError(f"Columns already exist: {clashes}")
+        return df.rename(columns=self.mapping)
+
+    def revert(self, df):
+        return df.rename(columns={new: old for old, new in self.mapping.items()})
+
+    def step(self):
+        return {'op': self.kind, 'mapping': self.mapping}
+
+    def describe(self):
+        return ', '.join(f"Renamed '{old}' to '{new}'" for old, new in self.mapping.items())
+
+
+class DropRows:
+    kind = 'drop_rows'
+
+    def __init__(self, rows):
+        self.rows = None if rows is None else np.unique(np.asarray(rows, dtype='int64'))
+        self._removed = None
+
+    def apply(self, df):
+        if len(self.rows) and (self.rows[0] < 0 or self.rows[-1] >= len(df)):
+            raise ValueError(f"Row positions must be between 0 and {len(df) - 1}")
+        keep = np.ones(len(df), dtype=bool)
+        keep[self.rows] = False
+        self._removed = df.iloc[self.rows]
+        return df.iloc[keep].reset_index(drop=True)
+
+    def revert(self, df):
+        # Interleave the removed rows back at their old positions
+        total = len(df) + len(self.rows)
+        removed = np.zeros(total, dtype=bool)
+        removed[self.rows] = True
+        order = np.empty(total, dtype='int64')
+        order[~removed] = np.arange(len(df))
+        order[removed] = len(df) + np.arange(len(self.rows))
+        combined = pd.concat([df, self._removed], ignore_index=True)
+        return combined.take(order).reset_index(drop=True)
+
+    def step(self):
+        return {'op': self.kind, 'rows': self.rows.tolist()}
+
+    def describe(self):
+        return f"Dropped {len(self.rows):,} row(s)"
+
+
+class FilterRows(DropRows):
+    """Keep the rows whose column contains value (case-insensitive). Redo reuses the rows found the first time."""
+    kind = 'filter_rows'
+
+    def __init__(self, column, value):
+        super().__init__(None)
+        self.column = column
+        self.value = value
+
+    def match(self, df):
+        """Boolean mask of the rows the filter keeps (also remembers the rows it will drop)."""
+        if self.column not in df.columns:
+            raise ValueError(f"Column not found: {self.column}")
+        mask = df[self.column].astype(str).str.contains(self.value, case=False, na=False).to_numpy()
+        self.rows = np.flatnonzero(~mask)
+        return mask
+
+    def apply(self, df):
+        if self.rows is None:
+            self.match(df)
+        return super().apply(df)
+
+    def step(self):
+        return {'op': self.kind, 'column': self.column, 'value': self.value}
+
+    def describe(self):
+        return f"Filtered '{self.column}' for '{self.value}' ({len(self.rows):,} row(s) removed)"
+
+
+class EditorChange:
+    """One change reported by the data editor for the page of rows start:end."""
+    kind = 'edit_page'
+
+    def __init__(self, start, end, delta):
+        self.start = start
+        self.end = end
+        self.delta = {
+            'edited_rows': {int(row): dict(changes) for row, changes in delta.get('edited_rows', {}).items()},
+            'added_rows': [dict(row) for row in delta.get('added_rows', [])],
+            'deleted_rows': list(delta.get('deleted_rows', [])),
+        }
+        self.counts = (0, 0, 0)
+        self._page = None
+        self._dtypes = None
+
+    def apply(self, df):
+        self._page = df.iloc[self.start:self.end].copy()
+        self._dtypes = df.dtypes
+        df, *self.counts = apply_editor_delta(df, self.start, self.end, self.delta)
+        return df
+
+    def revert(self, df):
+        cells, added, deleted = self.counts
+        if added or deleted:
+            page_end = self.end - deleted + added
+            # The old page in the categories the edit gave its columns, so they stay categorical
+            page = self._page.astype({col: df[col].dtype for col, dtype in self._page.dtypes.items()
+                                      if isinstance(dtype, pd.CategoricalDtype) and dtype != df[col].dtype})
+            df = pd.concat([df.iloc[:self.start], page, df.iloc[page_end:]], ignore_index=True)
+        else:
+            # Only cells changed: write the page's old values back into copies of those columns
+            edited = {col for changes in self.delta['edited_rows'].values() for col in changes}
+            edited = [col for col in self._page.columns if col in edited]
+            df = _with_own_columns(df, edited)
+            for col in edited:
+                df.iloc[self.start:self.end, df.columns.get_loc(col)] = self._page[col].to_numpy()
+        # Columns an edit widened (or made plain text) go back to their old type
+        for col, dtype in self._dtypes.items():
+            if df[col].dtype != dtype:
+                try:
+                    df[col] = df[col].astype(dtype)
+                except (TypeError, ValueError):
+                    pass
+        return df
+
+    def step(self):
+        return None
+
+    def describe(self):
+        cells, added, deleted = self.counts
+        return f"Edited {cells} cell(s), added {added} row(s), deleted {deleted} row(s)"
+
+
+OPERATIONS = {op.kind: op for op in [DropColumns, RenameColumns, DropRows, FilterRows]}
+
+
+def operation_from_step(step):
+    """The operation a recipe step describes."""
+    try:
+        kind = step['op']
+        if kind == 'drop_columns':
+            return DropColumns(step['columns'])
+        if kind == 'rename_columns':
+            return RenameColumns(step['mapping'])
+        if kind == 'drop_rows':
+            return DropRows(step['rows'])
+        if kind == 'filter_rows':
+            return FilterRows(step['column'], step['value'])
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"Malformed recipe step {step!r}") from e
+    raise ValueError(f"Unknown recipe step '{kind}' (expected one of {list(OPERATIONS)})")
+
+
+class EditJournal:
+    """
+    Undo/redo history of the edits made to one DataFrame.
+    frame is the current result; apply, undo and redo return the new one.
+    Only the last JOURNAL_MAX_STEPS edits can be undone, but all of them stay in the recipe.
+    """
+
+    def __init__(self, df):
+        self.frame = df
+        self._done = []
+        self._undone = []
+        self._steps = []
+
+    def apply(self, op):
+        self.frame = op.apply(self.frame)
+        self._done.append(op)
+        del self._done[:-JOURNAL_MAX_STEPS]
+        self._undone.clear()
+        self._steps.append(op.step())
+        return self.frame
+
+    def can_undo(self):
+        return bool(self._done)
+
+    def can_redo(self):
+        return bool(self._undone)
+
+    def undo(self):
+        op = self._done.pop()
+        self.frame = op.revert(self.frame)
+        self._steps.pop()
+        self._undone.append(op)
+        return self.frame
+
+    def redo(self):
+        op = self._undone.pop()
+        self.frame = op.apply(self.frame)
+        self._done.append(op)
+        self._steps.append(op.step())
+        return self.frame
+
+    def history(self):
+        """Descriptions of the edits that can be undone, oldest first."""
+        return [op.describe() for op in self._done]
+
+    def next_undo(self):
+        return self._done[-1].describe() if self._done else None
+
+    def next_redo(self):
+        return self._undone[-1].describe() if self._undone else None
+
+    def recipe(self):
+        return {'version': RECIPE_VERSION, 'steps': [step for step in self._steps if step is not None]}
+
+    def recipe_json(self):
+        return json.dumps(self.recipe(), indent=2, default=str)
+
+    def replay(self, recipe):
+        """
+        Apply a recipe's steps in order, each as its own undoable edit.
+        If a step fails, the journal is left as it was and ValueError is raised.
+        """
+        if isinstance(recipe, (str, bytes)):
+            try:
+                recipe = json.loads(recipe)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Not a recipe file: {e}") from e
+        if not isinstance(recipe, dict) or recipe.get('version') != RECIPE_VERSION:
+            raise ValueError(f"Not a version {RECIPE_VERSION} recipe")
+        # Recipe steps never change the frame they are given, so a failed replay just goes back to it
+        saved = self.frame, list(self._done), list(self._undone), list(self._steps)
+        for number, step in enumerate(recipe.get('steps', []), 1):
+            try:
+                self.apply(operation_from_step(step))
+            except ValueError as e:
+                self.frame, self._done, self._undone, self._steps = saved
+                raise ValueError(f"Recipe step {number}: {e}") from e
+        return self.frame
@@ -0,0 +1,503 @@
+import hashlib
+import multiprocessing
+import os
+import re
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from ingest import arrow_string_dtype
+from metrics import parse_metric_series
+
+# ==============================================================================
+# USERNAME EXTRACTION
+# ==============================================================================
+# Creator listings copied from TikTok Shop are a run of cards, with each
+# creator's handle two non-empty lines above their "PPS: 4.1/5.0" line. If the
+# text has no usable PPS lines, every @handle-looking token is collected
+# instead and obvious noise is filtered out.
+#
+# extract_usernames_from_text strips and drops blank lines at C speed, then
+# finds every PPS line in one scan for colons instead of upper-casing and
+# testing each line in Python. The regex fallback tokenizes once and filters
+# each distinct token once, rather than every occurrence.
+
+# Words from card labels and categories that the regex fallback would pick up
+BLACKLIST = frozenset({
+    'health', 'male', 'female', 'previously', 'invited', 'fast', 'growing',
+    'pps:', 'pps', 'womenswear', 'underwear', 'beauty', 'personal', 'care',
+    'sports', 'outdoor', 'ugc', 'level', 'deals', 'next', 'locked', 'mindset',
+    'midlifemomgrace', 'soberafjoe',
+    'chenbo', 'unknown', 'creator', 'video', 'views', 'follower', 'sale', 'revenue'
+})
+
+# Debug log lines shown in the app; the full log has one line per card
+DEBUG_LOG_MAX_LINES = 500
+
+# PPS lines are found from their colon: a literal search is far faster than a
+# case-insensitive pattern on text with emoji in it
+_COLON = re.compile(':')
+# Same tokens as r'@?([a-zA-Z0-9_.]+)': runs of handle characters
+_TOKEN = re.compile(r'[a-zA-Z0-9_.]+')
+_HAS_LETTER = re.compile(r'[a-zA-Z]')
+# Stats such as 1.4K, 4.1, 5.0
+_STAT = re.compile(r'[\d.]+[KMBkmb]?')
+
+
+def _is_username_token(token):
+    """Filter for regex fallback tokens (which only contain letters, digits, '_' and '.')."""
+    if len(token) < 3:
+        return False
+    if not _HAS_LETTER.search(token):
+        return False
+    if token.lower() in BLACKLIST:
+        return False
+    if token[0].isdigit() and _STAT.fullmatch(token):
+        return False
+    return True
+
+
+def _clean_lines(text):
+    """Non-empty lines, stripped. Stripping and filtering run in C (map/filter), not a Python loop."""
+    return list(filter(None, map(str.strip, text.split('\n'))))
+
+
+def _pps_entries(lines, first=0):
+    """
+    (line index, candidate) for every line from index first on that contains "PPS:".
+    The candidate is the line two above, or None for the first two lines.
+    """
+    # One scan over the cleaned lines; a match's line number is the newlines before it
+    joined = '\n'.join(lines)
+    entries = []
+    line_no = 0
+    counted_to = 0
+    i = -1
+    for match in _COLON.finditer(joined):
+        pos = match.start()
+        # Same test as "PPS:" in line.upper(): three characters that each upper-case to P, P, S
+        if pos < 3 or joined[pos - 3:pos].upper() != 'PPS':
+            continue
+        line_no += joined.count('\n', counted_to, pos)
+        counted_to = pos
+        if line_no == i or line_no < first:
+            continue  # another "PPS:" on a line already handled, or on a context line
+        i = line_no
+        entries.append((i, lines[i - 2] if i >= 2 else None))
+    return entries
+
+
+def _fallback_counts(text):
+    """
+    Regex fallback over text.
+    Returns:
+        (number of raw matches, {accepted token: occurrences})
+    """
+    token_counts = Counter(_TOKEN.findall(text))
+    accepted = {token: n for token, n in token_counts.items() if _is_username_token(token)}
+    return sum(token_counts.values()), accepted
+
+
+def _build_result(line_count, entries, fallback):
+    """Turn PPS entries into usernames and the debug log; fallback() runs the regex strategy if needed."""
+    debug_log = [f"Found {line_count} non-empty lines"]
+
+    # Strategy 1: PPS Anchor - username is 2 lines above "PPS:"
+    smart_matches = []
+    for i, candidate in entries:
+        if candidate is None:
+            debug_log.append(f"Line {i} PPS found -> No candidate (index < 2)")
+        # Usernames have no spaces and at least 3 characters
+        elif ' ' not in candidate and len(candidate) >= 3:
+            smart_matches.append(candidate)
+            debug_log.append(f"Line {i} PPS found -> Accepted candidate '{candidate}'")
+        else:
+            debug_log.append(f"Line {i} PPS found -> Rejected candidate '{candidate}' (invalid format)")
+
+    if smart_matches:
+        debug_log.append(f"Strategy 1 (PPS) Success: {len(smart_matches)} matches")
+        return sorted(set(smart_matches)), debug_log
+
+    debug_log.append("Strategy 1 (PPS) returned 0 valid matches. Falling back to regex.")
+
+    # Strategy 2: Fallback Regex with Stronger Filtering
+    raw_count, accepted = fallback()
+    debug_log.append(f"Regex found {raw_count} raw matches")
+    debug_log.append(f"Strategy 2 (Regex) Final: {sum(accepted.values())} matches")
+    return sorted(accepted), debug_log
+
+
+def extract_usernames_from_text(text):
+    """
+    Extract usernames using smart heuristics (PPS anchor) and fallback to regex.
+    Returns: (list of usernames, list of debug strings)
+    """
+    if not text:
+        return [], ["No text provided"]
+
+    lines = _clean_lines(text)
+    return _build_result(len(lines), _pps_entries(lines), lambda: _fallback_counts(text))
+
+
+# ==============================================================================
+# PARALLEL EXTRACTION
+# ==============================================================================
+# A big dump is cut into pieces that start at a card's first line (the handle
+# two lines above a PPS line), and the pieces are scanned in worker processes.
+# Each worker also gets the two non-empty lines before its piece. A PPS line at
+# the top of a piece can then still see its candidate, and only the worker that
+# owns a PPS line reports it. Line numbers are shifted by the non-empty lines in
+# earlier pieces, so the merged usernames and debug log are exactly what
+# extract_usernames_from_text returns for the whole text.
+
+# Below this many characters, starting worker processes costs more than it saves
+PARALLEL_MIN_CHARS = 4 * 1024 * 1024
+
+
+def _lines_before(text, pos, count):
+    """
+    The last count non-empty lines (stripped) ending before pos, oldest first.
+    Returns:
+        (lines, start offset of the first of them)
+    """
+    found = []
+    start = pos
+    end = pos - 1
+    while end >= 0 and len(found) < count:
+        line_start = text.rfind('\n', 0, end) + 1
+        line = text[line_start:end].strip()
+        if line:
+            found.append(line)
+            start = line_start
+        end = line_start - 1
+    return found[::-1], start
+
+
+def _record_start(text, pos):
+    """Offset of the first card starting at or after pos, or of the next line if no PPS line follows."""
+    for match in _COLON.finditer(text, pos):
+        p = match.start()
+        if p >= 3 and text[p - 3:p].upper() == 'PPS':
+            line_start = text.rfind('\n', 0, p) + 1
+            return _lines_before(text, line_start, 2)[1]
+    next_line = text.find('\n', pos)
+    return None if next_line == -1 else next_line + 1
+
+
+def split_records(text, parts):
+    """
+    Cut text into about `parts` pieces, each starting at the beginning of a line
+    (at a card's handle line where there is one).
+    Returns:
+        List of (start, end) offsets covering the whole text in order
+    """
+    cuts = [0]
+    for k in range(1, parts):
+        cut = _record_start(text, len(text) * k // parts)
+        if cut is not None and cut > cuts[-1]:
+            cuts.append(cut)
+    cuts.append(len(text))
+    return [(cuts[k], cuts[k + 1]) for k in range(len(cuts) - 1) if cuts[k] < cuts[k + 1]]
+
+
+def _scan_piece(piece, context):
+    """
+    PPS entries of one piece, with context (the non-empty lines before it) available as candidates.
+    Returns:
+        (non-empty lines in the piece, entries with line numbers counted from the piece's first line)
+    """
+    lines = context + _clean_lines(piece)
+    entries = _pps_entries(lines, first=len(context))
+    return len(lines) - len(context), [(i - len(context), candidate) for i, candidate in entries]
+
+
+def extract_usernames_parallel(text, workers=None):
+    """
+    extract_usernames_from_text with large inputs split across worker processes.
+    Returns: (list of usernames, list of debug strings), the same as the single-process version
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers < 2 or len(text) < PARALLEL_MIN_CHARS:
+        return extract_usernames_from_text(text)
+
+    bounds = split_records(text, workers)
+    pieces = [text[start:end] for start, end in bounds]
+    contexts = [_lines_before(text, start, 2)[0] for start, _ in bounds]
+    # 'spawn' - forking a process that runs server threads isn't safe
+    with ProcessPoolExecutor(max_workers=len(pieces), mp_context=multiprocessing.get_context('spawn')) as pool:
+        line_count = 0
+        entries = []
+        for piece_lines, piece_entries in pool.map(_scan_piece, pieces, contexts):
+            entries.extend((line_count + i, candidate) for i, candidate in piece_entries)
+            line_count += piece_lines
+
+        def fallback():
+            # Pieces start at line starts and tokens never contain a newline, so counts just add up
+            raw_count = 0
+            accepted = Counter()
+            for piece_raw, piece_accepted in pool.map(_fallback_counts, pieces):
+                raw_count += piece_raw
+                accepted.update(piece_accepted)
+            return raw_count, accepted
+
+        return _build_result(line_count, entries, fallback)
+
+
+# ==============================================================================
+# CREATOR CARD PARSING
+# ==============================================================================
+# Besides the handle, each card carries everything the creator search showed:
+#
+#   guadalupejaimes              handle
+#   Lupita jaimes💜              display name
+#   PPS: 4.1/5.0                 score
+#   Health                       main category
+#   , +2                         more categories
+#   5.9K, Female 56%, 35-44      followers, main gender, age band
+#   Previously invited           flags (any number, may repeat)
+#   $1,262.34                    GMV
+#   100                          videos
+#   109                          views
+#   4.6%                         engagement rate
+#
+# parse_creator_cards finds the cards with the same PPS scan as the extractor,
+# then walks each card's lines once through the states categories -> flags ->
+# metrics. Numbers are kept as text while walking and parsed per column at the
+# end with parse_metric_series, so the frame comes out typed.
+
+CARD_COLUMNS = [
+    'Username', 'Display name', 'PPS', 'Category', 'More categories', 'Followers',
+    'Gender', 'Gender %', 'Age', 'Previously invited', 'Fast growing', 'Other flags',
+    'GMV ($)', 'Video count', 'Views', 'Engagement rate (%)',
+]
+
+# The four stats at the bottom of a card, in order
+CARD_METRICS = ['GMV ($)', 'Video count', 'Views', 'Engagement rate (%)']
+
+CARD_FLAGS = {'previously invited': 'Previously invited', 'fast growing': 'Fast growing'}
+
+_PPS_SCORE = re.compile(r'PPS:\s*([\d.]+)', re.IGNORECASE)
+_MORE_CATEGORIES = re.compile(r',?\s*\+(\d+)')
+_FOLLOWERS = re.compile(
+    r'(?P<followers>[\d.,]+[KMB]?)'
+    r'(?:\s*,\s*(?P<gender>[A-Za-z]+)\s*(?P<share>[\d.]+)%)?'
+    r'(?:\s*,\s*(?P<age>\d+\s*-\s*\d+|\d+\+))?',
+    re.IGNORECASE
+)
+# A stat cell: "$40.4K", "1,262.34", "4.6%", or dashes for no data
+_STAT_LINE = re.compile(r'\$?[\d.,]+[KMB]?%?|-+', re.IGNORECASE)
+
+
+def _parse_card(handle, name, pps_line, body):
+    """One card's fields as text (numbers unparsed), walking its body lines once."""
+    score = _PPS_SCORE.search(pps_line)
+    row = {
+        'Username': handle, 'Display name': name, 'PPS': score.group(1) if score else None,
+        'Category': None, 'More categories': 0, 'Followers': None, 'Gender': None,
+        'Gender %': None, 'Age': None, 'Previously invited': False, 'Fast growing': False,
+        'Other flags': None,
+    }
+    other_flags = []
+    metrics = []
+    state = 'categories'
+    for line in body:
+        if state == 'categories':
+            followers = _FOLLOWERS.fullmatch(line)
+            if followers:
+                row['Followers'] = followers.group('followers')
+                row['Gender'] = followers.group('gender')
+                row['Gender %'] = followers.group('share')
+                row['Age'] = followers.group('age')
+                state = 'flags'
+                continue
+            more = _MORE_CATEGORIES.fullmatch(line)
+            if more:
+                row['More categories'] = int(more.group(1))
+            elif row['Category'] is None:
+                row['Category'] = line
+            else:
+                row['Category'] += ', ' + line
+            continue
+        if state == 'flags':
+            if not _STAT_LINE.fullmatch(line):
+                flag = CARD_FLAGS.get(line.lower())
+                if flag:
+                    row[flag] = True
+                elif line not in other_flags:
+                    other_flags.append(line)
+                continue
+            state = 'metrics'
+        if len(metrics) < len(CARD_METRICS):
+            metrics.append(None if line.startswith('-') else line)
+    row['Other flags'] = '; '.join(other_flags) or None
+    row.update(zip(CARD_METRICS, metrics))
+    return row
+
+
+def parse_creator_cards(text):
+    """
+    Parse pasted creator cards into one typed row per creator (first card wins for repeats).
+    Cards are found like Strategy 1 of extract_usernames_from_text, so the Username
+    column holds the same usernames.
+    Returns:
+        DataFrame with CARD_COLUMNS; numbers are floats, missing values NaN
+    """
+    lines = _clean_lines(text) if text else []
+    cards = [(i, candidate) for i, candidate in _pps_entries(lines)
+             if candidate is not None and ' ' not in candidate and len(candidate) >= 3]
+
+    rows = []
+    for k, (i, handle) in enumerate(cards):
+        # A card runs until the handle line of the next one
+        end = cards[k + 1][0] - 2 if k + 1 < len(cards) else len(lines)
+        rows.append(_parse_card(handle, lines[i - 1], lines[i], lines[i + 1:max(end, i + 1)]))
+
+    df = pd.DataFrame(rows, columns=CARD_COLUMNS).drop_duplicates(subset='Username').reset_index(drop=True)
+    for col in ['PPS', 'Followers', 'Gender %'] + CARD_METRICS:
+        raw = df[col]
+        df[col] = parse_metric_series(raw).where(raw.notna(), np.nan)
+    df['More categories'] = df['More categories'].astype('int64')
+    df[['Previously invited', 'Fast growing']] = df[['Previously invited', 'Fast growing']].astype(bool)
+    # Missing fields stay NaN (astype('str') makes them 'None' before pandas 3)
+    string_dtype = arrow_string_dtype() or object
+    text_columns = ['Username', 'Display name', 'Category', 'Gender', 'Age', 'Other flags']
+    df[text_columns] = df[text_columns].astype(string_dtype)
+    return df
+
+
+# ==============================================================================
+# INCREMENTAL EXTRACTION SESSION
+# ==============================================================================
+# Creator pages get pasted one screen at a time. The session runs the extractor
+# on each new paste only, adds what it finds to a running set, and keeps just
+# a hash of the pastes it has seen, never their text. Re-submitting the same
+# paste is recognized and not processed again.
+
+
+class ExtractionSession:
+    """Usernames accumulated over several pastes."""
+
+    def __init__(self):
+        self.usernames = set()
+        self.pastes = 0
+        self._digests = set()
+        self.last = None
+
+    def add(self, text):
+        """
+        Extract usernames from one paste and merge them into the session.
+        Returns:
+            Dict with 'found', 'new' and 'seen' (usernames in this paste, how many were
+            not in the session yet, how many were), 'repeat' (the paste was already
+            processed) and 'debug_log'
+        """
+        digest = hashlib.blake2b(text.encode('utf-8', errors='surrogatepass'), digest_size=16).digest()
+        if digest in self._digests:
+            self.last = {'found': 0, 'new': 0, 'seen': 0, 'repeat': True,
+                         'debug_log': ["Same text as an earlier paste - skipped"]}
+            return self.last
+
+        found, debug_log = extract_usernames_parallel(text)
+        new = [name for name in found if name not in self.usernames]
+        self.usernames.update(new)
+        self._digests.add(digest)
+        self.pastes += 1
+        self.last = {'found': len(found), 'new': len(new), 'seen': len(found) - len(new),
+                     'repeat': False, 'debug_log': debug_log}
+        return self.last
+
+    def sorted_usernames(self):
+        return sorted(self.usernames)
+
+    def clear(self):
+        self.__init__()
+
+
+def extract_usernames_reference(text):
+    """
+    The original line-by-line extractor, kept as the reference the scanner is checked against.
+    Returns: (list of usernames, list of debug strings)
+    """
+    debug_log = []
+    
+    if not text:
+        return [], ["No text provided"]
+        
+    lines = [L.strip() for L in text.split('\n') if L.strip()]
+    debug_log.append(f"Found {len(lines)} non-empty lines")
+    
+    smart_matches = []
+    
+    # Strategy 1: PPS Anchor
+    # Pattern: Username is 2 lines above "PPS:"
+    pps_found = False
+    for i, line in enumerate(lines):
+        # Case insensitive check for PPS
+        if "PPS:" in line.upper():
+            pps_found = True
+            if i >= 2:
+                candidate = lines[i-2]
+                # Basic validation: no spaces, decent length, not a number
+                # Usernames shouldn't contain spaces.
+                if ' ' not in candidate and len(candidate) >= 3:
+                    smart_matches.append(candidate)
+                    debug_log.append(f"Line {i} PPS found -> Accepted candidate '{candidate}'")
+                else:
+                    debug_log.append(f"Line {i} PPS found -> Rejected candidate '{candidate}' (invalid format)")
+            else:
+                debug_log.append(f"Line {i} PPS found -> No candidate (index < 2)")
+                
+    if smart_matches:
+        debug_log.append(f"Strategy 1 (PPS) Success: {len(smart_matches)} matches")
+        return sorted(list(set(smart_matches))), debug_log
+        
+    debug_log.append("Strategy 1 (PPS) returned 0 valid matches. Falling back to regex.")
+        
+    # Strategy 2: Fallback Regex with Stronger Filtering
+    pattern = r'@?([a-zA-Z0-9_.]+)'
+    raw_matches = re.findall(pattern, text)
+    debug_log.append(f"Regex found {len(raw_matches)} raw matches")
+    
+    # Expanded blacklist (lowercase for comparison)
+    blacklist_set = {
+        'health', 'male', 'female', 'previously', 'invited', 'fast', 'growing', 
+        'pps:', 'pps', 'womenswear', 'underwear', 'beauty', 'personal', 'care',
+        'sports', 'outdoor', 'ugc', 'level', 'deals', 'next', 'locked', 'mindset',
+        'midlifemomgrace', 'soberafjoe', # Keep these if they are actually names in current text? No, safer to exclude if known noise
+        'chenbo', 'unknown', 'creator', 'video', 'views', 'follower', 'sale', 'revenue'
+    }
+    
+    cleaned_matches = []
+    for m in raw_matches:
+        clean = m.strip()
+        clean_lower = clean.lower()
+        
+        # 1. Length Check
+        if len(clean) < 3:
+            continue
+            
+        # 2. Character Check (Must have at least one letter)
+        if not any(c.isalpha() for c in clean):
+            continue
+            
+        # 3. Blacklist Check (Case Insensitive)
+        if clean_lower in blacklist_set:
+            continue
+            
+        # 4. Symbol Check
+        if any(x in clean for x in ['/', '%', '$', ',']):
+            continue
+            
+        # 5. Number/Stat Check (e.g. 1.4K, 4.1, 5.0)
+        # If it starts with a digit, it's suspicious unless it's mixed with sufficient letters
+        if clean[0].isdigit():
+            # If matches mostly numbers/dots/K/M/B
+            if re.match(r'^[\d.]+[KMBkmb]?$', clean):
+                continue
+                
+        cleaned_matches.append(clean)
+            
+    debug_log.append(f"Strategy 2 (Regex) Final: {len(cleaned_matches)} matches")
+    return sorted(list(set(cleaned_matches))), debug_log
@@ -0,0 +1,566 @@
+import datetime
+import hashlib
+import importlib.util
+import io
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+from pandas.errors import EmptyDataError
+from pandas.io.parsers import TextParser
+
+# ==============================================================================
+# CHUNKED CSV INGEST
+# ==============================================================================
+# pd.read_csv loads a whole upload in one blocking call and keeps every text
+# cell as a Python object. read_csv_chunked streams the file through pyarrow's
+# CSV reader block by block instead. Cells stay as compact Arrow strings while
+# reading, and each column gets one type for the whole file at the end. That
+# avoids the mixed-type columns that per-chunk pandas inference produces.
+
+LARGE_CSV_BYTES = 50 * 1024 * 1024
+CSV_BLOCK_SIZE = 16 * 1024 * 1024
+
+# Strings pd.read_csv treats as missing by default
+CSV_NA_VALUES = [
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND',
+    '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+]
+CSV_TRUE_VALUES = ['True', 'TRUE', 'true']
+CSV_FALSE_VALUES = ['False', 'FALSE', 'false']
+
+_INT_PATTERN = r'^\s*[+-]?\d+\s*$'
+_FLOAT_PATTERN = r'(?i)^\s*[+-]?(?:\d+\.?\d*(?:e[+-]?\d+)?|\.\d+(?:e[+-]?\d+)?|inf|infinity)\s*$'
+
+# Column kinds from narrowest to widest. Combining two kinds gives the wider one,
+# except bool mixed with numbers, which can only be kept as text.
+_KIND_ORDER = ['empty', 'int', 'float', 'string']
+
+
+def _combine_kinds(a, b):
+    if a == 'empty' or a == b:
+        return b
+    if b == 'empty':
+        return a
+    if 'bool' in (a, b) or 'string' in (a, b):
+        return 'string'
+    return max(a, b, key=_KIND_ORDER.index)
+
+
+def _text_kind(values):
+    """Narrowest kind that fits every non-missing cell of an Arrow string array."""
+    values = values.drop_null()
+    if len(values) == 0:
+        return 'empty'
+    # Text columns usually fail on the first few cells, so check a sample before each full scan
+    head = values.slice(0, 1000)
+    try:
+        # Plain digits cast straight away; the regexes below also allow spaces and '+'
+        pc.cast(head, pa.int64())
+        pc.cast(values, pa.int64())
+        return 'int'
+    except pa.ArrowInvalid:
+        pass
+    checks = [
+        ('int', lambda v: pc.match_substring_regex(v, _INT_PATTERN)),
+        ('float', lambda v: pc.match_substring_regex(v, _FLOAT_PATTERN)),
+        ('bool', lambda v: pc.is_in(v, pa.array(CSV_TRUE_VALUES + CSV_FALSE_VALUES))),
+    ]
+    for kind, matches in checks:
+        if pc.all(matches(head)).as_py() and pc.all(matches(values)).as_py():
+            return kind
+    return 'string'
+
+
+def _numeric_text(values):
+    """Cell text ready for an Arrow numeric cast: no surrounding spaces or leading '+'."""
+    return pc.replace_substring_regex(pc.utf8_trim_whitespace(values), r'^\+', '')
+
+
+def _convert_column(values, kind):
+    """Turn a column of raw CSV text into the Series pd.read_csv would build, with integers narrowed."""
+    has_nulls = values.null_count > 0
+    if kind == 'empty':
+        return pd.Series(float('nan'), index=pd.RangeIndex(len(values)), dtype='float64')
+    if kind == 'int':
+        try:
+            ints = pc.cast(_numeric_text(values), pa.int64())
+        except pa.ArrowInvalid:
+            # Outside the int64 range (long video/order IDs): uint64 when every value fits, like
+            # pd.read_csv, else the text itself - float64 would silently drop digits
+            if not has_nulls:
+                try:
+                    return pc.cast(_numeric_text(values), pa.uint64()).to_pandas()
+                except pa.ArrowInvalid:
+                    pass
+            return values.to_pandas()
+        if not has_nulls:
+            return pd.to_numeric(ints.to_pandas(), downcast='integer')
+    if kind in ('int', 'float'):
+        try:
+            return pc.cast(_numeric_text(values), pa.float64()).to_pandas()
+        except pa.ArrowInvalid:
+            kind = 'string'
+    if kind == 'bool':
+        flags = pc.is_in(values, pa.array(CSV_TRUE_VALUES)).to_pandas()
+        if not has_nulls:
+            return flags
+        return flags.astype(object).where(values.is_valid().to_pandas())
+    return values.to_pandas()
+
+
+def _pandas_column_names(names):
+    """Name columns the way pd.read_csv does: 'Unnamed: N' for blanks and '.1', '.2' for repeats."""
+    result = []
+    seen = {}
+    for i, name in enumerate(names):
+        name = name if name != '' else f'Unnamed: {i}'
+        base = name
+        while name in seen:
+            seen[base] += 1
+            name = f'{base}.{seen[base]}'
+        seen.setdefault(name, 0)
+        result.append(name)
+    return result
+
+
+def _source_size(source):
+    """Total byte size of an uploaded file or path, or None if unknown."""
+    size = getattr(source, 'size', None)
+    if size is None and hasattr(source, 'getbuffer'):
+        size = source.getbuffer().nbytes
+    if size is None and isinstance(source, str):
+        size = os.path.getsize(source)
+    return size
+
+
+def read_csv_chunked(source, block_size=CSV_BLOCK_SIZE, progress=None):
+    """
+    Read a CSV (path or file-like) in blocks with pyarrow and return a DataFrame
+    shaped like pd.read_csv's: same column names, missing values, and numeric/bool/text
+    columns, with integer columns downcast to the smallest type that fits.
+    progress(fraction) is called after every block.
+    """
+    if hasattr(source, 'seek'):
+        source.seek(0)
+
+    # The first block tells us the header; after that every column is read as raw text
+    # so one block's guess can't break type inference for the rest of the file.
+    read_options = pacsv.ReadOptions(block_size=block_size)
+    with pacsv.open_csv(source, read_options=read_options) as probe:
+        names = probe.schema.names
+    if hasattr(source, 'seek'):
+        source.seek(0)
+
+    convert_options = pacsv.ConvertOptions(
+        column_types={name: pa.string() for name in names},
+        null_values=CSV_NA_VALUES,
+        strings_can_be_null=True,
+    )
+    total = _source_size(source)
+    parsed_bytes = 0
+    kinds = ['empty'] * len(names)
+    batches = []
+    with pacsv.open_csv(source, read_options=read_options, convert_options=convert_options) as reader:
+        for batch in reader:
+            batches.append(batch)
+            for i, column in enumerate(batch.columns):
+                if kinds[i] != 'string':
+                    kinds[i] = _combine_kinds(kinds[i], _text_kind(column))
+            if progress and total:
+                # pyarrow reads ahead of the parser, so estimate progress from the
+                # text parsed so far (cell bytes plus one delimiter per cell)
+                parsed_bytes += batch.num_rows * batch.num_columns
+                parsed_bytes += sum(pc.sum(pc.binary_length(column)).as_py() or 0 for column in batch.columns)
+                progress(min(parsed_bytes / total, 0.99))
+
+    table = pa.Table.from_batches(batches, schema=batches[0].schema) if batches else None
+    del batches
+    columns = {}
+    for i, name in enumerate(_pandas_column_names(names)):
+        if table is None:
+            columns[name] = pd.Series([], dtype=object)
+            continue
+        values = table.column(i).combine_chunks()
+        columns[name] = _convert_column(values, kinds[i])
+
+    if progress:
+        progress(1.0)
+    return pd.DataFrame(columns)
+
+
+# ==============================================================================
+# EXCEL INGEST
+# ==============================================================================
+# TikTok Shop Excel exports often have a title and blank rows above the real
+# column headers. read_excel_rows streams the first sheet once and returns its
+# cells, converted the way pd.read_excel converts them. The header row is found
+# from those cells, and frame_from_rows builds the DataFrame from the same rows
+# with pandas' own parser. Callers keep the rows, so trying another header row
+# doesn't parse the workbook again.
+#
+# 'calamine' (the python-calamine package) reads large workbooks several times
+# faster than openpyxl and is offered when it is installed.
+
+EXCEL_ENGINES = ['openpyxl', 'calamine']
+
+# Keywords to look for (based on user screenshot/standard TikTok export)
+HEADER_KEYWORDS = ['Creator name', 'Creator ID', 'Video ID', 'GMV', 'VV', 'Likes', 'Gross mer']
+HEADER_SCAN_ROWS = 20
+
+
+def available_excel_engines():
+    """The Excel reader engines that can be used here, openpyxl first."""
+    return [engine for engine in EXCEL_ENGINES
+            if importlib.util.find_spec('python_calamine' if engine == 'calamine' else engine)]
+
+
+# With values_only, openpyxl returns error cells as their error text
+_EXCEL_ERRORS = frozenset({'#NULL!', '#DIV/0!', '#VALUE!', '#REF!', '#NAME?', '#NUM!', '#N/A'})
+
+
+def _excel_cell(value):
+    """A cell value as pd.read_excel sees it: blanks as '', whole floats as int, errors as NaN."""
+    if value is None:
+        return ''
+    if isinstance(value, float):
+        as_int = int(value)
+        return as_int if as_int == value else value
+    if isinstance(value, str) and value in _EXCEL_ERRORS:
+        return float('nan')
+    if type(value) is datetime.date:
+        return datetime.datetime(value.year, value.month, value.day)
+    return value
+
+
+def read_excel_rows(source, engine='openpyxl'):
+    """
+    All cells of the first sheet, read once.
+    Returns:
+        List of rows (lists of values), the same rows pd.read_excel parses
+    """
+    if engine == 'calamine':
+        from python_calamine import load_workbook as load_calamine
+        sheet = load_calamine(source).get_sheet_by_index(0)
+        return [[_excel_cell(v) for v in row] for row in sheet.to_python(skip_empty_area=False)]
+
+    from openpyxl import load_workbook
+    # read_only streams the sheet XML instead of building the whole workbook in memory
+    book = load_workbook(source, read_only=True, data_only=True, keep_links=False)
+    try:
+        sheet = book.worksheets[0]
+        sheet.reset_dimensions()
+        rows = []
+        last_row_with_data = -1
+        for row in sheet.iter_rows(values_only=True):
+            row = [_excel_cell(v) for v in row]
+            while row and row[-1] == '':
+                row.pop()
+            if row:
+                last_row_with_data = len(rows)
+            rows.append(row)
+    finally:
+        book.close()
+
+    # Trim trailing empty rows and pad the rest to the same width
+    rows = rows[:last_row_with_data + 1]
+    width = max((len(row) for row in rows), default=0)
+    return [row + [''] * (width - len(row)) if len(row) < width else row for row in rows]
+
+
+def frame_from_rows(rows, header=0):
+    """DataFrame from read_excel_rows output with header as the column row, as pd.read_excel(header=header) builds it."""
+    try:
+        # pandas may fill in header cells in place, so it gets its own list
+        return TextParser(list(rows), header=header, skip_blank_lines=False).read()
+    except EmptyDataError:
+        return pd.DataFrame()
+
+
+def detect_header_row(preview):
+    """
+    Header row index in preview (the top rows, without a header), or 0 if none stands out.
+    A header row has to contain at least 2 keywords; the first row with the most wins.
+    """
+    top = preview.head(HEADER_SCAN_ROWS)
+    top = top.mask(top.eq(''))
+    cells = top.stack(future_stack=True).dropna()
+    if cells.empty:
+        return 0
+    # One line of text per row, matched against every keyword in one pass each
+    row_text = cells.astype(str).groupby(level=0, sort=False).agg(' '.join).str.lower()
+    matches = sum(row_text.str.contains(kw.lower(), regex=False).astype(int) for kw in HEADER_KEYWORDS)
+    if matches.max() < 2:
+        return 0
+    return int(matches.idxmax())
+
+
+# ==============================================================================
+# COMPACT IN-MEMORY DATASETS
+# ==============================================================================
+# Exports repeat the same creator names and categories on thousands of rows.
+# compact_dataframe stores those as categoricals, keeps other text as Arrow
+# strings and shrinks integer columns. Cell values stay the same, so CSV/Excel
+# exports, the Batch Splitter and the Data Editor produce the same output.
+# Floats are left as float64, because float32 would change exported digits.
+
+CATEGORY_MAX_RATIO = 0.5
+
+
+def arrow_string_dtype():
+    """Arrow-backed string dtype that keeps NaN for missing cells, or None on old pandas."""
+    try:
+        return pd.StringDtype('pyarrow', na_value=float('nan'))
+    except TypeError:
+        try:
+            return pd.StringDtype('pyarrow_numpy')
+        except (TypeError, ValueError):
+            return None
+
+
+def compact_dataframe(df, max_category_ratio=CATEGORY_MAX_RATIO):
+    """
+    Return a copy of df with text columns as categoricals (when distinct values are at
+    most max_category_ratio of the rows) or Arrow strings, and integers downcast.
+    """
+    string_dtype = arrow_string_dtype()
+    columns = {}
+    for i, name in enumerate(df.columns):
+        series = df.iloc[:, i]
+        dtype = series.dtype
+        if dtype.kind in 'iu':
+            series = pd.to_numeric(series, downcast='integer' if dtype.kind == 'i' else 'unsigned')
+        elif dtype == object or isinstance(dtype, pd.StringDtype):
+            if pd.api.types.infer_dtype(series, skipna=True) == 'string':
+                if len(series) and series.nunique() <= max_category_ratio * len(series):
+                    series = series.astype('category')
+                elif string_dtype is not None and series.dtype != string_dtype:
+                    series = series.astype(string_dtype)
+        columns[i] = series
+
+    compacted = pd.concat(columns, axis=1) if columns else df.copy()
+    compacted.columns = df.columns
+    return compacted
+
+
+def editable_frame(df):
+    """df with categorical columns turned back into plain text, so the Data Editor allows any value."""
+    categorical = [c for c, t in df.dtypes.items() if isinstance(t, pd.CategoricalDtype)]
+    if not categorical:
+        return df
+    string_dtype = arrow_string_dtype() or object
+    return df.astype({c: string_dtype for c in categorical})
+
+
+def memory_report(before, after):
+    """
+    Per-column memory use before and after compaction.
+    Returns: (DataFrame of columns, total MB before, total MB after)
+    """
+    before_bytes = before.memory_usage(deep=True, index=False)
+    after_bytes = after.memory_usage(deep=True, index=False)
+    report = pd.DataFrame({
+        'column': [str(c) for c in before.columns],
+        'dtype before': [str(t) for t in before.dtypes],
+        'dtype after': [str(t) for t in after.dtypes],
+        'MB before': (before_bytes.to_numpy() / 1e6).round(2),
+        'MB after': (after_bytes.to_numpy() / 1e6).round(2),
+    })
+    return report, before_bytes.sum() / 1e6, after_bytes.sum() / 1e6
+
+
+# ==============================================================================
+# ON-DISK UPLOAD CACHE
+# ==============================================================================
+# Parsed uploads are stored as Parquet files named after a hash of the file's
+# bytes and the reader options, so the same export loads in milliseconds after
+# a page reload or a server restart. Files are evicted least recently used
+# first once the directory grows past its size limit.
+
+UPLOAD_CACHE_DIR = os.environ.get(
+    'UPLOAD_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.upload_cache')
+)
+UPLOAD_CACHE_MAX_MB = float(os.environ.get('UPLOAD_CACHE_MAX_MB', 2048))
+
+# Bump when parsing or compaction changes, so stale entries stop matching
+UPLOAD_CACHE_VERSION = 1
+
+
+class UploadCache:
+    """Content-addressed Parquet cache of parsed uploads with a size limit and LRU eviction."""
+
+    def __init__(self, directory=UPLOAD_CACHE_DIR, max_mb=UPLOAD_CACHE_MAX_MB):
+        self.directory = directory
+        self.max_mb = max_mb
+
+    @staticmethod
+    def digest(data):
+        """Hash of an uploaded file's bytes."""
+        return hashlib.blake2b(data, digest_size=20).hexdigest()
+
+    def key(self, digest, *options):
+        """Cache key for one file parsed with the given options (e.g. 'excel', header row)."""
+        parts = [digest, f'v{UPLOAD_CACHE_VERSION}'] + [str(o) for o in options]
+        return '-'.join(parts)
+
+    def _path(self, key, suffix='.parquet'):
+        return os.path.join(self.directory, key + suffix)
+
+    def load(self, key):
+        """The cached DataFrame for key, or None. A hit marks the entry as recently used."""
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            df = pd.read_parquet(path)
+        except Exception:
+            # Truncated or unreadable entry - drop it and parse the file again
+            self._remove(path)
+            return None
+        os.utime(path)
+        return df
+
+    def store(self, key, df):
+        """
+        Save df under key, then evict old entries past the size limit.
+        Returns False for frames Parquet can't round-trip (non-text column names, mixed-type columns).
+        """
+        if not all(isinstance(c, str) for c in df.columns) or df.columns.has_duplicates:
+            return False
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        try:
+            df.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, path)
+        except (pa.ArrowException, TypeError, ValueError):
+            self._remove(tmp_path)
+            return False
+        self.evict()
+        return True
+
+    def load_meta(self, digest):
+        """Small per-file facts (like the detected header row) saved with store_meta, or {}."""
+        path = self._path(digest, '.json')
+        try:
+            with open(path, encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        os.utime(path)
+        return meta
+
+    def store_meta(self, digest, **meta):
+        os.makedirs(self.directory, exist_ok=True)
+        merged = {**self.load_meta(digest), **meta}
+        path = self._path(digest, '.json')
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(merged, f)
+        os.replace(tmp_path, path)
+
+    def _entries(self):
+        """(last used, size, path) for every cache file, oldest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.tmp'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return sorted(entries)
+
+    def usage(self):
+        """(number of cached datasets, total MB on disk)."""
+        entries = self._entries()
+        datasets = sum(1 for _, _, path in entries if path.endswith('.parquet'))
+        return datasets, sum(size for _, size, _ in entries) / 1e6
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_mb."""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        limit = self.max_mb * 1e6
+        for _, size, path in entries:
+            if total <= limit:
+                break
+            self._remove(path)
+            total -= size
+
+    def clear(self):
+        """Delete every cached dataset."""
+        for _, _, path in self._entries():
+            self._remove(path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+# ==============================================================================
+# PARALLEL FILE LOADING
+# ==============================================================================
+# The Merge tab reads every uploaded file before it can show anything. Reading
+# xlsx is openpyxl's pure-Python XML parsing, which holds the GIL, so several
+# Excel files are spread over worker processes. CSV parsing mostly runs in C
+# and is fine on threads.
+
+
+def read_table(name, data):
+    """Read one uploaded CSV or Excel file from its bytes."""
+    if name.endswith('.csv'):
+        return pd.read_csv(io.BytesIO(data))
+    # The fastest installed Excel reader
+    return frame_from_rows(read_excel_rows(io.BytesIO(data), available_excel_engines()[-1]))
+
+
+def _read_table_safely(name, data):
+    try:
+        return read_table(name, data), None
+    except Exception as e:
+        return None, str(e)
+
+
+def load_tables(files, workers=None, progress=None):
+    """
+    Read several (name, bytes) files concurrently.
+    progress, if given, is called as progress(done, total, name, error) when each file finishes.
+    Returns:
+        List of (DataFrame or None, error message or None), in the order the files were given
+    """
+    workers = workers or os.cpu_count() or 1
+    excel_files = sum(1 for name, _ in files if not name.endswith('.csv'))
+    if excel_files > 1 and workers > 1:
+        # 'spawn' - forking a process that runs server threads isn't safe
+        pool = ProcessPoolExecutor(
+            max_workers=min(workers, len(files)), mp_context=multiprocessing.get_context('spawn')
+        )
+    else:
+        pool = ThreadPoolExecutor(max_workers=min(workers, len(files)) or 1)
+
+    results = [None] * len(files)
+    with pool:
+        futures = {pool.submit(_read_table_safely, name, data): i for i, (name, data) in enumerate(files)}
+        for done, future in enumerate(as_completed(futures), start=1):
+            i = futures[future]
+            try:
+                results[i] = future.result()
+            except Exception as e:
+                # A worker process died (e.g. out of memory) rather than the read failing
+                results[i] = (None, str(e))
+            if progress:
+                progress(done, len(files), files[i][0], results[i][1])
+    return results
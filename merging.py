@@ -0,0 +1,156 @@
+import numpy as np
+import pandas as pd
+
+from ingest import arrow_string_dtype
+
+# ==============================================================================
+# MULTI-WAY KEYED JOIN
+# ==============================================================================
+# Joining N files by folding df.merge(..., how='outer') copies every column of
+# the growing result at each step. Every extra file also adds '_dup' columns
+# that clash with the ones before. join_frames instead factorizes the key of
+# all inputs once and works out which source row feeds each output row using
+# integer arrays only. Data columns are then gathered once at the end, and
+# columns that share a name are coalesced into one.
+
+PRECEDENCE_OPTIONS = ['first', 'last']
+
+# Warn when a join would produce more rows than all inputs together; with
+# unique keys an outer join can never do that, so duplicates are multiplying
+JOIN_EXPLOSION_FACTOR = 1.0
+
+
+def _key_codes(dfs, key):
+    """Integer key codes per frame, into one shared sorted index of key values."""
+    keys = pd.concat([df[key] for df in dfs], ignore_index=True)
+    try:
+        codes, uniques = pd.factorize(keys, sort=True, use_na_sentinel=False)
+    except TypeError:
+        # Unorderable mix of key types - keep first-seen order
+        codes, uniques = pd.factorize(keys, use_na_sentinel=False)
+    bounds = np.cumsum([0] + [len(df) for df in dfs])
+    return [codes[bounds[i]:bounds[i + 1]] for i in range(len(dfs))], keys, codes, len(uniques)
+
+
+def estimate_join(dfs, key):
+    """
+    Size of the outer join of dfs on key, before running it.
+    Returns:
+        Dict with 'rows' (exact output rows), 'input_rows', 'bytes' (rough memory estimate)
+        and 'duplicate_keys' (files with repeated key values, by position)
+    """
+    frame_codes, _, _, n_keys = _key_codes(dfs, key)
+    rows = np.ones(n_keys, dtype='float64')
+    duplicate_keys = []
+    for i, codes in enumerate(frame_codes):
+        counts = np.bincount(codes, minlength=n_keys)
+        if (counts > 1).any():
+            duplicate_keys.append(i)
+        rows *= np.maximum(counts, 1)
+
+    total_rows = int(rows.sum())
+    row_bytes = sum(df.memory_usage(deep=True, index=False).sum() / max(len(df), 1) for df in dfs)
+    return {
+        'rows': total_rows,
+        'input_rows': sum(len(df) for df in dfs),
+        'bytes': int(total_rows * row_bytes),
+        'duplicate_keys': duplicate_keys,
+    }
+
+
+def is_join_explosion(estimate):
+    return estimate['rows'] > JOIN_EXPLOSION_FACTOR * estimate['input_rows']
+
+
+def _join_positions(frame_codes, n_keys):
+    """
+    Row positions into each frame for every output row (-1 where a frame has no row for the key).
+    Output rows are ordered by key, and within a key like nested loops over the frames.
+    """
+    row_key = np.arange(n_keys)
+    positions = []
+    for codes in frame_codes:
+        order = np.argsort(codes, kind='stable')
+        counts = np.bincount(codes, minlength=n_keys)
+        starts = np.cumsum(counts) - counts
+
+        # Each existing row repeats once per matching row in this frame (once if none match)
+        repeats = np.maximum(counts[row_key], 1)
+        row_key = np.repeat(row_key, repeats)
+        offsets = np.arange(len(row_key)) - np.repeat(np.cumsum(repeats) - repeats, repeats)
+
+        pick = np.full(len(row_key), -1, dtype='int64')
+        matched = counts[row_key] > 0
+        pick[matched] = order[starts[row_key[matched]] + offsets[matched]]
+        positions = [p.repeat(repeats) for p in positions] + [pick]
+    return row_key, positions
+
+
+def _gather(column, pick):
+    """column's values at the row positions pick (missing where pick is -1)."""
+    return pd.Series(pd.api.extensions.take(column.array, pick, allow_fill=True), name=column.name)
+
+
+def _coalesce(sources):
+    """
+    One column from the (column, row positions) of each file that has it, in precedence
+    order: each output row takes the first value that isn't missing.
+    """
+    dtypes = {column.dtype for column, _ in sources}
+    if len(dtypes) == 1 and not isinstance(sources[0][0].dtype, pd.CategoricalDtype):
+        merged = _gather(*sources[0])
+        for source in sources[1:]:
+            merged = merged.fillna(_gather(*source))
+        return merged
+    # Fill from each file's own values: gathering integers with gaps would make them floats (1 -> '1.0' as text)
+    filled = np.full(len(sources[0][1]), None, dtype=object)
+    missing = np.ones(len(filled), dtype=bool)
+    for column, pick in sources:
+        rows = np.flatnonzero(missing & (pick >= 0))
+        values = column.to_numpy(dtype=object)[pick[rows]]
+        found = pd.notna(values)
+        filled[rows[found]] = values[found]
+        missing[rows[found]] = False
+    merged = pd.Series(filled, name=sources[0][0].name).infer_objects()
+    if merged.dtype == object:
+        # Files disagree on the type (e.g. numbers in one, text in another) - keep it as text
+        merged = merged.map(str, na_action='ignore').astype(arrow_string_dtype() or object)
+    return merged
+
+
+def join_frames(dfs, key, precedence='first', first_row_per_key=False):
+    """
+    Outer-join dfs on the key column in one pass.
+    Columns that appear in several files are merged into one. Where files disagree,
+    the value from the first file that has one wins ('first'), or from the last ('last').
+    first_row_per_key keeps only each file's first row per key value, so duplicate
+    keys can't multiply rows.
+    """
+    if precedence not in PRECEDENCE_OPTIONS:
+        raise ValueError(f"precedence must be one of {PRECEDENCE_OPTIONS}")
+    if first_row_per_key:
+        dfs = [df.drop_duplicates(subset=[key]) for df in dfs]
+
+    frame_codes, keys, codes, n_keys = _key_codes(dfs, key)
+    row_key, positions = _join_positions(frame_codes, n_keys)
+
+    # Key values keep the dtype pandas gives the combined key columns
+    first_seen = np.full(n_keys, len(codes), dtype='int64')
+    np.minimum.at(first_seen, codes, np.arange(len(codes)))
+    columns = {key: keys.take(first_seen[row_key]).reset_index(drop=True)}
+
+    ordered = dfs if precedence == 'first' else dfs[::-1]
+    ordered_positions = positions if precedence == 'first' else positions[::-1]
+    sources = {}
+    for df, pick in zip(ordered, ordered_positions):
+        for col in df.columns:
+            if col != key:
+                sources.setdefault(col, []).append((df[col], pick))
+    for col, col_sources in sources.items():
+        columns[col] = _coalesce(col_sources)
+
+    # Column order follows the files as given: first file's columns, then new ones from each next file
+    order = []
+    for df in dfs:
+        order.extend(col for col in df.columns if col not in order)
+    return pd.DataFrame({col: columns[col] for col in order})
@@ -0,0 +1,174 @@
+import numpy as np
+import pandas as pd
+
+# ==============================================================================
+# METRIC PARSING
+# ==============================================================================
+# TikTok Shop exports format numbers for humans: "$40.4K", "1.4K", "4.6%",
+# "$1,262.34". parse_metric_value is the reference implementation and handles
+# one cell at a time. parse_metric_series gives the same results for a whole
+# column at once and is what the app uses on real data.
+
+# What is left of a cell once '$', ',', '%' and the K/M/B suffix are removed.
+# Cells that match this parse with a single bulk float() cast, and anything
+# else is handed back to parse_metric_value.
+_PLAIN_NUMBER = r'\s*[+-]?(?:\d+\.?\d*|\.\d+)(?:E[+-]?\d+)?\s*'
+
+_SUFFIX_MULTIPLIERS = [('K', 1000), ('M', 1000000), ('B', 1000000000)]
+
+# The ASCII characters str.strip() removes
+_ASCII_WHITESPACE = ' \t\n\r\x0b\x0c\x1c\x1d\x1e\x1f'
+
+
+def parse_metric_value(value):
+    """Parse string metrics like '1.2M', '$1K' into floats."""
+    if pd.isna(value):
+        return 0.0
+
+    s = str(value).upper().replace('$', '').replace(',', '').replace('%', '').strip()
+
+    multiplier = 1
+    if 'K' in s:
+        multiplier = 1000
+        s = s.replace('K', '')
+    elif 'M' in s:
+        multiplier = 1000000
+        s = s.replace('M', '')
+    elif 'B' in s:
+        multiplier = 1000000000
+        s = s.replace('B', '')
+
+    try:
+        return float(s) * multiplier
+    except:
+        return 0.0
+
+
+def parse_metric_series(series):
+    """
+    Parse a whole column of metrics like '1.2M', '$1K' into floats.
+    Returns the same values as series.apply(parse_metric_value), as float64.
+    """
+    if not isinstance(series, pd.Series):
+        series = pd.Series(series)
+
+    # Columns that are already numeric only need missing values zeroed.
+    # float32 and bool are excluded: str() of them does not round-trip the same way.
+    dtype = series.dtype
+    if dtype == np.float64 or (dtype.kind in 'iu' and not pd.api.types.is_bool_dtype(dtype)):
+        return series.astype('float64').fillna(0.0)
+
+    # Exports repeat the same formatted strings a lot, so parse each distinct one once
+    if isinstance(dtype, pd.CategoricalDtype):
+        codes = series.cat.codes.to_numpy()
+        uniques = np.asarray(series.cat.categories, dtype=object)
+        if pd.api.types.infer_dtype(uniques, skipna=False) != 'string':
+            uniques = np.array([str(v) for v in uniques], dtype=object)
+    elif isinstance(dtype, pd.StringDtype):
+        codes, uniques = pd.factorize(series)
+        uniques = np.asarray(uniques, dtype=object)
+    else:
+        values = series.to_numpy(dtype=object)
+        if pd.api.types.infer_dtype(values, skipna=True) != 'string':
+            values = np.array([v if pd.isna(v) else str(v) for v in values], dtype=object)
+        codes, uniques = pd.factorize(values)
+
+    parsed = np.append(_parse_unique_metrics(uniques), 0.0)  # code -1 (missing) -> 0.0
+    return pd.Series(parsed[codes], index=series.index, name=series.name)
+
+
+def _parse_unique_metrics(uniques):
+    """Parse an array of distinct metric strings with Arrow-backed pandas string ops."""
+    parsed = np.zeros(len(uniques), dtype='float64')
+    if not len(uniques):
+        return parsed
+
+    # Arrow and Python agree on upper-casing and whitespace for ASCII text only
+    raw = pd.Series(uniques, dtype='string[pyarrow]')
+    cleaned = (
+        raw.str.upper()
+        .str.replace('$', '', regex=False)
+        .str.replace(',', '', regex=False)
+        .str.replace('%', '', regex=False)
+        .str.strip(_ASCII_WHITESPACE)
+    )
+
+    # Same precedence as the scalar parser: K wins over M, M wins over B
+    numbers = cleaned.copy()
+    multipliers = np.ones(len(cleaned), dtype='float64')
+    unmatched = np.ones(len(cleaned), dtype=bool)
+    for suffix, multiplier in _SUFFIX_MULTIPLIERS:
+        has_suffix = unmatched & cleaned.str.contains(suffix, regex=False).to_numpy(dtype=bool)
+        if has_suffix.any():
+            numbers[has_suffix] = cleaned[has_suffix].str.replace(suffix, '', regex=False)
+            multipliers[has_suffix] = multiplier
+            unmatched &= ~has_suffix
+
+    plain = (
+        raw.str.isascii().to_numpy(dtype=bool)
+        & numbers.str.fullmatch(_PLAIN_NUMBER).to_numpy(dtype=bool)
+    )
+    try:
+        # An object -> float64 cast calls float() on every element
+        parsed[plain] = numbers[plain].to_numpy(dtype=object).astype('float64') * multipliers[plain]
+    except ValueError:
+        plain[:] = False
+
+    # Leftovers ('-', 'N/A', 'INF', '1_000', non-ASCII, ...) go through the reference parser
+    for i in np.flatnonzero(~plain):
+        parsed[i] = parse_metric_value(uniques[i])
+    return parsed
+
+
+# ==============================================================================
+# PARSED METRIC CACHE
+# ==============================================================================
+
+class ParsedMetricCache:
+    """
+    Parsed metric columns for one loaded dataset.
+    Each column is parsed once, the first time any stage asks for it. The cache
+    holds the DataFrame it was built for, so it stays valid exactly as long as
+    that same object is the active dataset.
+    """
+
+    def __init__(self, df):
+        self.df = df
+        self.columns = {}
+
+    def matches(self, df):
+        """True if this cache was built for this exact DataFrame object."""
+        return self.df is df
+
+    def get(self, col):
+        """Parsed values of a source column, indexed like the source dataset."""
+        if col not in self.columns:
+            self.columns[col] = parse_metric_series(self.df[col])
+        return self.columns[col]
+
+    def extended(self, df, new):
+        """
+        Cache for df, which is this cache's dataset with rows added where the boolean
+        array new is True. Columns parsed so far carry over; only the new rows are parsed.
+        """
+        cache = ParsedMetricCache(df)
+        for col, parsed in self.columns.items():
+            if col not in df.columns:
+                continue
+            values = np.empty(len(df), dtype='float64')
+            values[~new] = parsed.to_numpy()
+            values[new] = parse_metric_series(df[col][new]).to_numpy()
+            cache.columns[col] = pd.Series(values, index=df.index, name=parsed.name)
+        return cache
+
+    def aligned(self, df, col):
+        """
+        Parsed values of df[col] for a frame derived from the cached dataset
+        (column subset, dedup, filter, sort). Falls back to parsing df[col]
+        directly when the rows can't be matched up by index.
+        """
+        if col in self.df.columns and self.df.index.is_unique and df.index.isin(self.df.index).all():
+            parsed = self.get(col).reindex(df.index)
+            parsed.name = col
+            return parsed
+        return parse_metric_series(df[col])
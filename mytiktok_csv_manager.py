@@ -12,13 +12,19 @@ import sys
 
 print("pandas is installed.")
 
+import os
 import pandas as pd
 import re
 from google.colab import files
 
+from batches import MANIFEST_NAME, stream_split_csv
+from editing import DropColumns, DropRows, EditJournal, FilterRows, RenameColumns
+
 # Global variable to store current DataFrame
 current_df = None
 current_filename = None
+# Undo/redo history of the edits to current_df
+current_journal = None
 
 # ============================================================================
 # HELPER FUNCTIONS
@@ -186,7 +192,7 @@ def create_new_csv():
 
 def upload_and_edit_csv():
     """Upload and edit an existing CSV file"""
-    global current_df, current_filename
+    global current_df, current_filename, current_journal
 
     print("\n--- Upload CSV File ---")
 
@@ -203,6 +209,7 @@ def upload_and_edit_csv():
 
         # Load CSV
         current_df = pd.read_csv(current_filename)
+        current_journal = EditJournal(current_df)
 
         print(f"\nLoaded file: {current_filename}")
         print(f"Shape: {current_df.shape[0]} rows, {current_df.shape[1]} columns")
@@ -217,6 +224,12 @@ def upload_and_edit_csv():
         print(f"Error loading file: {e}")
         current_df = None
         current_filename = None
+        current_journal = None
+
+def apply_edit(op):
+    """Apply an edit to current_df through the journal so it can be undone"""
+    global current_df
+    current_df = current_journal.apply(op)
 
 def edit_csv_menu():
     """Display editing menu for uploaded CSV"""
@@ -229,10 +242,14 @@ def edit_csv_menu():
         print("3. Rename columns")
         print("4. Filter rows by column value")
         print("5. Show full DataFrame")
-        print("6. Save and download edited file")
-        print("7. Return to main menu")
+        print("6. Undo last edit")
+        print("7. Redo")
+        print("8. Save edit recipe")
+        print("9. Apply edit recipe")
+        print("10. Save and download edited file")
+        print("11. Return to main menu")
 
-        choice = get_menu_choice(7)
+        choice = get_menu_choice(11)
 
         if choice == 1:
             drop_columns()
@@ -246,8 +263,16 @@ def edit_csv_menu():
             print("\nFull DataFrame:")
             print(current_df)
         elif choice == 6:
-            save_edited_csv()
+            undo_edit()
         elif choice == 7:
+            redo_edit()
+        elif choice == 8:
+            save_recipe()
+        elif choice == 9:
+            apply_recipe()
+        elif choice == 10:
+            save_edited_csv()
+        elif choice == 11:
             break
 
 def drop_columns():
@@ -272,7 +297,7 @@ def drop_columns():
 
     if yes_no_prompt(f"Drop columns {column_list}?"):
         try:
-            current_df = current_df.drop(columns=column_list)
+            apply_edit(DropColumns(column_list))
             print("Columns dropped successfully.")
             print("\nUpdated DataFrame:")
             print(current_df.head(10))
@@ -301,7 +326,7 @@ def drop_rows():
             return
 
         if yes_no_prompt(f"Drop rows {row_indices}?"):
-            current_df = current_df.drop(row_indices).reset_index(drop=True)
+            apply_edit(DropRows(row_indices))
             print("Rows dropped successfully.")
             print("\nUpdated DataFrame:")
             print(current_df.head(10))
@@ -329,7 +354,7 @@ def rename_columns():
         return
 
     try:
-        current_df = current_df.rename(columns={old_name: new_name})
+        apply_edit(RenameColumns({old_name: new_name}))
         print(f"Column '{old_name}' renamed to '{new_name}' successfully.")
         print("\nUpdated columns:", list(current_df.columns))
     except Exception as e:
@@ -349,14 +374,16 @@ def filter_rows():
     filter_value = input(f"Enter value to filter '{column_name}' by: ").strip()
 
     try:
-        filtered_df = current_df[current_df[column_name].astype(str).str.contains(filter_value, case=False, na=False)]
+        op = FilterRows(column_name, filter_value)
+        mask = op.match(current_df)
+        filtered_df = current_df[mask]
 
         print(f"\nFiltered results ({len(filtered_df)} rows):")
         print(filtered_df.head(20))
 
         if len(filtered_df) > 0:
             if yes_no_prompt("Replace current DataFrame with filtered version?"):
-                current_df = filtered_df.reset_index(drop=True)
+                apply_edit(op)
                 print("DataFrame updated with filtered results.")
         else:
             print("No matching rows found.")
@@ -364,6 +391,61 @@ def filter_rows():
     except Exception as e:
         print(f"Error filtering rows: {e}")
 
+def undo_edit():
+    """Undo the last edit"""
+    global current_df
+
+    if not current_journal.can_undo():
+        print("Nothing to undo.")
+        return
+
+    print(f"Undoing: {current_journal.next_undo()}")
+    current_df = current_journal.undo()
+    print(current_df.head(10))
+
+def redo_edit():
+    """Redo the last undone edit"""
+    global current_df
+
+    if not current_journal.can_redo():
+        print("Nothing to redo.")
+        return
+
+    print(f"Redoing: {current_journal.next_redo()}")
+    current_df = current_journal.redo()
+    print(current_df.head(10))
+
+def save_recipe():
+    """Save the edits made so far as a recipe to replay on other files"""
+    filename = input("\nEnter filename for the recipe (without .json extension): ").strip()
+    if not filename.endswith('.json'):
+        filename += '.json'
+
+    try:
+        with open(filename, 'w', encoding='utf-8') as f:
+            f.write(current_journal.recipe_json())
+        print(f"\nRecipe with {len(current_journal.recipe()['steps'])} step(s) saved as '{filename}'")
+        files.download(filename)
+    except Exception as e:
+        print(f"Error saving recipe: {e}")
+
+def apply_recipe():
+    """Replay a saved recipe on the current DataFrame"""
+    global current_df
+
+    try:
+        uploaded = files.upload()
+        if not uploaded:
+            print("No file uploaded.")
+            return
+
+        current_df = current_journal.replay(list(uploaded.values())[0])
+        print("Recipe applied successfully.")
+        print("\nUpdated DataFrame:")
+        print(current_df.head(10))
+    except ValueError as e:
+        print(f"Error applying recipe: {e}")
+
 def save_edited_csv():
     """Save and download edited CSV"""
     global current_df
@@ -391,6 +473,7 @@ def split_csv_into_batches():
     print("\n--- Split CSV into Batches ---")
 
     # Check if DataFrame is loaded
+    stream_source = None
     if current_df is None or current_df.empty:
         print("No CSV file currently loaded. Please upload a file.")
         try:
@@ -400,9 +483,12 @@ def split_csv_into_batches():
                 return
 
             filename = list(uploaded.keys())[0]
-            current_df = pd.read_csv(filename)
-            print(f"\nLoaded file: {filename}")
-            print(f"Total rows: {len(current_df)}")
+            if yes_no_prompt("Stream the split without loading the whole file (for very large files)?"):
+                stream_source = filename
+            else:
+                current_df = pd.read_csv(filename)
+                print(f"\nLoaded file: {filename}")
+                print(f"Total rows: {len(current_df)}")
 
         except Exception as e:
             print(f"Error loading file: {e}")
@@ -423,6 +509,10 @@ def split_csv_into_batches():
             print("Error: Invalid number.")
             return
 
+    if stream_source:
+        split_csv_streaming(stream_source, batch_size)
+        return
+
     # Calculate number of files
     total_rows = len(current_df)
     num_files = (total_rows + batch_size - 1) // batch_size
@@ -451,6 +541,28 @@ def split_csv_into_batches():
     except Exception as e:
         print(f"Error splitting files: {e}")
 
+def split_csv_streaming(filename, batch_size):
+    """Split a CSV file in chunks, writing batch files as it goes (resumes an interrupted split)"""
+    out_dir = os.path.splitext(filename)[0] + "_batches"
+    print(f"\nSplitting {filename} into batches of {batch_size} rows in '{out_dir}/'...")
+
+    try:
+        manifest = stream_split_csv(
+            filename, out_dir, batch_size,
+            progress=lambda done: print(f"  {done:.0%} written")
+        )
+    except Exception as e:
+        print(f"Error splitting files: {e}")
+        print("Run the split again to resume from the last completed chunk.")
+        return
+
+    for part in manifest['parts']:
+        print(f"Created {part['file']} ({part['rows']} rows)")
+        files.download(os.path.join(out_dir, part['file']))
+
+    print(f"\nSuccessfully created {len(manifest['parts'])} batch files from {manifest['total_rows']} rows!")
+    print(f"Row counts and checksums: {os.path.join(out_dir, MANIFEST_NAME)}")
+
 # ============================================================================
 # FEATURE 4: EXTRACT TIKTOK USERNAMES
 # ============================================================================